@@ -73,7 +73,7 @@ function App() {
   const [schoolDetail, setSchoolDetail] = useState(null);
   const [schoolDetailLoading, setSchoolDetailLoading] = useState(false);
   const [showAnalytics, setShowAnalytics] = useState(false);
-  const [analyticsReviews, setAnalyticsReviews] = useState([]);
+  const [analyticsTimeline, setAnalyticsTimeline] = useState(null);
   const [analyticsLoading, setAnalyticsLoading] = useState(false);
   const [analyticsAppliedTopics, setAnalyticsAppliedTopics] = useState([]);
   const [analyticsInterval, setAnalyticsInterval] = useState('month');
@@ -133,17 +133,19 @@ function App() {
     if (!showAnalytics || !selectedSchoolId) return;
     setAnalyticsLoading(true);
     axios
-      .get(`${API_URL}/api/schools/${selectedSchoolId}/reviews/topics`)
-      .then(({ data }) => setAnalyticsReviews(data.reviews || []))
-      .catch(() => setAnalyticsReviews([]))
+      .get(`${API_URL}/api/schools/${selectedSchoolId}/reviews/topics/timeline`, {
+        params: { interval: analyticsInterval },
+      })
+      .then(({ data }) => setAnalyticsTimeline(data))
+      .catch(() => setAnalyticsTimeline(null))
       .finally(() => setAnalyticsLoading(false));
-  }, [showAnalytics, selectedSchoolId]);
+  }, [showAnalytics, selectedSchoolId, analyticsInterval]);
 
   const handleBackFromAnalytics = useCallback(() => {
     setShowAnalytics(false);
     setSelectedSchoolId(null);
     setSchoolDetail(null);
-    setAnalyticsReviews([]);
+    setAnalyticsTimeline(null);
     setAnalyticsAppliedTopics([]);
   }, []);
 
@@ -182,7 +184,6 @@ function App() {
         <AnalyticsView
           school={schoolDetail}
           onBack={handleBackFromAnalytics}
-          reviews={analyticsReviews}
           loading={analyticsLoading}
           appliedTopics={analyticsAppliedTopics}
           onApplyTopics={setAnalyticsAppliedTopics}
@@ -211,7 +212,7 @@ function App() {
       <main className="map-area">
         {showAnalytics ? (
           <AnalyticsChart
-            reviews={analyticsReviews}
+            timeline={analyticsTimeline}
             appliedTopics={analyticsAppliedTopics}
             interval={analyticsInterval}
             loading={analyticsLoading}
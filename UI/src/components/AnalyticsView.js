@@ -41,26 +41,6 @@ const HELP_POPUP_TEXT = `Были проанализированы отзывы
 
 Пример: у школы был плохой ремонт — отзывы говорили о нём негативно. Сделали ремонт — отзывы изменились. Это видно на графике.`;
 
-function getPeriodKey(dateStr, interval) {
-  const d = new Date(dateStr);
-  if (isNaN(d.getTime())) return null;
-  const y = d.getFullYear();
-  const m = String(d.getMonth() + 1).padStart(2, '0');
-  if (interval === 'year') return String(y);
-  if (interval === 'month') return `${y}-${m}`;
-  if (interval === 'week') {
-    const start = new Date(d);
-    const day = start.getDay();
-    const diff = start.getDate() - day + (day === 0 ? -6 : 1);
-    start.setDate(diff);
-    const ys = start.getFullYear();
-    const ms = String(start.getMonth() + 1).padStart(2, '0');
-    const ds = String(start.getDate()).padStart(2, '0');
-    return `${ys}-${ms}-${ds}`;
-  }
-  return null;
-}
-
 function formatPeriodLabel(key, interval) {
   if (interval === 'year') return key;
   if (interval === 'month') {
@@ -77,50 +57,34 @@ function formatPeriodLabel(key, interval) {
   return key;
 }
 
-function buildChartData(reviews, appliedTopics, interval) {
-  if (!reviews || reviews.length === 0 || !appliedTopics || appliedTopics.length === 0) return [];
-
-  const byPeriod = {};
-  for (const r of reviews) {
-    const key = getPeriodKey(r.review_date, interval);
-    if (!key) continue;
-    if (!byPeriod[key]) byPeriod[key] = {};
-    for (const topic of appliedTopics) {
-      if (!byPeriod[key][topic]) byPeriod[key][topic] = { pos: 0, neg: 0, neutral: 0 };
-      const val = r.topics && r.topics[topic];
-      if (val === 'pos') byPeriod[key][topic].pos += 1;
-      else if (val === 'neg') byPeriod[key][topic].neg += 1;
-      else if (val === 'neutral') byPeriod[key][topic].neutral += 1;
-    }
-  }
+function buildChartData(timeline, appliedTopics, interval) {
+  if (!timeline || !timeline.periods || timeline.periods.length === 0 || !appliedTopics || appliedTopics.length === 0) return [];
 
-  const sortedKeys = Object.keys(byPeriod).sort();
-  return sortedKeys.map((key) => {
+  // Счётчики pos/neg/neutral по периодам уже агрегированы на сервере
+  return timeline.periods.map((key, i) => {
     const row = { period: key, label: formatPeriodLabel(key, interval) };
     for (const topic of appliedTopics) {
-      const c = byPeriod[key][topic] || { pos: 0, neg: 0, neutral: 0 };
-      const total = c.pos + c.neg + c.neutral;
+      const c = timeline.topics && timeline.topics[topic];
+      const pos = c ? c.pos[i] : 0;
+      const neg = c ? c.neg[i] : 0;
+      const total = pos + neg + (c ? c.neutral[i] : 0);
       if (total === 0) row[topic] = null;
-      else row[topic] = (c.pos - c.neg) / total;
+      else row[topic] = (pos - neg) / total;
     }
     return row;
   });
 }
 
-export function countTopicMentions(reviews, topic) {
-  if (!reviews) return 0;
-  let n = 0;
-  for (const r of reviews) {
-    if (r.topics && r.topics[topic] != null) n += 1;
-  }
-  return n;
+export function countTopicMentions(timeline, topic) {
+  if (!timeline || !timeline.mentions) return 0;
+  return timeline.mentions[topic] || 0;
 }
 
-export function AnalyticsChart({ reviews, appliedTopics, interval, loading }) {
+export function AnalyticsChart({ timeline, appliedTopics, interval, loading }) {
   const [hoverTopic, setHoverTopic] = useState(null);
   const chartData = useMemo(
-    () => buildChartData(reviews, appliedTopics, interval),
-    [reviews, appliedTopics, interval]
+    () => buildChartData(timeline, appliedTopics, interval),
+    [timeline, appliedTopics, interval]
   );
 
   if (loading) {
@@ -165,7 +129,7 @@ export function AnalyticsChart({ reviews, appliedTopics, interval, loading }) {
           <ReferenceLine y={0} stroke="#666" strokeDasharray="2 2" />
           <Legend
             formatter={(topicKey) => {
-              const count = countTopicMentions(reviews, topicKey);
+              const count = countTopicMentions(timeline, topicKey);
               const label = TOPICS.find((t) => t.key === topicKey)?.label || topicKey;
               return `${label} (${count} упом.)`;
             }}
@@ -195,7 +159,6 @@ export default function AnalyticsView({
   school,
   onBack,
   apiUrl,
-  reviews,
   loading,
   appliedTopics,
   onApplyTopics,
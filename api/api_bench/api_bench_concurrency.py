@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный замер параллельной обработки запросов API.
+
+Одновременно шлёт запросы к /api/schools/map и /schools/{id}/reviews
+из нескольких потоков и печатает пропускную способность (RPS) и задержки.
+Запускать против одного воркера uvicorn, чтобы сравнить поведение
+до и после выноса запросов к БД из event loop:
+
+    uvicorn api.main:app --workers 1
+    python api/api_bench/api_bench_concurrency.py
+"""
+
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import requests
+
+BASE_URL = os.getenv("BENCH_BASE_URL", "http://localhost:8000")
+# Число одновременных клиентов и общее число запросов
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "20"))
+TOTAL_REQUESTS = int(os.getenv("BENCH_REQUESTS", "1000"))
+# Школы, по которым запрашиваем отзывы (есть в db/db_data/db_input_review)
+REVIEW_SCHOOL_IDS = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 153]
+
+MAP_PARAMS = [
+    {},
+    {"has_pool": "true"},
+    {"year_min": 1950, "year_max": 1990},
+    {"rating_min": 4.0},
+]
+
+
+def build_urls(total: int) -> List[Tuple[str, str, Dict]]:
+    """Чередуем запросы карты и отзывов: (метка, url, params)."""
+    urls = []
+    for i in range(total):
+        if i % 2 == 0:
+            urls.append(("map", f"{BASE_URL}/api/schools/map", MAP_PARAMS[(i // 2) % len(MAP_PARAMS)]))
+        else:
+            school_id = REVIEW_SCHOOL_IDS[(i // 2) % len(REVIEW_SCHOOL_IDS)]
+            urls.append(("reviews", f"{BASE_URL}/schools/{school_id}/reviews", {}))
+    return urls
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Перцентиль p (0–100) по отсортированному списку."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def main() -> None:
+    urls = build_urls(TOTAL_REQUESTS)
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=CONCURRENCY, pool_maxsize=CONCURRENCY)
+    session.mount("http://", adapter)
+
+    def _call(item: Tuple[str, str, Dict]) -> Tuple[str, float, int]:
+        label, url, params = item
+        started = time.perf_counter()
+        try:
+            status = session.get(url, params=params, timeout=60).status_code
+        except requests.RequestException:
+            status = 0
+        return label, time.perf_counter() - started, status
+
+    print(f"[INFO] {BASE_URL}: {TOTAL_REQUESTS} запросов, {CONCURRENCY} параллельно")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        results = list(pool.map(_call, urls))
+    elapsed = time.perf_counter() - started
+
+    errors = sum(1 for _, _, status in results if status != 200)
+    print(f"[OK] Время: {elapsed:.2f} с, RPS: {len(results) / elapsed:.1f}, ошибок: {errors}")
+    for label in ("map", "reviews"):
+        latencies = [t * 1000 for name, t, _ in results if name == label]
+        if not latencies:
+            continue
+        print(
+            f"  {label:8s} n={len(latencies):5d} "
+            f"p50={percentile(latencies, 50):7.1f} мс "
+            f"p95={percentile(latencies, 95):7.1f} мс "
+            f"mean={statistics.mean(latencies):7.1f} мс"
+        )
+
+
+if __name__ == "__main__":
+    main()
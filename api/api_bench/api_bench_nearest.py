@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Замер KNN-поиска ближайших школ (ORDER BY location <-> точка LIMIT k) при росте таблицы.
+
+Скрипт работает напрямую с PostgreSQL (параметры из .env, как у API): во временной таблице
+генерирует школы вокруг центров нескольких городов, наращивает её до размеров из
+BENCH_NEAREST_SIZES и на каждом размере:
+  - проверяет план: KNN должен идти Index Scan по GIST-индексу с Order By, без Sort;
+  - меряет задержку запроса (p50/p95/p99) с индексом и, для небольших размеров,
+    без него (Seq Scan + Sort) для сравнения.
+
+    python api/api_bench/api_bench_nearest.py
+
+Временная таблица удаляется при отключении, данные sa.* не затрагиваются.
+"""
+
+import os
+import random
+import statistics
+import time
+from typing import List, Tuple
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST'),
+    'port': os.getenv('DB_PORT'),
+    'database': os.getenv('DB_NAME'),
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD')
+}
+
+# Размеры таблицы, на которых делается замер (школ)
+SIZES = [int(v) for v in os.getenv('BENCH_NEAREST_SIZES', '1000,10000,100000,1000000').split(',')]
+# Запросов на каждый размер и k ближайших
+QUERIES = int(os.getenv('BENCH_NEAREST_QUERIES', '200'))
+K = int(os.getenv('BENCH_NEAREST_K', '5'))
+# До какого размера мерить вариант без индекса (он растёт линейно)
+SEQ_MAX = int(os.getenv('BENCH_NEAREST_SEQ_MAX', '100000'))
+
+# Центры городов (lon, lat): школы генерируются вокруг них
+CITIES = [
+    (46.03, 51.53),   # Саратов
+    (37.62, 55.75),   # Москва
+    (30.31, 59.94),   # Санкт-Петербург
+    (49.11, 55.79),   # Казань
+    (50.10, 53.20),   # Самара
+    (44.51, 48.71),   # Волгоград
+    (60.60, 56.84),   # Екатеринбург
+    (82.92, 55.03),   # Новосибирск
+]
+# Разброс вокруг центра, градусы (примерно ±15 км)
+SPREAD = 0.15
+
+# Тот же вид запроса, что в /api/schools/nearest
+KNN_QUERY = """
+    SELECT school_id, ST_Distance(location, ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography) AS distance_m
+    FROM bench_school
+    ORDER BY location <-> ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography
+    LIMIT %s
+"""
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Перцентиль p (0–100) по отсортированному списку."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def random_point(rng: random.Random) -> Tuple[float, float]:
+    lon, lat = rng.choice(CITIES)
+    return lon + rng.uniform(-SPREAD, SPREAD), lat + rng.uniform(-SPREAD, SPREAD)
+
+
+def grow_table(cur, start: int, end: int) -> None:
+    """Добавить школы с id в (start, end]: равномерно по городам, случайно вокруг центра."""
+    cur.execute(
+        """
+        INSERT INTO bench_school (school_id, location)
+        SELECT
+            i,
+            ST_SetSRID(ST_MakePoint(
+                (%(lons)s::float8[])[1 + i %% %(n)s] + (random() - 0.5) * 2 * %(spread)s,
+                (%(lats)s::float8[])[1 + i %% %(n)s] + (random() - 0.5) * 2 * %(spread)s
+            ), 4326)::geography
+        FROM generate_series(%(start)s, %(end)s) AS i
+        """,
+        {
+            'lons': [c[0] for c in CITIES],
+            'lats': [c[1] for c in CITIES],
+            'n': len(CITIES),
+            'spread': SPREAD,
+            'start': start + 1,
+            'end': end,
+        },
+    )
+    cur.execute("ANALYZE bench_school")
+
+
+def knn_plan(cur) -> str:
+    """План KNN-запроса для случайной точки."""
+    cur.execute("EXPLAIN " + KNN_QUERY, (46.03, 51.53, 46.03, 51.53, K))
+    return "\n".join(row[0] for row in cur.fetchall())
+
+
+def measure(cur, rng: random.Random) -> List[float]:
+    """Задержки QUERIES KNN-запросов в мс."""
+    latencies = []
+    for _ in range(QUERIES):
+        lon, lat = random_point(rng)
+        started = time.perf_counter()
+        cur.execute(KNN_QUERY, (lon, lat, lon, lat, K))
+        cur.fetchall()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def report(label: str, latencies: List[float]) -> None:
+    print(
+        f"  {label:10s} "
+        f"p50={percentile(latencies, 50):8.2f} мс "
+        f"p95={percentile(latencies, 95):8.2f} мс "
+        f"p99={percentile(latencies, 99):8.2f} мс "
+        f"mean={statistics.mean(latencies):8.2f} мс"
+    )
+
+
+def main() -> None:
+    rng = random.Random(42)
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                CREATE TEMP TABLE bench_school (
+                    school_id INTEGER PRIMARY KEY,
+                    location GEOGRAPHY(Point, 4326) NOT NULL
+                )
+                """
+            )
+            cur.execute("CREATE INDEX ON bench_school USING GIST(location)")
+
+            size = 0
+            for target in sorted(SIZES):
+                started = time.perf_counter()
+                grow_table(cur, size, target)
+                size = target
+                print(f"[INFO] Школ: {size} (генерация {time.perf_counter() - started:.1f} с), k={K}")
+
+                plan = knn_plan(cur)
+                uses_index = "Index Scan" in plan and "Order By" in plan and "Sort" not in plan
+                print(f"  план: {'KNN по GIST-индексу' if uses_index else 'БЕЗ KNN-индекса'}")
+                if not uses_index:
+                    print(plan)
+
+                report("индекс", measure(cur, rng))
+
+                if size <= SEQ_MAX:
+                    cur.execute("SET enable_indexscan = off")
+                    cur.execute("SET enable_bitmapscan = off")
+                    report("без индекса", measure(cur, rng))
+                    cur.execute("RESET enable_indexscan")
+                    cur.execute("RESET enable_bitmapscan")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
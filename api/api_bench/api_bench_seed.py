@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Синтетическая БД для нагрузочных замеров API (api_bench_suite.py).
+
+Создаёт отдельную базу BENCH_DB_NAME (по умолчанию <DB_NAME>_bench) на том же сервере
+PostgreSQL/PostGIS, создаёт в ней схему sa скриптом db/db_src/db_create/create_script.sql,
+копирует школы, рейтинги, ссылки и отзывы из рабочей БД (DB_NAME) и размножает их
+в BENCH_SCALE раз (10–100) прямо в SQL:
+  - копия k получает id = исходный id + k * шаг (шаг — степень 10 больше максимального id);
+  - координаты сдвигаются случайно в пределах ±BENCH_JITTER_DEG градусов, год постройки,
+    рейтинги и даты отзывов — в правдоподобных пределах;
+  - названия, адреса и тексты отзывов сохраняются, поэтому поиск и темы отзывов
+    распределены так же, как в реальных данных.
+setseed(BENCH_SEED) делает результат воспроизводимым: при одинаковых исходных данных
+и параметрах получается та же самая БД.
+
+    python api/api_bench/api_bench_seed.py
+
+Рабочая БД только читается. База BENCH_DB_NAME пересоздаётся при каждом запуске.
+"""
+
+import io
+import os
+import time
+
+import psycopg2
+from psycopg2 import sql
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST'),
+    'port': os.getenv('DB_PORT'),
+    'database': os.getenv('DB_NAME'),
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD')
+}
+
+BENCH_DB_NAME = os.getenv('BENCH_DB_NAME', f"{DB_CONFIG['database']}_bench")
+# Во сколько раз увеличить данные
+SCALE = int(os.getenv('BENCH_SCALE', '10'))
+SEED = float(os.getenv('BENCH_SEED', '0.42'))
+# Разброс координат копий школ, градусы (0.1 ≈ ±11 км по широте)
+JITTER_DEG = float(os.getenv('BENCH_JITTER_DEG', '0.1'))
+# База для CREATE/DROP DATABASE
+MAINTENANCE_DB = os.getenv('BENCH_MAINTENANCE_DB', 'postgres')
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+CREATE_SCRIPT_PATH = os.path.join(PROJECT_ROOT, "db", "db_src", "db_create", "create_script.sql")
+
+# Копируемые колонки (без вычисляемых search_name/search_tsv и служебных id/временных меток)
+TABLE_COLUMNS = {
+    'sa.school': [
+        'school_id', 'name_2gis', 'name_ym', 'school_address', 'building_type', 'floors',
+        'floor_under', 'material', 'reconstruction_year', 'year_built', 'capacity',
+        'building_info', 'has_sports_complex', 'has_pool', 'has_stadium', 'has_sports_ground',
+        'location',
+    ],
+    'sa.rating': ['school_id', 'rating_2gis', 'rating_yandex', 'review_date_score'],
+    'sa.link': ['school_id', 'link_yandex', 'review_link_ym', 'link_2gis', 'review_link_2gis'],
+    'sa.review': [
+        'review_id', 'school_id', 'review_date', 'review_text', 'likes_count', 'dislikes_count',
+        'review_rating', 'topics', 'overall',
+    ],
+}
+
+# Копии k = 1..SCALE-1 поверх исходных строк (k = 0).
+# Строки идут из подзапроса с ORDER BY: random() во внешнем SELECT вызывается
+# в этом порядке, а не в порядке сканирования таблицы, поэтому после setseed
+# результат один и тот же
+SCALE_QUERIES = [
+    """
+    INSERT INTO sa.school (
+        school_id, name_2gis, name_ym, school_address, building_type, floors, floor_under,
+        material, reconstruction_year, year_built, capacity, building_info,
+        has_sports_complex, has_pool, has_stadium, has_sports_ground, location
+    )
+    SELECT
+        s.school_id + k * %(school_step)s,
+        s.name_2gis, s.name_ym, s.school_address, s.building_type, s.floors, s.floor_under,
+        s.material, s.reconstruction_year,
+        s.year_built + (floor(random() * 21) - 10)::int,
+        s.capacity, s.building_info,
+        s.has_sports_complex, s.has_pool, s.has_stadium, s.has_sports_ground,
+        ST_SetSRID(ST_MakePoint(
+            ST_X(s.location::geometry) + (random() - 0.5) * 2 * %(jitter)s,
+            ST_Y(s.location::geometry) + (random() - 0.5) * 2 * %(jitter)s
+        ), 4326)::geography
+    FROM (
+        SELECT s.*, k
+        FROM sa.school s
+        CROSS JOIN generate_series(1, %(copies)s) AS k
+        ORDER BY s.school_id, k
+    ) s
+    """,
+    """
+    INSERT INTO sa.rating (school_id, rating_2gis, rating_yandex, review_date_score)
+    SELECT
+        r.school_id + k * %(school_step)s,
+        -- GREATEST/LEAST пропускают NULL, поэтому отсутствующий рейтинг сохраняем явно
+        CASE WHEN r.rating_2gis IS NOT NULL
+            THEN LEAST(5, GREATEST(1, r.rating_2gis + round((random() - 0.5)::numeric, 1))) END,
+        CASE WHEN r.rating_yandex IS NOT NULL
+            THEN LEAST(5, GREATEST(1, r.rating_yandex + round((random() - 0.5)::numeric, 1))) END,
+        r.review_date_score
+    FROM (
+        SELECT r.*, k
+        FROM sa.rating r
+        CROSS JOIN generate_series(1, %(copies)s) AS k
+        ORDER BY r.school_id, k
+    ) r
+    """,
+    """
+    INSERT INTO sa.link (school_id, link_yandex, review_link_ym, link_2gis, review_link_2gis)
+    SELECT l.school_id + k * %(school_step)s, l.link_yandex, l.review_link_ym, l.link_2gis, l.review_link_2gis
+    FROM sa.link l
+    CROSS JOIN generate_series(1, %(copies)s) AS k
+    ORDER BY l.school_id, k
+    """,
+    """
+    INSERT INTO sa.review (
+        review_id, school_id, review_date, review_text, likes_count, dislikes_count,
+        review_rating, topics, overall
+    )
+    SELECT
+        r.review_id + k * %(review_step)s,
+        r.school_id + k * %(school_step)s,
+        CASE WHEN r.review_date IS NOT NULL
+            THEN LEAST(CURRENT_DATE, r.review_date + (floor(random() * 731) - 365)::int) END,
+        r.review_text, r.likes_count, r.dislikes_count, r.review_rating, r.topics, r.overall
+    FROM (
+        SELECT r.*, k
+        FROM sa.review r
+        CROSS JOIN generate_series(1, %(copies)s) AS k
+        ORDER BY r.review_id, k
+    ) r
+    """,
+]
+
+
+def id_step(max_id: int) -> int:
+    """Шаг id копий: ближайшая степень 10, большая максимального id (копии не пересекаются)."""
+    step = 10
+    while step <= max_id:
+        step *= 10
+    return step
+
+
+def recreate_database() -> None:
+    if BENCH_DB_NAME == DB_CONFIG['database']:
+        raise SystemExit("[ERROR] BENCH_DB_NAME совпадает с DB_NAME: замер не должен писать в рабочую БД")
+    conn = psycopg2.connect(**{**DB_CONFIG, 'database': MAINTENANCE_DB})
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(BENCH_DB_NAME)))
+            cur.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(BENCH_DB_NAME)))
+    finally:
+        conn.close()
+    print(f"[OK] База {BENCH_DB_NAME} пересоздана")
+
+
+def copy_source(source, target) -> None:
+    """Перенести исходные таблицы COPY-потоком: рабочая БД → буфер → БД замера."""
+    with source.cursor() as src, target.cursor() as dst:
+        for table, columns in TABLE_COLUMNS.items():
+            column_list = ", ".join(columns)
+            buffer = io.BytesIO()
+            src.copy_expert(f"COPY (SELECT {column_list} FROM {table}) TO STDOUT", buffer)
+            buffer.seek(0)
+            dst.copy_expert(f"COPY {table} ({column_list}) FROM STDIN", buffer)
+            print(f"  {table}: {dst.rowcount} строк")
+
+
+def main() -> None:
+    started = time.perf_counter()
+    recreate_database()
+
+    source = psycopg2.connect(**DB_CONFIG)
+    target = psycopg2.connect(**{**DB_CONFIG, 'database': BENCH_DB_NAME})
+    try:
+        with target.cursor() as cur, open(CREATE_SCRIPT_PATH, "r", encoding="utf-8") as f:
+            cur.execute(f.read())
+        print("[INFO] Копируем исходные данные")
+        copy_source(source, target)
+
+        with target.cursor() as cur:
+            cur.execute("SELECT COALESCE(MAX(school_id), 0) FROM sa.school")
+            school_step = id_step(cur.fetchone()[0])
+            cur.execute("SELECT COALESCE(MAX(review_id), 0) FROM sa.review")
+            review_step = id_step(cur.fetchone()[0])
+            if SCALE > 1:
+                print(f"[INFO] Размножаем в {SCALE} раз")
+                cur.execute("SELECT setseed(%s)", (SEED,))
+                params = {
+                    'copies': SCALE - 1,
+                    'school_step': school_step,
+                    'review_step': review_step,
+                    'jitter': JITTER_DEG,
+                }
+                for query in SCALE_QUERIES:
+                    cur.execute(query, params)
+            cur.execute("REFRESH MATERIALIZED VIEW sa.school_summary")
+            cur.execute("UPDATE sa.data_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP")
+            cur.execute("SELECT COUNT(*) FROM sa.school")
+            schools = cur.fetchone()[0]
+            cur.execute("SELECT COUNT(*) FROM sa.review")
+            reviews = cur.fetchone()[0]
+        target.commit()
+
+        # ANALYZE вне транзакции: планировщик должен видеть новый размер таблиц
+        target.autocommit = True
+        with target.cursor() as cur:
+            cur.execute("ANALYZE")
+    except Exception:
+        target.rollback()
+        raise
+    finally:
+        source.close()
+        target.close()
+
+    print(
+        f"[OK] {BENCH_DB_NAME}: школ {schools}, отзывов {reviews} "
+        f"(×{SCALE}, {time.perf_counter() - started:.1f} с)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Воспроизводимый нагрузочный замер API на смеси реалистичных запросов.
+
+По умолчанию скрипт сам запускает API (uvicorn api.main:app) на базе BENCH_DB_NAME,
+подготовленной api_bench_seed.py, и по окончании останавливает его. Если задан
+BENCH_BASE_URL, замеряется уже запущенный API.
+
+Смесь запросов (веса — MIX): фильтры и кластеры карты, поиск и подсказки, карточка
+школы и пачка карточек, ближайшие школы, страницы отзывов, темы и динамика тем.
+Последовательность запросов определяется BENCH_SEED, поэтому два прогона с одними
+параметрами отправляют одни и те же запросы в одном порядке.
+
+Печатает RPS и p50/p95/p99 задержки по каждому виду запросов. BENCH_OUTPUT — сохранить
+результат в JSON; BENCH_BASELINE — сравнить с сохранённым ранее результатом:
+
+    python api/api_bench/api_bench_seed.py
+    BENCH_OUTPUT=before.json python api/api_bench/api_bench_suite.py
+    # ... изменение ...
+    BENCH_BASELINE=before.json python api/api_bench/api_bench_suite.py
+"""
+
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+
+BASE_URL = os.getenv("BENCH_BASE_URL")
+BENCH_DB_NAME = os.getenv("BENCH_DB_NAME", f"{os.getenv('DB_NAME')}_bench")
+PORT = int(os.getenv("BENCH_PORT", "8100"))
+WORKERS = int(os.getenv("BENCH_WORKERS", "1"))
+# Число одновременных клиентов, запросов на прогрев (не учитываются) и замер
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "20"))
+WARMUP_REQUESTS = int(os.getenv("BENCH_WARMUP", "200"))
+TOTAL_REQUESTS = int(os.getenv("BENCH_REQUESTS", "5000"))
+SEED = int(os.getenv("BENCH_SEED", "42"))
+OUTPUT_PATH = os.getenv("BENCH_OUTPUT")
+BASELINE_PATH = os.getenv("BENCH_BASELINE")
+
+# Вид запроса → доля в смеси
+MIX = {
+    "map": 25,
+    "map_clusters": 5,
+    "search": 10,
+    "suggest": 10,
+    "detail": 15,
+    "batch": 5,
+    "nearest": 10,
+    "reviews": 10,
+    "topics": 5,
+    "timeline": 5,
+}
+
+MAP_FILTERS = [
+    {},
+    {"has_pool": "true"},
+    {"has_stadium": "true", "has_sports_ground": "true"},
+    {"year_min": 1950, "year_max": 1990},
+    {"rating_min": 4.0},
+    {"rating_min": 3.0, "rating_max": 4.5, "has_sports_complex": "true"},
+]
+
+# Саратов: область карты и точки для поиска ближайших школ
+CITY_BBOX = (45.85, 51.45, 46.20, 51.65)
+
+Request = Tuple[str, str, Dict[str, Any]]
+
+
+class Dataset:
+    """id и названия школ замеряемой БД — из /schools."""
+
+    def __init__(self, base_url: str):
+        schools = requests.get(f"{base_url}/schools", timeout=60).json()["schools"]
+        self.school_ids = [s["school_id"] for s in schools]
+        self.names = [s["name_2gis"] or s["name_ym"] for s in schools if s["name_2gis"] or s["name_ym"]]
+        if not self.school_ids:
+            raise SystemExit("[ERROR] В БД нет школ: сначала запустите api_bench_seed.py")
+
+
+def _search_term(rng: random.Random, data: Dataset) -> str:
+    """Начало названия случайной школы: «Гимназия», «Лицей №3», «СОШ № 1»."""
+    words = rng.choice(data.names).split()
+    return " ".join(words[:rng.randint(1, min(2, len(words)))])
+
+
+def _random_point(rng: random.Random) -> Tuple[float, float]:
+    lon_min, lat_min, lon_max, lat_max = CITY_BBOX
+    return round(rng.uniform(lat_min, lat_max), 5), round(rng.uniform(lon_min, lon_max), 5)
+
+
+def _random_bbox(rng: random.Random) -> Dict[str, float]:
+    """Видимая область карты: случайный кусок города шириной 0.05–0.2°."""
+    lon_min, lat_min, lon_max, lat_max = CITY_BBOX
+    width = rng.uniform(0.05, 0.2)
+    lon = rng.uniform(lon_min, lon_max - width)
+    lat = rng.uniform(lat_min, lat_max - width / 2)
+    return {
+        "lon_min": round(lon, 4),
+        "lat_min": round(lat, 4),
+        "lon_max": round(lon + width, 4),
+        "lat_max": round(lat + width / 2, 4),
+    }
+
+
+def build_generators(base_url: str, data: Dataset) -> Dict[str, Callable[[random.Random], Request]]:
+    """Генераторы запросов каждого вида: rng → (вид, url, params)."""
+    return {
+        "map": lambda rng: ("map", f"{base_url}/api/schools/map", dict(rng.choice(MAP_FILTERS))),
+        "map_clusters": lambda rng: (
+            "map_clusters",
+            f"{base_url}/api/schools/map",
+            {**rng.choice(MAP_FILTERS), **_random_bbox(rng), "zoom": rng.randint(8, 12)},
+        ),
+        "search": lambda rng: ("search", f"{base_url}/api/schools/map", {"search": _search_term(rng, data)}),
+        "suggest": lambda rng: ("suggest", f"{base_url}/api/schools/suggest", {"q": _search_term(rng, data)[:5]}),
+        "detail": lambda rng: ("detail", f"{base_url}/api/schools/{rng.choice(data.school_ids)}", {}),
+        "batch": lambda rng: (
+            "batch",
+            f"{base_url}/api/schools/batch",
+            {"ids": ",".join(str(i) for i in rng.sample(data.school_ids, min(20, len(data.school_ids))))},
+        ),
+        "nearest": lambda rng: (
+            "nearest",
+            f"{base_url}/api/schools/nearest",
+            dict(zip(("lat", "lon"), _random_point(rng)), k=rng.choice((3, 5, 10))),
+        ),
+        "reviews": lambda rng: (
+            "reviews", f"{base_url}/schools/{rng.choice(data.school_ids)}/reviews", {"limit": 100}
+        ),
+        "topics": lambda rng: (
+            "topics", f"{base_url}/api/schools/{rng.choice(data.school_ids)}/reviews/topics", {}
+        ),
+        "timeline": lambda rng: (
+            "timeline",
+            f"{base_url}/api/schools/{rng.choice(data.school_ids)}/reviews/topics/timeline",
+            {"interval": rng.choice(("month", "quarter", "year"))},
+        ),
+    }
+
+
+def build_requests(base_url: str, data: Dataset, total: int, seed: int) -> List[Request]:
+    """Детерминированная последовательность запросов по весам MIX."""
+    rng = random.Random(seed)
+    generators = build_generators(base_url, data)
+    kinds = list(MIX)
+    weights = [MIX[kind] for kind in kinds]
+    return [generators[kind](rng) for kind in rng.choices(kinds, weights=weights, k=total)]
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Перцентиль p (0–100) по отсортированному списку."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def run(items: List[Request]) -> Tuple[List[Tuple[str, float, int]], float]:
+    """Отправить запросы CONCURRENCY потоками: [(вид, секунды, статус)], общее время."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=CONCURRENCY, pool_maxsize=CONCURRENCY)
+    session.mount("http://", adapter)
+
+    def _call(item: Request) -> Tuple[str, float, int]:
+        label, url, params = item
+        started = time.perf_counter()
+        try:
+            response = session.get(url, params=params, timeout=60)
+            _ = response.content
+            status = response.status_code
+        except requests.RequestException:
+            status = 0
+        return label, time.perf_counter() - started, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        results = list(pool.map(_call, items))
+    return results, time.perf_counter() - started
+
+
+def summarize(results: List[Tuple[str, float, int]], elapsed: float) -> Dict[str, Any]:
+    """Сводка прогона: общий RPS и задержки (мс) по каждому виду запросов и в целом."""
+    def _stats(rows: List[Tuple[str, float, int]]) -> Dict[str, Any]:
+        latencies = [t * 1000 for _, t, _ in rows]
+        return {
+            "n": len(rows),
+            "errors": sum(1 for _, _, status in rows if status != 200),
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "mean": round(statistics.mean(latencies), 2) if latencies else 0.0,
+        }
+
+    return {
+        "rps": round(len(results) / elapsed, 1) if elapsed else 0.0,
+        "elapsed": round(elapsed, 2),
+        "total": _stats(results),
+        "kinds": {kind: _stats([r for r in results if r[0] == kind]) for kind in MIX if any(r[0] == kind for r in results)},
+    }
+
+
+def _delta(value: float, base: Optional[float]) -> str:
+    if not base:
+        return ""
+    return f" ({(value - base) / base * 100:+.0f}%)"
+
+
+def report(summary: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    base_kinds = (baseline or {}).get("kinds", {})
+    print(
+        f"[OK] Время: {summary['elapsed']:.2f} с, RPS: {summary['rps']:.1f}"
+        f"{_delta(summary['rps'], (baseline or {}).get('rps'))}, ошибок: {summary['total']['errors']}"
+    )
+    rows = list(summary["kinds"].items()) + [("total", summary["total"])]
+    for kind, stats in rows:
+        base = base_kinds.get(kind) if kind != "total" else (baseline or {}).get("total")
+        base = base or {}
+        print(
+            f"  {kind:12s} n={stats['n']:5d} err={stats['errors']:3d} "
+            f"p50={stats['p50']:7.1f} мс{_delta(stats['p50'], base.get('p50')):8s} "
+            f"p95={stats['p95']:7.1f} мс{_delta(stats['p95'], base.get('p95')):8s} "
+            f"p99={stats['p99']:7.1f} мс{_delta(stats['p99'], base.get('p99')):8s}"
+        )
+
+
+def start_server() -> Tuple[subprocess.Popen, str]:
+    """Запустить uvicorn на базе замера и дождаться /api/health."""
+    base_url = f"http://127.0.0.1:{PORT}"
+    env = {**os.environ, "DB_NAME": BENCH_DB_NAME}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(PORT), "--workers", str(WORKERS),
+         "--log-level", "warning"],
+        cwd=PROJECT_ROOT,
+        env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"[ERROR] API завершился при запуске (код {process.returncode})")
+        try:
+            if requests.get(f"{base_url}/api/health", timeout=2).status_code == 200:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise SystemExit("[ERROR] API не ответил на /api/health за 60 с")
+
+
+def main() -> None:
+    process = None
+    base_url = BASE_URL
+    if base_url is None:
+        process, base_url = start_server()
+        print(f"[INFO] API запущен на {base_url} (БД {BENCH_DB_NAME}, воркеров: {WORKERS})")
+    try:
+        data = Dataset(base_url)
+        print(
+            f"[INFO] Школ: {len(data.school_ids)}; прогрев {WARMUP_REQUESTS}, "
+            f"замер {TOTAL_REQUESTS} запросов, {CONCURRENCY} параллельно, seed={SEED}"
+        )
+        if WARMUP_REQUESTS:
+            run(build_requests(base_url, data, WARMUP_REQUESTS, SEED + 1))
+        results, elapsed = run(build_requests(base_url, data, TOTAL_REQUESTS, SEED))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    summary = summarize(results, elapsed)
+    summary["params"] = {
+        "db": BENCH_DB_NAME if BASE_URL is None else None,
+        "schools": len(data.school_ids),
+        "workers": WORKERS if BASE_URL is None else None,
+        "concurrency": CONCURRENCY,
+        "requests": TOTAL_REQUESTS,
+        "seed": SEED,
+        "mix": MIX,
+    }
+    baseline = None
+    if BASELINE_PATH:
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    report(summary, baseline)
+
+    if OUTPUT_PATH:
+        with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"[OK] Результат сохранён в {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Кэш ответов API с инвалидацией по версии данных.
+
+Данные в sa.school / sa.rating / sa.link / sa.review меняются только при запуске
+загрузчиков из db/db_src/db_insert. Каждый загрузчик в той же транзакции увеличивает
+sa.data_version.version, а API добавляет эту версию в ключ кэша: после загрузки
+все старые записи становятся недостижимыми и вытесняются по LRU/TTL.
+Та же версия служит основой ETag для условных GET-запросов (If-None-Match → 304).
+
+Бэкенды:
+  - memory (по умолчанию) — LRU + TTL в памяти процесса;
+  - redis — общий кэш для нескольких воркеров (нужен пакет redis и CACHE_REDIS_URL).
+
+SingleFlight объединяет одинаковые одновременные запросы, пока ответа ещё нет в кэше:
+запрос к БД выполняется один раз, остальные ждут его результат.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+import psycopg2
+
+CACHE_CONFIG = {
+    'backend': os.getenv('CACHE_BACKEND', 'memory'),
+    'maxsize': int(os.getenv('CACHE_MAXSIZE', '512')),
+    # Время жизни записи, сек
+    'ttl': float(os.getenv('CACHE_TTL', '300')),
+    'redis_url': os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0'),
+}
+
+# Как часто (сек) перечитывать sa.data_version из БД
+DATA_VERSION_TTL = float(os.getenv('DATA_VERSION_TTL', '5'))
+
+T = TypeVar('T')
+
+
+class MemoryBackend:
+    """LRU-кэш с TTL в памяти процесса."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+def _json_dumps(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+
+
+class RedisBackend:
+    """
+    Общий кэш в Redis. Значения хранятся как JSON, TTL задаётся самим Redis.
+    Ключ кэша (кортеж) сериализуется в строку с префиксом prefix (по умолчанию schools_api:).
+    codec — пара (dumps, loads) значение ↔ bytes для значений, которые не JSON
+    (например готовые байты ответа api_json.EncodedBody).
+    """
+
+    def __init__(
+        self,
+        url: str,
+        ttl: float,
+        prefix: str = "schools_api:",
+        codec: Optional[Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = None,
+    ):
+        import redis  # необязательная зависимость
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._dumps, self._loads = codec if codec is not None else (_json_dumps, json.loads)
+        self._client = redis.Redis.from_url(url)
+        self._errors = redis.RedisError
+        self.evictions = 0
+
+    def _key(self, key: Hashable) -> str:
+        return self.prefix + json.dumps(key, ensure_ascii=False, default=str)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        # Недоступный Redis не должен ронять API: считаем это промахом
+        try:
+            raw = self._client.get(self._key(key))
+        except self._errors as e:
+            print(f"[WARN] Redis недоступен: {e}")
+            return None
+        return self._loads(raw) if raw is not None else None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        try:
+            self._client.set(self._key(key), self._dumps(value), ex=max(1, int(self.ttl)))
+        except self._errors as e:
+            print(f"[WARN] Redis недоступен: {e}")
+
+    def clear(self) -> None:
+        # Ключи содержат версию данных, поэтому старые записи истекут по TTL сами
+        pass
+
+    def size(self) -> int:
+        return -1
+
+
+def create_backend(config: Dict[str, Any] = CACHE_CONFIG, prefix: str = "schools_api:", codec=None):
+    """
+    Создать бэкенд кэша по настройкам; при недоступности redis — кэш в памяти.
+    prefix и codec — для Redis (см. RedisBackend); в памяти значения хранятся как есть.
+    """
+    if config['backend'] == 'redis':
+        try:
+            return RedisBackend(config['redis_url'], config['ttl'], prefix, codec)
+        except ImportError:
+            print("[WARN] Пакет redis не установлен, используется кэш в памяти (pip install redis)")
+    return MemoryBackend(config['maxsize'], config['ttl'])
+
+
+class DataVersion:
+    """
+    Текущая версия данных из sa.data_version.
+    Значение запоминается на DATA_VERSION_TTL секунд, чтобы не ходить в БД на каждый запрос.
+    """
+
+    def __init__(self, ttl: float = DATA_VERSION_TTL):
+        self.ttl = ttl
+        self._value: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def is_fresh(self) -> bool:
+        """Можно ли отдать запомненную версию без запроса к БД."""
+        return self._value is not None and time.monotonic() - self._checked_at < self.ttl
+
+    def cached(self) -> Optional[int]:
+        return self._value
+
+    def read(self, conn) -> int:
+        """
+        Прочитать версию из PostgreSQL (вызывается в потоке пула БД), не запоминая её.
+        Если sa.data_version ещё не создана (миграция не применена), версия считается 0:
+        кэш продолжает работать, но сбрасывается только по TTL.
+        """
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT version FROM sa.data_version WHERE id = 1")
+                row = cur.fetchone()
+            return int(row[0]) if row else 0
+        except psycopg2.Error as e:
+            conn.rollback()
+            if self._value is None:
+                print(f"[WARN] Не удалось прочитать sa.data_version: {e}")
+            return 0
+
+    def refresh(self, conn) -> int:
+        """Перечитать версию из PostgreSQL и запомнить её."""
+        return self.store(self.read(conn))
+
+    def store(self, value: int) -> int:
+        """Запомнить версию, прочитанную из любого хранилища (см. api_storage.py)."""
+        with self._lock:
+            self._value = value
+            self._checked_at = time.monotonic()
+            return value
+
+
+class ResponseCache:
+    """
+    Кэш ответов эндпоинтов: ключ = (namespace, версия данных, нормализованные параметры).
+    Считает попадания и промахи по каждому namespace.
+    """
+
+    def __init__(self, backend=None, data_version: Optional[DataVersion] = None):
+        self.backend = backend if backend is not None else create_backend()
+        self.data_version = data_version if data_version is not None else DataVersion()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._last_version: Optional[int] = None
+
+    def _count(self, namespace: str, field: str) -> None:
+        with self._lock:
+            ns = self._stats.setdefault(namespace, {'hits': 0, 'misses': 0})
+            ns[field] += 1
+
+    def on_version(self, version: int) -> None:
+        """При смене версии данных сбрасываем локальный кэш целиком."""
+        with self._lock:
+            changed = self._last_version is not None and self._last_version != version
+            self._last_version = version
+        if changed:
+            self.backend.clear()
+
+    def get(self, namespace: str, version: int, params: Tuple) -> Optional[Any]:
+        value = self.backend.get((namespace, version) + params)
+        self._count(namespace, 'hits' if value is not None else 'misses')
+        return value
+
+    def set(self, namespace: str, version: int, params: Tuple, value: Any) -> None:
+        self.backend.set((namespace, version) + params, value)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            per_ns = {ns: dict(v) for ns, v in self._stats.items()}
+        return {
+            'backend': type(self.backend).__name__,
+            'size': self.backend.size(),
+            'evictions': self.backend.evictions,
+            'data_version': self.data_version.cached(),
+            'namespaces': per_ns,
+        }
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных вычислений (single-flight) в одном event loop.
+
+    Первый запрос с ключом (namespace, версия данных, параметры) запускает вычисление отдельной
+    задачей, остальные с тем же ключом ждут её результат (или то же исключение).
+    Задача не отменяется, если клиент первого запроса отключился: её ждут остальные.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, "asyncio.Future"] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, namespace: str, field: str) -> None:
+        ns = self._stats.setdefault(namespace, {'leaders': 0, 'followers': 0})
+        ns[field] += 1
+
+    async def do(
+        self,
+        namespace: str,
+        version: int,
+        params: Tuple,
+        func: Callable[..., Awaitable[T]],
+        *args: Any,
+    ) -> T:
+        key = (namespace, version) + params
+        task = self._inflight.get(key)
+        if task is None:
+            self._count(namespace, 'leaders')
+            task = asyncio.ensure_future(func(*args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self._count(namespace, 'followers')
+        # shield: отмена одного ожидающего не отменяет общее вычисление
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: "asyncio.Future") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Если все ожидающие отменены, исключение задачи всё равно считается обработанным
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'in_flight': len(self._inflight),
+            'namespaces': {ns: dict(v) for ns, v in self._stats.items()},
+        }
+
+
+def make_etag(version: int, namespace: str, params: Tuple) -> Optional[str]:
+    """
+    Слабый ETag ответа: версия данных + хэш эндпоинта и его параметров.
+    Слабый, потому что под ним уходят разные байты — исходное тело и его gzip/brotli-версии
+    (api_json.EncodedBody): данные одни, представления разные.
+    Без известной версии (0 — sa.data_version не создана) ETag не выдаётся,
+    иначе клиент никогда не узнал бы об изменении данных.
+    """
+    if not version:
+        return None
+    digest = hashlib.sha1(repr((namespace,) + params).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{version}-{digest}"'
+
+
+def _opaque_tag(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Совпадает ли ETag с заголовком If-None-Match (список через запятую или *).
+    Сравнение слабое, как требует If-None-Match: префикс W/ не учитывается.
+    """
+    if not if_none_match:
+        return False
+    etag = _opaque_tag(etag)
+    for candidate in if_none_match.split(","):
+        candidate = _opaque_tag(candidate.strip())
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+
+__all__ = [
+    "CACHE_CONFIG",
+    "DATA_VERSION_TTL",
+    "MemoryBackend",
+    "RedisBackend",
+    "create_backend",
+    "DataVersion",
+    "ResponseCache",
+    "SingleFlight",
+    "make_etag",
+    "etag_matches",
+]
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Пул подключений к PostgreSQL для API.
+
+Пул создаётся при старте приложения (init_pool) и закрывается при остановке (close_pool).
+Размер пула, таймаут ожидания свободного подключения и проверка подключений
+настраиваются через переменные окружения (.env).
+
+psycopg2 — блокирующий драйвер, поэтому запросы к БД из async-эндпоинтов
+выполняются через run_in_db_thread в отдельном ограниченном пуле потоков:
+event loop не блокируется, и параллельные запросы обслуживаются одним воркером.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+from dotenv import load_dotenv
+
+try:
+    from api import api_metrics
+except ImportError:  # запуск как `python api/main.py`
+    import api_metrics
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Параметры подключения к БД
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST'),
+    'port': os.getenv('DB_PORT'),
+    'database': os.getenv('DB_NAME'),
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD')
+}
+
+# Параметры пула подключений
+POOL_CONFIG = {
+    'minconn': int(os.getenv('DB_POOL_MIN', '1')),
+    'maxconn': int(os.getenv('DB_POOL_MAX', '10')),
+    # Сколько секунд ждать свободное подключение, прежде чем вернуть ошибку
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', '5')),
+    # Подключение, простоявшее дольше этого времени (сек), проверяется через SELECT 1
+    'health_check_idle': float(os.getenv('DB_POOL_HEALTH_CHECK_IDLE', '30')),
+}
+
+# Потоков для запросов к БД: по умолчанию столько же, сколько подключений в пуле,
+# чтобы потоки не простаивали в ожидании подключения
+DB_THREADS = int(os.getenv('DB_THREADS', str(POOL_CONFIG['maxconn'])))
+
+T = TypeVar('T')
+
+
+class PoolTimeoutError(Exception):
+    """Свободное подключение не появилось за DB_POOL_TIMEOUT секунд."""
+
+
+class DBPool:
+    """
+    Потокобезопасный пул подключений поверх psycopg2 ThreadedConnectionPool.
+
+    Добавляет к стандартному пулу:
+      - ожидание свободного подключения с таймаутом (вместо мгновенного PoolError);
+      - проверку "живости" подключения перед выдачей;
+      - счётчики использования и исчерпания пула.
+    """
+
+    def __init__(
+        self,
+        minconn: int,
+        maxconn: int,
+        timeout: float,
+        health_check_idle: float,
+        **db_config: Any,
+    ):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_idle = health_check_idle
+
+        if api_metrics.METRICS_CONFIG['enabled']:
+            # Время запросов и число строк попадают в метрики текущего HTTP-запроса
+            db_config.setdefault('cursor_factory', api_metrics.TimedCursor)
+        self._pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, **db_config)
+        # Семафор ограничивает число одновременно выданных подключений
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        # id(conn) -> время последнего возврата в пул
+        self._last_used: Dict[int, float] = {}
+
+        self._stats = {
+            'checkouts': 0,
+            'in_use': 0,
+            'max_in_use': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'health_check_failures': 0,
+        }
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """
+        Выдать подключение из пула на время блока with.
+
+        Если все подключения заняты — ждём не дольше self.timeout секунд,
+        затем бросаем PoolTimeoutError. После блока открытая транзакция
+        откатывается, а подключение возвращается в пул.
+        """
+        started = time.perf_counter()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['waits'] += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                raise PoolTimeoutError(
+                    f"Нет свободного подключения к БД за {self.timeout} с (max={self.maxconn})"
+                )
+        waited = time.perf_counter() - started
+        api_metrics.record_pool_wait(waited)
+
+        conn = None
+        try:
+            conn = self._getconn()
+            with self._lock:
+                self._stats['checkouts'] += 1
+                self._stats['wait_time_total'] += waited
+                self._stats['in_use'] += 1
+                self._stats['max_in_use'] = max(self._stats['max_in_use'], self._stats['in_use'])
+            try:
+                yield conn
+            finally:
+                with self._lock:
+                    self._stats['in_use'] -= 1
+        finally:
+            if conn is not None:
+                self._putconn(conn)
+            self._slots.release()
+
+    def _getconn(self):
+        """
+        Взять живое подключение из пула. "Мёртвые" подключения (например, после
+        перезапуска БД мертвы все простаивающие) закрываются, и берётся следующее —
+        не больше maxconn попыток; новое подключение пула проверяется так же.
+        """
+        for _ in range(self.maxconn):
+            conn = self._pool.getconn()
+            if self._is_alive(conn):
+                return conn
+            with self._lock:
+                self._stats['health_check_failures'] += 1
+                self._last_used.pop(id(conn), None)
+            self._pool.putconn(conn, close=True)
+        raise psycopg2.OperationalError(
+            f"Нет рабочего подключения к БД: {self.maxconn} подключений подряд не прошли проверку"
+        )
+
+    def _putconn(self, conn) -> None:
+        """Вернуть подключение в пул; сломанное подключение закрывается."""
+        broken = conn.closed != 0
+        if not broken:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        with self._lock:
+            if broken:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+        self._pool.putconn(conn, close=broken)
+
+    def _is_alive(self, conn) -> bool:
+        """
+        Проверка подключения перед выдачей.
+        SELECT 1 выполняется только для подключений, простоявших дольше health_check_idle,
+        чтобы не добавлять лишний round-trip к каждому запросу.
+        """
+        if conn.closed != 0:
+            return False
+        with self._lock:
+            last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.health_check_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Снимок счётчиков пула."""
+        with self._lock:
+            result = dict(self._stats)
+        result['minconn'] = self.minconn
+        result['maxconn'] = self.maxconn
+        result['wait_time_total'] = round(result['wait_time_total'], 6)
+        return result
+
+    def close(self) -> None:
+        """Закрыть все подключения пула."""
+        self._pool.closeall()
+
+
+_pool: Optional[DBPool] = None
+_executor: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+_executor_lock = threading.Lock()
+
+
+def init_pool() -> DBPool:
+    """Создать глобальный пул (вызывается при старте приложения)."""
+    global _pool
+    get_executor()
+    with _pool_lock:
+        if _pool is None:
+            _pool = DBPool(**POOL_CONFIG, **DB_CONFIG)
+        return _pool
+
+
+def close_pool() -> None:
+    """Закрыть глобальный пул и пул потоков (вызывается при остановке приложения)."""
+    global _pool, _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Пул потоков для блокирующих запросов к БД."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix='db')
+        return _executor
+
+
+async def run_in_db_thread(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Выполнить блокирующую функцию работы с БД в пуле потоков и дождаться результата,
+    не блокируя event loop. Исключения (в том числе HTTPException) пробрасываются как есть.
+    Контекст (contextvars) переносится в поток, как в asyncio.to_thread: метрики запроса
+    видят время работы с БД.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(context.run, func, *args, **kwargs)
+    )
+
+
+def get_pool() -> DBPool:
+    """Вернуть глобальный пул, создав его при первом обращении."""
+    return _pool if _pool is not None else init_pool()
+
+
+def pool_stats() -> Optional[Dict[str, Any]]:
+    """
+    Счётчики глобального пула или None, если пул ещё не создан.
+    Пул при этом не создаётся: вызывается прямо из async-эндпоинтов (/api/health, /metrics),
+    а подключение к недоступной БД заблокировало бы event loop на таймаут подключения.
+    """
+    pool = _pool
+    return pool.stats() if pool is not None else None
+
+
+__all__ = [
+    "DB_CONFIG",
+    "POOL_CONFIG",
+    "DBPool",
+    "PoolTimeoutError",
+    "init_pool",
+    "close_pool",
+    "get_pool",
+    "pool_stats",
+    "get_executor",
+    "run_in_db_thread",
+]
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Потоковая выгрузка таблиц целиком для аналитики (/api/export/schools, /api/export/reviews).
+
+Форматы:
+  csv     — COPY (SELECT ...) TO STDOUT: строки формирует сам PostgreSQL, API только
+            пересылает байты. COPY пишет в поток-производитель, тот — в очередь
+            ограниченного размера, из которой читает StreamingResponse;
+  arrow   — Arrow IPC stream, по RecordBatch на порцию серверного курсора;
+  parquet — Parquet, по row group на порцию серверного курсора.
+
+В любом формате в памяти API одновременно не больше одной порции, сколько бы ни было строк.
+Arrow и Parquet требуют pyarrow — необязательная зависимость (pip install pyarrow).
+"""
+
+import contextvars
+import os
+import queue
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+EXPORT_CONFIG = {
+    # Строк в одной порции серверного курсора (RecordBatch / row group)
+    'batch_rows': int(os.getenv('EXPORT_BATCH_ROWS', '10000')),
+    # Байт, после которых накопленные строки COPY отправляются клиенту
+    'chunk_size': int(os.getenv('EXPORT_CHUNK_SIZE', str(256 * 1024))),
+    # Порций COPY в очереди между БД и клиентом (при медленном клиенте COPY ждёт)
+    'queue_size': int(os.getenv('EXPORT_QUEUE_SIZE', '16')),
+    'parquet_compression': os.getenv('EXPORT_PARQUET_COMPRESSION', 'zstd'),
+}
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrow'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+# Колонки выгрузки: (имя, выражение SQL, тип Arrow). Выражения приводят NUMERIC и JSONB
+# к типам, которые без преобразований ложатся в Arrow.
+EXPORT_TABLES: Dict[str, Dict[str, Any]] = {
+    'schools': {
+        'source': 'sa.school_summary',
+        'order_by': 'school_id',
+        'columns': [
+            ('school_id', 'school_id', 'int32'),
+            ('name_2gis', 'name_2gis', 'string'),
+            ('name_ym', 'name_ym', 'string'),
+            ('school_address', 'school_address', 'string'),
+            ('building_type', 'building_type', 'string'),
+            ('floors', 'floors', 'int32'),
+            ('year_built', 'year_built', 'int32'),
+            ('reconstruction_year', 'reconstruction_year', 'int32'),
+            ('has_sports_complex', 'has_sports_complex', 'bool'),
+            ('has_pool', 'has_pool', 'bool'),
+            ('has_stadium', 'has_stadium', 'bool'),
+            ('has_sports_ground', 'has_sports_ground', 'bool'),
+            ('lon', 'lon', 'float64'),
+            ('lat', 'lat', 'float64'),
+            ('rating_yandex', 'rating_yandex::float8', 'float64'),
+            ('rating_2gis', 'rating_2gis::float8', 'float64'),
+            ('link_2gis', 'link_2gis', 'string'),
+            ('link_yandex', 'link_yandex', 'string'),
+            ('review_count', 'review_count', 'int64'),
+            ('last_review_date', 'last_review_date', 'date32'),
+        ],
+    },
+    'reviews': {
+        'source': 'sa.review',
+        'order_by': 'review_id',
+        'columns': [
+            ('review_id', 'review_id', 'int32'),
+            ('school_id', 'school_id', 'int32'),
+            ('review_date', 'review_date', 'date32'),
+            ('review_text', 'review_text', 'string'),
+            ('likes_count', 'likes_count', 'int32'),
+            ('dislikes_count', 'dislikes_count', 'int32'),
+            ('review_rating', 'review_rating', 'int32'),
+            ('topics', 'topics::text', 'string'),
+            ('overall', 'overall', 'string'),
+        ],
+    },
+}
+
+
+def pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_query(table: str, school_id: Optional[int] = None) -> Tuple[str, List[Any]]:
+    """SELECT для выгрузки таблицы: колонки EXPORT_TABLES, при school_id — только одна школа."""
+    spec = EXPORT_TABLES[table]
+    columns = ", ".join(expr if expr == name else f"{expr} AS {name}" for name, expr, _ in spec['columns'])
+    query = f"SELECT {columns} FROM {spec['source']}"
+    params: List[Any] = []
+    if school_id is not None:
+        query += " WHERE school_id = %s"
+        params.append(school_id)
+    query += f" ORDER BY {spec['order_by']}"
+    return query, params
+
+
+class ExportCancelled(Exception):
+    """Клиент закрыл соединение: COPY прерывается."""
+
+
+class _CopyPipe:
+    """
+    Файл для cursor.copy_expert: COPY пишет строки в потоке-производителе,
+    они склеиваются в порции по chunk_size и передаются через очередь
+    ограниченного размера генератору, который отдаёт их клиенту.
+    """
+
+    _DONE = object()
+
+    def __init__(self):
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=EXPORT_CONFIG['queue_size'])
+        self._cancelled = threading.Event()
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+        self.error: Optional[BaseException] = None
+
+    def write(self, data: bytes) -> int:
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= EXPORT_CONFIG['chunk_size']:
+            self._flush()
+        return len(data)
+
+    def _flush(self) -> None:
+        if self._buffer:
+            chunk = b"".join(self._buffer)
+            self._buffer.clear()
+            self._buffered = 0
+            self._put(chunk)
+
+    def _put(self, item: Any) -> None:
+        # Ждём место в очереди, но не дольше, чем клиент остаётся подключён
+        while True:
+            if self._cancelled.is_set():
+                raise ExportCancelled()
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def run(self, cursor, sql: str) -> None:
+        """Тело потока-производителя."""
+        try:
+            cursor.copy_expert(sql, self)
+            self._flush()
+        except BaseException as e:  # ошибку COPY пробрасывает генератор chunks()
+            self.error = e
+        finally:
+            try:
+                self._put(self._DONE)
+            except ExportCancelled:
+                pass
+
+    def chunks(self) -> Iterator[bytes]:
+        while True:
+            item = self._queue.get()
+            if item is self._DONE:
+                break
+            yield item
+        if self.error is not None and not isinstance(self.error, ExportCancelled):
+            raise self.error
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+
+def stream_csv(conn, table: str, school_id: Optional[int] = None) -> Iterator[bytes]:
+    """CSV с заголовком через COPY TO STDOUT."""
+    query, params = build_query(table, school_id)
+    cursor = conn.cursor()
+    try:
+        sql = "COPY (" + cursor.mogrify(query, params).decode("utf-8") + ") TO STDOUT WITH (FORMAT csv, HEADER true)"
+        pipe = _CopyPipe()
+        # Контекст (contextvars) переносится в поток COPY, как в api_db.run_in_db_thread:
+        # время и строки COPY попадают в метрики запроса
+        context = contextvars.copy_context()
+        producer = threading.Thread(
+            target=context.run, args=(pipe.run, cursor, sql), name=f"export-{table}", daemon=True
+        )
+        producer.start()
+        try:
+            yield from pipe.chunks()
+        finally:
+            # Досрочное закрытие генератора (клиент отключился) прерывает COPY
+            pipe.cancel()
+            producer.join()
+    finally:
+        cursor.close()
+
+
+class _ChunkSink:
+    """Файл для писателей pyarrow: копит записанные байты до следующего drain()."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def writable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _arrow_schema(table: str):
+    import pyarrow as pa
+
+    types = {
+        'int32': pa.int32(),
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'bool': pa.bool_(),
+        'string': pa.string(),
+        'date32': pa.date32(),
+    }
+    return pa.schema([(name, types[kind]) for name, _, kind in EXPORT_TABLES[table]['columns']])
+
+
+def stream_arrow(conn, table: str, fmt: str, school_id: Optional[int] = None) -> Iterator[bytes]:
+    """Arrow IPC stream или Parquet: серверный курсор читается порциями по batch_rows строк."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(table)
+    query, params = build_query(table, school_id)
+    sink = _ChunkSink()
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression=EXPORT_CONFIG['parquet_compression'])
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    cursor = conn.cursor(name=f"export_{table}")
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_CONFIG['batch_rows'])
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            batch = pa.record_batch(
+                [pa.array(columns[i], type=field.type) for i, field in enumerate(schema)],
+                schema=schema,
+            )
+            if fmt == 'parquet':
+                writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                writer.write_batch(batch)
+            data = sink.drain()
+            if data:
+                yield data
+        writer.close()
+        data = sink.drain()
+        if data:
+            yield data
+    finally:
+        cursor.close()
+
+
+def stream_export(conn, table: str, fmt: str, school_id: Optional[int] = None) -> Iterator[bytes]:
+    """Выгрузка таблицы table в формате fmt порциями байт."""
+    if fmt == 'csv':
+        return stream_csv(conn, table, school_id)
+    return stream_arrow(conn, table, fmt, school_id)
+
+
+__all__ = [
+    "EXPORT_CONFIG",
+    "FORMATS",
+    "EXPORT_TABLES",
+    "pyarrow_available",
+    "build_query",
+    "stream_export",
+]
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Быстрая сериализация ответов API.
+
+FastJSONResponse кодирует ответ через orjson (необязательная зависимость, pip install orjson),
+а без него — через стандартный json без экранирования кириллицы. Эндпоинты с большими
+ответами возвращают FastJSONResponse сами, минуя jsonable_encoder.
+
+EncodedBody — уже закодированное тело ответа (и его gzip/brotli-версии) для кэша:
+при попадании в кэш в сокет пишутся готовые байты, без сериализации и сжатия.
+"""
+
+import decimal
+import gzip
+import json
+import os
+import struct
+import time
+from typing import Any, Dict, Optional, Set
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+try:
+    from api import api_metrics
+except ImportError:  # запуск как `python api/main.py`
+    import api_metrics
+
+try:
+    import orjson  # необязательная зависимость
+except ImportError:
+    orjson = None
+
+try:
+    import brotli  # необязательная зависимость
+except ImportError:
+    brotli = None
+
+COMPRESS_CONFIG = {
+    'enabled': os.getenv('RESPONSE_COMPRESS', '1') == '1',
+    # Тела меньше этого размера (байт) не сжимаются
+    'min_size': int(os.getenv('RESPONSE_COMPRESS_MIN_SIZE', '1024')),
+    'gzip_level': int(os.getenv('RESPONSE_GZIP_LEVEL', '6')),
+    'brotli_quality': int(os.getenv('RESPONSE_BROTLI_QUALITY', '5')),
+}
+
+
+def _default(value: Any) -> Any:
+    """Типы, которые не умеют json/orjson: NUMERIC из psycopg2 и даты (для json)."""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def dumps(content: Any) -> bytes:
+    """Объект → JSON в UTF-8; время кодирования попадает в метрики запроса."""
+    started = time.perf_counter()
+    if orjson is not None:
+        body = orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    else:
+        body = json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+    api_metrics.record_serialization(time.perf_counter() - started)
+    return body
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse с кодированием через dumps (orjson, если установлен)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def accepted_encodings(header: Optional[str]) -> Set[str]:
+    """Кодировки из Accept-Encoding, кроме явно запрещённых (q=0)."""
+    result = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                pass
+        result.add(name)
+    return result
+
+
+class EncodedBody:
+    """JSON-тело ответа, закодированное один раз, и его сжатые версии."""
+
+    __slots__ = ('identity', 'gzip', 'br')
+
+    def __init__(self, identity: bytes, gzip_body: Optional[bytes] = None, br_body: Optional[bytes] = None):
+        self.identity = identity
+        self.gzip = gzip_body
+        self.br = br_body
+
+    @classmethod
+    def encode(cls, content: Any) -> "EncodedBody":
+        """Сериализовать content и заранее сжать, если тело достаточно большое."""
+        identity = dumps(content)
+        if not COMPRESS_CONFIG['enabled'] or len(identity) < COMPRESS_CONFIG['min_size']:
+            return cls(identity)
+        started = time.perf_counter()
+        gzip_body = gzip.compress(identity, compresslevel=COMPRESS_CONFIG['gzip_level'])
+        br_body = None
+        if brotli is not None:
+            br_body = brotli.compress(identity, quality=COMPRESS_CONFIG['brotli_quality'])
+        api_metrics.record_serialization(time.perf_counter() - started)
+        return cls(identity, gzip_body, br_body)
+
+    def size(self) -> int:
+        return len(self.identity) + len(self.gzip or b"") + len(self.br or b"")
+
+    # Заголовок pack(): длины identity, gzip и br; 0xFFFFFFFF — версии нет
+    _HEADER = struct.Struct(">III")
+    _ABSENT = 0xFFFFFFFF
+
+    def pack(self) -> bytes:
+        """Все версии тела одним блобом — для общего кэша (RedisBackend с codec)."""
+        parts = (self.identity, self.gzip, self.br)
+        header = self._HEADER.pack(*(len(p) if p is not None else self._ABSENT for p in parts))
+        return header + b"".join(p for p in parts if p is not None)
+
+    @classmethod
+    def unpack(cls, blob: bytes) -> "EncodedBody":
+        """Обратное к pack()."""
+        offset = cls._HEADER.size
+        parts = []
+        for length in cls._HEADER.unpack_from(blob):
+            if length == cls._ABSENT:
+                parts.append(None)
+                continue
+            parts.append(bytes(blob[offset:offset + length]))
+            offset += length
+        return cls(*parts)
+
+    def response(self, request: Request, headers: Dict[str, str]) -> Response:
+        """Ответ с лучшей из поддерживаемых клиентом кодировок."""
+        headers = dict(headers)
+        body = self.identity
+        if COMPRESS_CONFIG['enabled']:
+            # И для несжатого тела: 304 по тому же ETag отдаётся с тем же Vary
+            headers["Vary"] = "Accept-Encoding"
+        if self.gzip is not None:
+            accepted = accepted_encodings(request.headers.get("accept-encoding"))
+            if self.br is not None and "br" in accepted:
+                body = self.br
+                headers["Content-Encoding"] = "br"
+            elif "gzip" in accepted:
+                body = self.gzip
+                headers["Content-Encoding"] = "gzip"
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+__all__ = [
+    "COMPRESS_CONFIG",
+    "dumps",
+    "FastJSONResponse",
+    "accepted_encodings",
+    "EncodedBody",
+]
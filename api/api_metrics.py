@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Метрики API в текстовом формате Prometheus (/metrics) и журнал медленных запросов к БД.
+
+MetricsMiddleware измеряет каждый HTTP-запрос: время ответа, статус и размер тела.
+Что происходило внутри запроса, накапливается в RequestMetrics текущего контекста
+(contextvars; run_in_db_thread переносит контекст в поток БД):
+  - время запросов к БД и число строк — TimedCursor (cursor_factory подключений пула);
+  - ожидание свободного подключения — DBPool.connection;
+  - кодирование JSON и сжатие — api_json.
+По окончании ответа всё это попадает в гистограммы с меткой route — шаблоном пути
+(/api/schools/{school_id}), а не самим путём, чтобы число рядов не росло.
+
+Запросы к БД дольше SLOW_QUERY_MS логируются с текстом и параметрами.
+"""
+
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import psycopg2.extensions
+
+METRICS_CONFIG = {
+    'enabled': os.getenv('METRICS_ENABLED', '1') == '1',
+    # Запросы к БД дольше этого (мс) пишутся в лог с параметрами; 0 — не логировать
+    'slow_query_ms': float(os.getenv('SLOW_QUERY_MS', '500')),
+    # Сколько символов запроса и параметров выводить в лог
+    'slow_query_max_chars': int(os.getenv('SLOW_QUERY_MAX_CHARS', '1000')),
+}
+
+PREFIX = "schools_api"
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+
+class RequestMetrics:
+    """Счётчики одного HTTP-запроса; заполняются из любых потоков, работающих на него."""
+
+    __slots__ = ('path', 'db_time', 'db_queries', 'rows', 'pool_wait', 'serialize_time')
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self.db_time = 0.0
+        self.db_queries = 0
+        self.rows = 0
+        self.pool_wait = 0.0
+        self.serialize_time = 0.0
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar('request_metrics', default=None)
+
+
+def current() -> Optional[RequestMetrics]:
+    return _current.get()
+
+
+def record_pool_wait(seconds: float) -> None:
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.pool_wait += seconds
+
+
+def record_serialization(seconds: float) -> None:
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.serialize_time += seconds
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple = (), value: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        if not values and not self.labelnames:
+            values = [((), 0)]
+        for labels, value in values:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.labelnames = tuple(labelnames)
+        # labels -> [счётчики по корзинам (не накопительные), сумма, количество]
+        self._values: Dict[Tuple, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple, value: float) -> None:
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((labels, ([*state[0]], state[1], state[2])) for labels, state in self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    f"{PREFIX}_http_request_duration_seconds", "Время обработки HTTP-запроса",
+    LATENCY_BUCKETS, ("route", "method", "status"),
+)
+RESPONSE_BYTES = Histogram(
+    f"{PREFIX}_http_response_bytes", "Размер тела ответа (после сжатия)", BYTES_BUCKETS, ("route",),
+)
+DB_DURATION = Histogram(
+    f"{PREFIX}_db_query_duration_seconds", "Суммарное время запросов к БД за HTTP-запрос",
+    LATENCY_BUCKETS, ("route",),
+)
+DB_QUERIES = Counter(f"{PREFIX}_db_queries_total", "Запросов к БД", ("route",))
+DB_ROWS = Histogram(f"{PREFIX}_db_rows", "Строк получено из БД за HTTP-запрос", ROWS_BUCKETS, ("route",))
+POOL_WAIT = Histogram(
+    f"{PREFIX}_db_pool_wait_duration_seconds", "Ожидание свободного подключения к БД за HTTP-запрос",
+    LATENCY_BUCKETS, ("route",),
+)
+SERIALIZE_DURATION = Histogram(
+    f"{PREFIX}_serialization_duration_seconds", "Кодирование JSON и сжатие ответа за HTTP-запрос",
+    LATENCY_BUCKETS, ("route",),
+)
+SLOW_QUERIES = Counter(f"{PREFIX}_db_slow_queries_total", "Запросов к БД дольше SLOW_QUERY_MS")
+
+REGISTRY = [
+    REQUEST_DURATION,
+    RESPONSE_BYTES,
+    DB_DURATION,
+    DB_QUERIES,
+    DB_ROWS,
+    POOL_WAIT,
+    SERIALIZE_DURATION,
+    SLOW_QUERIES,
+]
+
+
+def _shorten(value: Any) -> str:
+    text = " ".join(str(value).split())
+    limit = METRICS_CONFIG['slow_query_max_chars']
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """
+    Курсор, считающий время запросов и число строк в RequestMetrics текущего запроса.
+    Для серверных (именованных) курсоров строки приходят при fetch*, их время тоже учитывается.
+    """
+
+    def _record(self, started: float, rows: int = 0, queries: int = 0) -> float:
+        elapsed = time.perf_counter() - started
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.db_time += elapsed
+            metrics.rows += rows
+            metrics.db_queries += queries
+        return elapsed
+
+    def _record_query(self, started: float, query: Any, params: Any, rows: int = 0) -> None:
+        """Учесть выполненный запрос и залогировать его, если он дольше SLOW_QUERY_MS."""
+        elapsed = self._record(started, rows, queries=1)
+        threshold = METRICS_CONFIG['slow_query_ms']
+        if not threshold or elapsed * 1000 < threshold:
+            return
+        metrics = _current.get()
+        path = metrics.path if metrics is not None else "-"
+        SLOW_QUERIES.inc()
+        print(
+            f"[WARN] Медленный запрос {elapsed * 1000:.0f} мс ({path}): {_shorten(query)}"
+            + (f" параметры={_shorten(repr(params))}" if params is not None else "")
+        )
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            # Обычный курсор получает все строки SELECT уже при execute
+            rows = self.rowcount if self.name is None and self.description and self.rowcount > 0 else 0
+            self._record_query(started, query, vars, rows)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._record_query(started, query, None)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self._record_query(started, sql, None, max(self.rowcount, 0))
+
+    # Для обычного курсора строки уже посчитаны в execute, здесь — только серверные курсоры
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._record(started, 1 if self.name is not None and row is not None else 0)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(size) if size is not None else super().fetchmany()
+        self._record(started, len(rows) if self.name is not None else 0)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._record(started, len(rows) if self.name is not None else 0)
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._record(started)
+            raise
+        self._record(started, 1 if self.name is not None else 0)
+        return row
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: время, статус и размер каждого HTTP-ответа + счётчики из RequestMetrics."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = RequestMetrics(scope.get("path", ""))
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_counted(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_counted)
+        finally:
+            _current.reset(token)
+            # Маршрут известен только после роутинга; ненайденные пути — одной меткой
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            labels = (route,)
+            REQUEST_DURATION.observe((route, scope.get("method", ""), str(status)), time.perf_counter() - started)
+            RESPONSE_BYTES.observe(labels, size)
+            if metrics.db_queries:
+                DB_DURATION.observe(labels, metrics.db_time)
+                DB_QUERIES.inc(labels, metrics.db_queries)
+                DB_ROWS.observe(labels, metrics.rows)
+                POOL_WAIT.observe(labels, metrics.pool_wait)
+            if metrics.serialize_time:
+                SERIALIZE_DURATION.observe(labels, metrics.serialize_time)
+
+
+def _stat_lines(name: str, kind: str, documentation: str, samples: List[Tuple[str, Any]]) -> List[str]:
+    if not samples:
+        return []
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{labels} {_number(value)}" for labels, value in samples)
+    return lines
+
+
+def render(
+    pool: Optional[Dict[str, Any]] = None,
+    caches: Optional[Dict[str, Dict[str, Any]]] = None,
+    single_flight: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Все метрики в текстовом формате Prometheus: накопленные middleware
+    и снимок счётчиков пула, кэшей и single-flight на момент запроса.
+    """
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+
+    if pool is not None:
+        for key, kind, documentation in (
+            ('checkouts', 'counter', 'Выдано подключений из пула'),
+            ('waits', 'counter', 'Ожиданий свободного подключения'),
+            ('timeouts', 'counter', 'Таймаутов ожидания подключения'),
+            ('health_check_failures', 'counter', 'Подключений, не прошедших проверку'),
+            ('in_use', 'gauge', 'Подключений занято сейчас'),
+            ('max_in_use', 'gauge', 'Максимум одновременно занятых подключений'),
+            ('maxconn', 'gauge', 'Размер пула'),
+        ):
+            suffix = "_total" if kind == 'counter' else ""
+            lines.extend(_stat_lines(f"{PREFIX}_db_pool_{key}{suffix}", kind, documentation, [("", pool.get(key, 0))]))
+        lines.extend(_stat_lines(
+            f"{PREFIX}_db_pool_wait_seconds_total", "counter", "Суммарное ожидание подключений",
+            [("", pool.get('wait_time_total', 0.0))],
+        ))
+
+    if caches:
+        requests, entries, evictions = [], [], []
+        for cache, stats in sorted(caches.items()):
+            for namespace, counts in sorted(stats.get('namespaces', {}).items()):
+                for result, key in (("hit", 'hits'), ("miss", 'misses')):
+                    requests.append((
+                        _labels(("cache", "namespace", "result"), (cache, namespace, result)), counts.get(key, 0)
+                    ))
+            entries.append((_labels(("cache",), (cache,)), stats.get('size', 0)))
+            evictions.append((_labels(("cache",), (cache,)), stats.get('evictions', 0)))
+        lines.extend(_stat_lines(f"{PREFIX}_cache_requests_total", "counter", "Обращений к кэшу ответов", requests))
+        lines.extend(_stat_lines(f"{PREFIX}_cache_entries", "gauge", "Записей в кэше", entries))
+        lines.extend(_stat_lines(f"{PREFIX}_cache_evictions_total", "counter", "Вытеснений из кэша", evictions))
+
+    if single_flight is not None:
+        samples = []
+        for namespace, counts in sorted(single_flight.get('namespaces', {}).items()):
+            for role in ('leaders', 'followers'):
+                samples.append((_labels(("namespace", "role"), (namespace, role[:-1])), counts.get(role, 0)))
+        lines.extend(_stat_lines(
+            f"{PREFIX}_single_flight_total", "counter", "Запросов: выполнивших вычисление и дождавшихся чужого",
+            samples,
+        ))
+
+    return "\n".join(lines) + "\n"
+
+
+__all__ = [
+    "METRICS_CONFIG",
+    "RequestMetrics",
+    "current",
+    "record_pool_wait",
+    "record_serialization",
+    "TimedCursor",
+    "MetricsMiddleware",
+    "render",
+]
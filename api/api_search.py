@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Нормализация строки поиска школ — общая для API (main.py, снимок карты api_snapshot)
+и сборки локального хранилища (api_storage.py). Модуль без зависимостей:
+сборка SQLite-файла не импортирует приложение FastAPI.
+"""
+
+import re
+from typing import Optional
+
+# Нормализация строки поиска — та же, что sa.normalize_school_name в БД
+# (create_school_search.sql) и norm() в parsing_data_main.py
+RE_SEARCH_NON_WORD = re.compile(r"[^а-я0-9a-z]+")
+RE_SEARCH_SOSH = re.compile(r" средн\S*\s+общеобразовательн\S*\s+школ\S*(?= )")
+RE_SEARCH_SCHOOL_TYPE = re.compile(r" (моу|маоу|гоу|гбоу|фгоу|фгбоу|чоу|аноо|мкоу|мбоу|гапоу|гаоу|мау)(?= )")
+
+
+def normalize_school_query(value: Optional[str]) -> str:
+    """
+    Строка поиска → вид колонки sa.school.search_name: нижний регистр, ё → е,
+    только буквы и цифры, «средняя общеобразовательная школа» → «сош», без МОУ/МАОУ/...
+    Так «МОУ СОШ №6» и «средняя общеобразовательная школа 6» ищутся одинаково.
+    """
+    value = " " + RE_SEARCH_NON_WORD.sub(" ", (value or "").lower().replace("ё", "е")) + " "
+    value = RE_SEARCH_SOSH.sub(" сош", value)
+    value = RE_SEARCH_SCHOOL_TYPE.sub(" ", value)
+    return re.sub(r"\s+", " ", value).strip()
+
+
+__all__ = [
+    "normalize_school_query",
+]
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Снимок школ в памяти для фильтров карты (/api/schools/map).
+
+Школ немного, а меняются они только при запуске загрузчиков. В режиме MAP_SNAPSHOT=1
+API один раз читает sa.school_summary в столбцы NumPy (год постройки, рейтинг, битовые
+маски спортобъектов, lon/lat) и дальше фильтрует их векторными масками,
+не обращаясь к PostgreSQL. Текстового поиска в снимке нет: запросы с search идут в БД
+(search_tsv, триграммы и ранжирование _search_order), иначе ответ для одного ETag
+зависел бы от MAP_SNAPSHOT и от того, какой воркер его собрал. При смене sa.data_version снимок пересобирается и подменяется
+целиком: запросы, начатые на старом снимке, дочитывают его без блокировок.
+
+NumPy — необязательная зависимость (pip install numpy); без неё режим отключается.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+MAP_SNAPSHOT = os.getenv('MAP_SNAPSHOT', '0') == '1'
+
+# Порядок битов в масках спортобъектов
+SPORT_FLAGS = ('has_pool', 'has_stadium', 'has_sports_ground', 'has_sports_complex')
+
+# Колонки sa.school_summary, из которых строится снимок
+SNAPSHOT_QUERY = """
+    SELECT
+        school_id,
+        name_2gis,
+        name_ym,
+        school_address,
+        year_built,
+        has_sports_complex,
+        has_pool,
+        has_stadium,
+        has_sports_ground,
+        lon,
+        lat,
+        rating_yandex
+    FROM sa.school_summary
+    ORDER BY school_id
+"""
+
+
+class SchoolSnapshot:
+    """
+    Неизменяемый столбцовый снимок школ одной версии данных.
+    records — готовые объекты школ для ответа карты в порядке school_id.
+    """
+
+    def __init__(self, rows: List[Tuple], version: int):
+        import numpy as np  # необязательная зависимость
+
+        self._np = np
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+        n = len(rows)
+        self.school_id = np.array([row[0] for row in rows], dtype=np.int64)
+        self.year_built = np.array(
+            [row[4] if row[4] is not None else np.nan for row in rows], dtype=np.float64
+        )
+        self.rating = np.array(
+            [float(row[11]) if row[11] is not None else np.nan for row in rows], dtype=np.float64
+        )
+        self.lon = np.array([row[9] if row[9] is not None else np.nan for row in rows], dtype=np.float64)
+        self.lat = np.array([row[10] if row[10] is not None else np.nan for row in rows], dtype=np.float64)
+
+        # Флаг может быть NULL, поэтому две маски: где он true и где он false (как has_* = %s в SQL)
+        self.flags_true = np.zeros(n, dtype=np.uint8)
+        self.flags_false = np.zeros(n, dtype=np.uint8)
+        for i, row in enumerate(rows):
+            values = {
+                'has_sports_complex': row[5],
+                'has_pool': row[6],
+                'has_stadium': row[7],
+                'has_sports_ground': row[8],
+            }
+            for bit, name in enumerate(SPORT_FLAGS):
+                if values[name] is True:
+                    self.flags_true[i] |= 1 << bit
+                elif values[name] is False:
+                    self.flags_false[i] |= 1 << bit
+
+        self.records: List[Dict[str, Any]] = [
+            {
+                "school_id": row[0],
+                "name_2gis": row[1],
+                "name_ym": row[2],
+                "school_address": row[3],
+                "year_built": row[4],
+                "has_sports_complex": row[5],
+                "has_pool": row[6],
+                "has_stadium": row[7],
+                "has_sports_ground": row[8],
+                "location": {
+                    "type": "Point",
+                    "coordinates": [float(row[9]), float(row[10])]
+                    if row[9] is not None and row[10] is not None else None,
+                },
+                "rating_yandex": float(row[11]) if row[11] is not None else None,
+            }
+            for row in rows
+        ]
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def mask(
+        self,
+        year_min: Optional[int],
+        year_max: Optional[int],
+        rating_min: Optional[float],
+        rating_max: Optional[float],
+        has_pool: Optional[bool],
+        has_stadium: Optional[bool],
+        has_sports_ground: Optional[bool],
+        has_sports_complex: Optional[bool],
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+    ):
+        """Булева маска школ по тем же фильтрам, что и _map_where в main.py (кроме search)."""
+        np = self._np
+        mask = np.ones(len(self.records), dtype=bool)
+        # Сравнение с NaN даёт False — как сравнение с NULL в SQL
+        if year_min is not None:
+            mask &= self.year_built >= year_min
+        if year_max is not None:
+            mask &= self.year_built <= year_max
+        if rating_min is not None:
+            mask &= self.rating >= rating_min
+        if rating_max is not None:
+            mask &= self.rating <= rating_max
+
+        flags = {
+            'has_pool': has_pool,
+            'has_stadium': has_stadium,
+            'has_sports_ground': has_sports_ground,
+            'has_sports_complex': has_sports_complex,
+        }
+        want_true = want_false = 0
+        for bit, name in enumerate(SPORT_FLAGS):
+            if flags[name] is True:
+                want_true |= 1 << bit
+            elif flags[name] is False:
+                want_false |= 1 << bit
+        if want_true:
+            mask &= (self.flags_true & want_true) == want_true
+        if want_false:
+            mask &= (self.flags_false & want_false) == want_false
+
+        if bbox is not None:
+            lon_min, lat_min, lon_max, lat_max = bbox
+            mask &= (self.lon >= lon_min) & (self.lon <= lon_max)
+            mask &= (self.lat >= lat_min) & (self.lat <= lat_max)
+        return mask
+
+    def schools(self, *filters: Any) -> Dict[str, Any]:
+        """Ответ /api/schools/map со списком школ в порядке school_id."""
+        np = self._np
+        idx = np.flatnonzero(self.mask(*filters))
+        schools = [self.records[i] for i in idx]
+        return {"schools": schools, "count": len(schools)}
+
+    def clusters(self, *filters: Any, zoom: int, cells: int) -> Dict[str, Any]:
+        """
+        Кластеры по сетке, как ST_SnapToGrid в _query_map_clusters:
+        координата округляется до ближайшего узла сетки с шагом 360 / 2^zoom / cells.
+        """
+        np = self._np
+        mask = self.mask(*filters)
+        mask &= ~(np.isnan(self.lon) | np.isnan(self.lat))
+        idx = np.flatnonzero(mask)
+        if not len(idx):
+            return {"clusters": [], "count": 0, "zoom": zoom}
+
+        cell = 360.0 / (2 ** zoom) / cells
+        lon, lat = self.lon[idx], self.lat[idx]
+        keys = np.stack([np.rint(lon / cell), np.rint(lat / cell)], axis=1)
+        _, group, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+        group = group.reshape(-1)
+        sum_lon = np.bincount(group, weights=lon)
+        sum_lat = np.bincount(group, weights=lat)
+        min_id = np.full(len(counts), np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(min_id, group, self.school_id[idx])
+
+        clusters = []
+        for g in np.argsort(-counts, kind='stable'):
+            cnt = int(counts[g])
+            clusters.append({
+                "count": cnt,
+                "location": {
+                    "type": "Point",
+                    "coordinates": [float(sum_lon[g] / cnt), float(sum_lat[g] / cnt)],
+                },
+                "school_id": int(min_id[g]) if cnt == 1 else None,
+            })
+        return {"clusters": clusters, "count": int(counts.sum()), "zoom": zoom}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'version': self.version,
+            'schools': len(self.records),
+            'age': round(time.monotonic() - self.loaded_at, 1),
+        }
+
+
+class SnapshotHolder:
+    """
+    Текущий снимок и его пересборка.
+    Подмена — одно присваивание ссылки, поэтому читатели никогда не видят
+    наполовину собранный снимок. Без версии данных (0) снимок живёт ttl секунд.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._snapshot: Optional[SchoolSnapshot] = None
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.build_time_total = 0.0
+
+    def get(self, version: int) -> Optional[SchoolSnapshot]:
+        """Снимок нужной версии, если он уже собран."""
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.version != version:
+            return None
+        if not version and time.monotonic() - snapshot.loaded_at >= self.ttl:
+            return None
+        return snapshot
+
+    def load(self, conn, version: int) -> SchoolSnapshot:
+        """
+        Собрать снимок версии version из sa.school_summary (вызывается в потоке пула БД).
+        Параллельные запросы на смене версии ждут одну сборку, а не строят снимок каждый.
+        """
+        with self._lock:
+            snapshot = self.get(version)
+            if snapshot is not None:
+                return snapshot
+            started = time.perf_counter()
+            with conn.cursor() as cur:
+                cur.execute(SNAPSHOT_QUERY)
+                rows = cur.fetchall()
+            snapshot = SchoolSnapshot(rows, version)
+            self.builds += 1
+            self.build_time_total += time.perf_counter() - started
+            self._snapshot = snapshot
+            return snapshot
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            'enabled': True,
+            'builds': self.builds,
+            'build_time_total': round(self.build_time_total, 6),
+            'current': snapshot.stats() if snapshot is not None else None,
+        }
+
+
+def create_holder(ttl: float) -> Optional[SnapshotHolder]:
+    """Хранилище снимка, если включён MAP_SNAPSHOT и установлен NumPy, иначе None."""
+    if not MAP_SNAPSHOT:
+        return None
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        print("[WARN] Пакет numpy не установлен, MAP_SNAPSHOT отключён (pip install numpy)")
+        return None
+    return SnapshotHolder(ttl)
+
+
+__all__ = [
+    "MAP_SNAPSHOT",
+    "SchoolSnapshot",
+    "SnapshotHolder",
+    "create_holder",
+]
@@ -0,0 +1,968 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Хранилище данных API: единый интерфейс репозитория и локальная реализация без сервера БД.
+
+STORAGE_BACKEND выбирает, откуда эндпоинты берут данные:
+  postgres — основной режим: PostgreSQL/PostGIS через пул api_db (PostgresRepository в main.py);
+  sqlite   — локальный режим: встроенный SQLite (модуль sqlite3 стандартной библиотеки)
+             в одном файле SQLITE_PATH. Файл собирается из тех же JSON, что читают
+             загрузчики db/db_src/db_insert:
+                 school_data/sd_2_stage/sd_2_stage_schools.json            — школы, рейтинги, ссылки;
+                 review_data/rd_3_stage/rd_3_stage_data/school_review_separately_*_final.json — отзывы.
+
+Обе реализации отдают одинаковые по форме ответы. Локальный режим не поддерживает то,
+что требует PostGIS и отдельных таблиц закрепления: векторные тайлы, поиск по закреплению
+домов и выгрузку (/tiles, /api/catchment/lookup, /api/export/*) — они отвечают 501.
+Поиск — по подстрокам нормализованных названия и адреса (как в снимке api_snapshot),
+расстояния — по сфере (формула гаверсинуса), а не по эллипсоиду, как в PostGIS.
+
+Сборка файла отдельно от API (аналог загрузчиков db/):
+
+    python api/api_storage.py
+
+Файл собирается во временный и подменяется целиком, версия данных при этом
+увеличивается — кэш ответов API сбрасывается так же, как после загрузчиков PostgreSQL.
+"""
+
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+try:
+    from api import api_json, api_search
+except ImportError:  # запуск как `python api/main.py`
+    import api_json
+    import api_search
+
+load_dotenv()
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
+
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'postgres')
+
+SQLITE_CONFIG = {
+    'path': os.getenv('SQLITE_PATH', os.path.join(PROJECT_ROOT, "school_data", "schools_local.sqlite3")),
+    'schools_json': os.path.join(PROJECT_ROOT, "school_data", "sd_2_stage", "sd_2_stage_schools.json"),
+    'reviews_dir': os.path.join(PROJECT_ROOT, "review_data", "rd_3_stage", "rd_3_stage_data"),
+}
+
+# Средний радиус Земли, м
+EARTH_RADIUS_M = 6371008.8
+
+SQLITE_SCHEMA = """
+    CREATE TABLE data_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL,
+        updated_at TEXT
+    );
+
+    -- Аналог sa.school_summary: школа, рейтинги, ссылки и статистика отзывов в одной строке
+    CREATE TABLE school_summary (
+        school_id INTEGER PRIMARY KEY,
+        name_2gis TEXT,
+        name_ym TEXT,
+        school_address TEXT,
+        building_type TEXT,
+        floors INTEGER,
+        year_built INTEGER,
+        reconstruction_year INTEGER,
+        has_sports_complex INTEGER,
+        has_pool INTEGER,
+        has_stadium INTEGER,
+        has_sports_ground INTEGER,
+        -- Нормализованное название и «название + адрес» для поиска
+        search_name TEXT NOT NULL DEFAULT '',
+        search_text TEXT NOT NULL DEFAULT '',
+        lon REAL NOT NULL,
+        lat REAL NOT NULL,
+        rating_yandex REAL,
+        rating_2gis REAL,
+        link_2gis TEXT,
+        link_yandex TEXT,
+        review_count INTEGER NOT NULL DEFAULT 0,
+        last_review_date TEXT,
+        topic_neg_share TEXT NOT NULL DEFAULT '{}'
+    );
+
+    CREATE INDEX idx_school_summary_lon_lat ON school_summary(lon, lat);
+
+    -- Аналог sa.review; даты — строки YYYY-MM-DD, topics — JSON-текст
+    CREATE TABLE review (
+        review_id INTEGER PRIMARY KEY,
+        school_id INTEGER NOT NULL,
+        review_date TEXT,
+        review_text TEXT,
+        likes_count INTEGER,
+        dislikes_count INTEGER,
+        review_rating INTEGER,
+        topics TEXT,
+        overall TEXT
+    );
+
+    CREATE INDEX idx_review_school_date ON review(school_id, review_date DESC, review_id);
+"""
+
+# Статистика отзывов в сводке — те же агрегаты, что в sa.school_summary
+SQLITE_SUMMARY_UPDATE = """
+    UPDATE school_summary SET
+        review_count = (
+            SELECT COUNT(*) FROM review r WHERE r.school_id = school_summary.school_id
+        ),
+        last_review_date = (
+            SELECT MAX(r.review_date) FROM review r WHERE r.school_id = school_summary.school_id
+        ),
+        topic_neg_share = COALESCE((
+            SELECT json_group_object(topic, neg_share)
+            FROM (
+                SELECT
+                    t.key AS topic,
+                    ROUND(CAST(SUM(t.value = 'neg') AS REAL) / COUNT(*), 3) AS neg_share
+                FROM review r, json_each(r.topics) t
+                WHERE r.school_id = school_summary.school_id
+                  AND json_type(r.topics) = 'object'
+                GROUP BY t.key
+            )
+        ), '{}')
+"""
+
+# Ключ периода графика тональности — как to_char(date_trunc(...)) в _query_topics_timeline
+SQLITE_PERIOD_EXPRESSIONS = {
+    "week": "date(r.review_date, '-' || ((CAST(strftime('%w', r.review_date) AS INTEGER) + 6) % 7) || ' days')",
+    "month": "strftime('%Y-%m', r.review_date)",
+    "quarter": "strftime('%Y', r.review_date) || '-Q' || ((CAST(strftime('%m', r.review_date) AS INTEGER) + 2) / 3)",
+    "year": "strftime('%Y', r.review_date)",
+}
+
+MAP_COLUMNS = """
+    s.school_id,
+    s.name_2gis,
+    s.name_ym,
+    s.school_address,
+    s.year_built,
+    s.has_sports_complex,
+    s.has_pool,
+    s.has_stadium,
+    s.has_sports_ground,
+    s.lon,
+    s.lat,
+    s.rating_yandex
+"""
+
+DETAIL_COLUMNS = """
+    s.school_id,
+    s.name_2gis,
+    s.name_ym,
+    s.school_address,
+    s.building_type,
+    s.floors,
+    s.year_built,
+    s.reconstruction_year,
+    s.has_sports_complex,
+    s.has_pool,
+    s.has_stadium,
+    s.has_sports_ground,
+    s.lon,
+    s.lat,
+    s.link_2gis,
+    s.link_yandex,
+    s.rating_yandex,
+    s.rating_2gis,
+    s.review_count,
+    s.last_review_date,
+    s.topic_neg_share
+"""
+
+REVIEW_COLUMNS = """
+    review_id,
+    school_id,
+    review_date,
+    review_text,
+    likes_count,
+    dislikes_count,
+    review_rating,
+    topics,
+    overall
+"""
+
+# Сколько строк за раз читает поток NDJSON
+REVIEWS_STREAM_FETCH = 500
+
+
+class SchoolRepository(ABC):
+    """
+    Интерфейс хранилища: по методу на эндпоинт. Методы синхронные и вызываются
+    через api_db.run_in_db_thread; ответы — готовые объекты для JSON.
+    Абстрактные методы обязательны: backend без любого из них не создаётся.
+    Необязательный метод, который backend не поддерживает, отвечает 501.
+    """
+
+    name = "base"
+
+    def open(self) -> None:
+        """Подготовка при старте приложения."""
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние хранилища для /api/health."""
+        return {}
+
+    def _unsupported(self, feature: str):
+        raise HTTPException(
+            status_code=501,
+            detail=f"Недоступно при STORAGE_BACKEND={self.name} (нужен PostgreSQL/PostGIS): {feature}"
+        )
+
+    @abstractmethod
+    def data_version(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def schools(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def schools_for_map(
+        self,
+        search: Optional[str],
+        year_min: Optional[int],
+        year_max: Optional[int],
+        rating_min: Optional[float],
+        rating_max: Optional[float],
+        has_pool: Optional[bool],
+        has_stadium: Optional[bool],
+        has_sports_ground: Optional[bool],
+        has_sports_complex: Optional[bool],
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        zoom: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def suggest(self, query: str, limit: int) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def nearest(self, lat: float, lon: float, k: int, *filters: Any) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def school_by_id(self, school_id: int) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def schools_batch(self, school_ids: Tuple[int, ...]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def reviews_topics(self, school_id: int) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def topics_timeline(self, school_id: int, interval: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def reviews_page(
+        self,
+        school_id: int,
+        date_start: Optional[date],
+        date_end: Optional[date],
+        after: Optional[Tuple[Optional[date], int]] = None,
+        limit: int = 100,
+    ) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def reviews_stream(
+        self,
+        school_id: int,
+        date_start: Optional[date],
+        date_end: Optional[date],
+        after: Optional[Tuple[Optional[date], int]] = None,
+    ) -> Iterator[bytes]:
+        raise NotImplementedError
+
+    def catchment_lookup(
+        self,
+        street: Optional[str],
+        house: Optional[str],
+        lat: Optional[float],
+        lon: Optional[float],
+    ) -> Dict[str, Any]:
+        self._unsupported("Поиск по закреплению домов")
+
+    def tile(self, z: int, x: int, y: int) -> bytes:
+        self._unsupported("Векторные тайлы")
+
+    def export(self, table: str, fmt: str, school_id: Optional[int]) -> Iterator[bytes]:
+        self._unsupported("Выгрузка таблиц")
+
+
+# --- Сборка файла SQLite из JSON ---
+
+
+def _bool_from_int_or_none(value: Any) -> Optional[int]:
+    """0/1/None (и строки '0'/'1') → 0/1/None, как bool_from_int_or_none в загрузчике школ."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return int(value)
+    try:
+        iv = int(value)
+    except (TypeError, ValueError):
+        return None
+    return iv if iv in (0, 1) else None
+
+
+def _float_or_none(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _empty_to_none(value: Any) -> Any:
+    if value is None or (isinstance(value, str) and value.strip() == ""):
+        return None
+    return value
+
+
+def _school_coordinates(s: Dict[str, Any]) -> Tuple[float, float]:
+    """lon, lat: сначала GeoJSON location.coordinates, затем longitude/latitude."""
+    loc = s.get("location")
+    if isinstance(loc, dict):
+        coords = loc.get("coordinates")
+        if (
+            isinstance(coords, list)
+            and len(coords) == 2
+            and isinstance(coords[0], (int, float))
+            and isinstance(coords[1], (int, float))
+        ):
+            return coords[0], coords[1]
+    lon, lat = s.get("longitude"), s.get("latitude")
+    if lon is None or lat is None:
+        raise ValueError(f"Нет координат для школы id={s.get('id')}")
+    return lon, lat
+
+
+def _school_row(s: Dict[str, Any], normalize: Callable[[Optional[str]], str]) -> Tuple:
+    """Строка school_summary из элемента sd_2_stage_schools.json (поля — как у загрузчиков школ, рейтингов и ссылок)."""
+    lon, lat = _school_coordinates(s)
+    name_2gis = s.get("name_2gis")
+    name_ym = s.get("short_name")
+    address = s.get("address")
+    search_name = normalize(f"{name_2gis or ''} {name_ym or ''}")
+    return (
+        s.get("id"),
+        name_2gis,
+        name_ym,
+        address,
+        s.get("building_type"),
+        s.get("floors"),
+        s.get("year_built"),
+        s.get("reconstruction_year"),
+        _bool_from_int_or_none(s.get("has_sports_complex")),
+        _bool_from_int_or_none(s.get("has_pool")),
+        _bool_from_int_or_none(s.get("has_stadium")),
+        _bool_from_int_or_none(s.get("has_sports_ground")),
+        search_name,
+        f"{search_name} {normalize(address)}",
+        lon,
+        lat,
+        _float_or_none(s.get("rating_yandex")),
+        _float_or_none(s.get("rating_2gis")),
+        s.get("link_2gis"),
+        s.get("link_yandex"),
+    )
+
+
+def _iter_review_rows(directory: str) -> Iterator[Tuple]:
+    """Отзывы из school_review_separately_*_final.json без полностью пустых (нет даты и текста)."""
+    if not os.path.isdir(directory):
+        print(f"[WARN] Папка с отзывами не найдена: {directory}")
+        return
+    for name in sorted(os.listdir(directory)):
+        if not (name.startswith("school_review_separately_") and name.endswith("_final.json")):
+            continue
+        with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+            reviews = json.load(f) or []
+        for review in reviews:
+            review_date = _empty_to_none(review.get("date"))
+            review_text = _empty_to_none(review.get("text"))
+            if review_date is None and review_text is None:
+                continue
+            yield (
+                int(review.get("review_id")),
+                int(review.get("school_id")),
+                review_date,
+                review_text,
+                review.get("likes_count"),
+                review.get("dislikes_count"),
+                review.get("rating"),
+                json.dumps(review.get("topics") or {}, ensure_ascii=False),
+                _empty_to_none(review.get("overall")),
+            )
+
+
+def _read_version(path: str) -> int:
+    """Версия данных в существующем файле (0 — файла нет или он не читается)."""
+    if not os.path.exists(path):
+        return 0
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            row = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return 0
+    return int(row[0]) if row else 0
+
+
+def build_database(
+    normalize: Callable[[Optional[str]], str],
+    path: str = SQLITE_CONFIG['path'],
+    schools_path: str = SQLITE_CONFIG['schools_json'],
+    reviews_dir: str = SQLITE_CONFIG['reviews_dir'],
+) -> Dict[str, int]:
+    """
+    Собрать файл SQLite из JSON школ и отзывов.
+    Пишем во временный файл и подменяем path одним os.replace: API, читающий старый
+    файл, до конца запроса видит прежние данные, следующий запрос — новые целиком.
+    """
+    started = time.perf_counter()
+    with open(schools_path, "r", encoding="utf-8") as f:
+        schools = json.load(f)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    version = _read_version(path) + 1
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SQLITE_SCHEMA)
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO school_summary (
+                school_id, name_2gis, name_ym, school_address, building_type, floors,
+                year_built, reconstruction_year,
+                has_sports_complex, has_pool, has_stadium, has_sports_ground,
+                search_name, search_text, lon, lat,
+                rating_yandex, rating_2gis, link_2gis, link_yandex
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (_school_row(s, normalize) for s in schools),
+        )
+        # Повторный review_id заменяет прежний — как UPSERT в загрузчике отзывов
+        conn.executemany(
+            "INSERT OR REPLACE INTO review (" + REVIEW_COLUMNS + ") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            _iter_review_rows(reviews_dir),
+        )
+        conn.execute(SQLITE_SUMMARY_UPDATE)
+        conn.execute(
+            "INSERT INTO data_version (id, version, updated_at) VALUES (1, ?, datetime('now'))",
+            (version,),
+        )
+        conn.commit()
+        school_count = conn.execute("SELECT COUNT(*) FROM school_summary").fetchone()[0]
+        review_count = conn.execute("SELECT COUNT(*) FROM review").fetchone()[0]
+        conn.execute("ANALYZE")
+    except Exception:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+    os.replace(tmp_path, path)
+
+    print(
+        f"[OK] {path}: школ {school_count}, отзывов {review_count}, версия данных {version} "
+        f"({time.perf_counter() - started:.1f} с)"
+    )
+    return {"schools": school_count, "reviews": review_count, "version": version}
+
+
+# --- Чтение ---
+
+
+def _distance_m(lon1: float, lat1: float, lon2: float, lat2: float) -> Optional[float]:
+    """Расстояние по сфере (гаверсинус), м; регистрируется в SQLite как distance_m()."""
+    if lon1 is None or lat1 is None or lon2 is None or lat2 is None:
+        return None
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _bool_or_none(value: Any) -> Optional[bool]:
+    return None if value is None else bool(value)
+
+
+def _int_or_none(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _map_row_to_dict(row) -> Dict[str, Any]:
+    """Строка MAP_COLUMNS → объект школы для карты (как в _query_schools_for_map)."""
+    return {
+        "school_id": row[0],
+        "name_2gis": row[1],
+        "name_ym": row[2],
+        "school_address": row[3],
+        "year_built": row[4],
+        "has_sports_complex": _bool_or_none(row[5]),
+        "has_pool": _bool_or_none(row[6]),
+        "has_stadium": _bool_or_none(row[7]),
+        "has_sports_ground": _bool_or_none(row[8]),
+        "location": {
+            "type": "Point",
+            "coordinates": [float(row[9]), float(row[10])] if row[9] is not None and row[10] is not None else None,
+        },
+        "rating_yandex": float(row[11]) if row[11] is not None else None,
+    }
+
+
+def _detail_row_to_dict(row) -> Dict[str, Any]:
+    """Строка DETAIL_COLUMNS → карточка школы (как _school_detail_row_to_dict в main.py)."""
+    lon, lat = row[12], row[13]
+    return {
+        "school_id": row[0],
+        "name_2gis": row[1],
+        "name_ym": row[2],
+        "school_address": row[3],
+        "building_type": row[4],
+        "floors": row[5],
+        "year_built": row[6],
+        "reconstruction_year": row[7],
+        "has_sports_complex": _bool_or_none(row[8]),
+        "has_pool": _bool_or_none(row[9]),
+        "has_stadium": _bool_or_none(row[10]),
+        "has_sports_ground": _bool_or_none(row[11]),
+        "location": {
+            "type": "Point",
+            "coordinates": [float(lon), float(lat)] if lon is not None and lat is not None else None,
+        },
+        "link_2gis": row[14],
+        "link_yandex": row[15],
+        "rating_yandex": float(row[16]) if row[16] is not None else None,
+        "rating_2gis": float(row[17]) if row[17] is not None else None,
+        "review_count": row[18],
+        "last_review_date": row[19],
+        "topic_neg_share": {k: float(v) for k, v in json.loads(row[20] or "{}").items()},
+    }
+
+
+def _loads_topics(value: Optional[str]) -> Any:
+    if value is None or not value.strip():
+        return None
+    try:
+        return json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return None
+
+
+def _review_row_to_dict(row) -> Dict[str, Any]:
+    """Строка REVIEW_COLUMNS → объект отзыва (как _review_row_to_dict в main.py)."""
+    topics = _loads_topics(row[7])
+    return {
+        "review_id": row[0],
+        "school_id": str(row[1]) if row[1] is not None else None,
+        "date": row[2],
+        "review_date": row[2],
+        "text": row[3],
+        "review_text": row[3],
+        "topics": topics,
+        "review_topic": topics,
+        "overall": row[8],
+        "review_overall": row[8],
+        "review_likes": _int_or_none(row[4]),
+        "review_dislikes": _int_or_none(row[5]),
+        "review_rating": _int_or_none(row[6]),
+    }
+
+
+class SQLiteRepository(SchoolRepository):
+    """
+    Локальный backend: файл SQLite, собранный build_database.
+    У каждого потока пула своё подключение только на чтение; после пересборки файла
+    (другой inode) подключение открывается заново.
+    """
+
+    name = "sqlite"
+
+    def __init__(
+        self,
+        normalize: Callable[[Optional[str]], str],
+        encode_cursor: Callable[[Optional[date], int], str],
+        cluster_max_zoom: int,
+        cluster_cells: int,
+        path: str = SQLITE_CONFIG['path'],
+    ):
+        self.path = path
+        self._normalize = normalize
+        self._encode_cursor = encode_cursor
+        self.cluster_max_zoom = cluster_max_zoom
+        self.cluster_cells = cluster_cells
+        self._local = threading.local()
+
+    def open(self) -> None:
+        """При первом запуске файла ещё нет — собираем его из JSON."""
+        if not os.path.exists(self.path):
+            print(f"[INFO] Файл {self.path} не найден, собираем из JSON")
+            build_database(self._normalize, self.path)
+
+    def _open_connection(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=check_same_thread)
+        conn.create_function("distance_m", 4, _distance_m, deterministic=True)
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        try:
+            inode = os.stat(self.path).st_ino
+        except OSError as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка БД: {e}")
+        local = self._local
+        if getattr(local, "inode", None) != inode:
+            if getattr(local, "conn", None) is not None:
+                local.conn.close()
+            local.conn = self._open_connection()
+            local.inode = inode
+        return local.conn
+
+    def _fetchall(self, query: str, params: Iterable[Any] = ()) -> List[Tuple]:
+        try:
+            return self._connection().execute(query, list(params)).fetchall()
+        except sqlite3.Error as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка БД: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = None
+        return {"sqlite": {"path": self.path, "size_bytes": size}}
+
+    def data_version(self) -> int:
+        rows = self._fetchall("SELECT version FROM data_version WHERE id = 1")
+        return int(rows[0][0]) if rows else 0
+
+    def schools(self) -> Dict[str, Any]:
+        rows = self._fetchall(
+            "SELECT school_id, name_2gis, name_ym, school_address FROM school_summary ORDER BY school_id"
+        )
+        return {
+            "schools": [
+                {"school_id": row[0], "name_2gis": row[1], "name_ym": row[2], "school_address": row[3]}
+                for row in rows
+            ]
+        }
+
+    def _where(
+        self,
+        search: Optional[str],
+        year_min: Optional[int],
+        year_max: Optional[int],
+        rating_min: Optional[float],
+        rating_max: Optional[float],
+        has_pool: Optional[bool],
+        has_stadium: Optional[bool],
+        has_sports_ground: Optional[bool],
+        has_sports_complex: Optional[bool],
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+    ) -> Tuple[str, List[Any]]:
+        """WHERE по тем же фильтрам, что _map_where в main.py; поиск — каждое слово как подстрока."""
+        where = " WHERE 1=1"
+        params: List[Any] = []
+        for column, op, value in (
+            ("year_built", ">=", year_min),
+            ("year_built", "<=", year_max),
+            ("rating_yandex", ">=", rating_min),
+            ("rating_yandex", "<=", rating_max),
+            ("has_pool", "=", has_pool),
+            ("has_stadium", "=", has_stadium),
+            ("has_sports_ground", "=", has_sports_ground),
+            ("has_sports_complex", "=", has_sports_complex),
+        ):
+            if value is not None:
+                where += f" AND s.{column} {op} ?"
+                params.append(int(value) if isinstance(value, bool) else value)
+        for token in self._normalize(search).split():
+            where += " AND instr(s.search_text, ?) > 0"
+            params.append(token)
+        if bbox is not None:
+            lon_min, lat_min, lon_max, lat_max = bbox
+            where += " AND s.lon BETWEEN ? AND ? AND s.lat BETWEEN ? AND ?"
+            params.extend([lon_min, lon_max, lat_min, lat_max])
+        return where, params
+
+    def schools_for_map(
+        self,
+        search: Optional[str],
+        year_min: Optional[int],
+        year_max: Optional[int],
+        rating_min: Optional[float],
+        rating_max: Optional[float],
+        has_pool: Optional[bool],
+        has_stadium: Optional[bool],
+        has_sports_ground: Optional[bool],
+        has_sports_complex: Optional[bool],
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        zoom: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        where, params = self._where(
+            search,
+            year_min,
+            year_max,
+            rating_min,
+            rating_max,
+            has_pool,
+            has_stadium,
+            has_sports_ground,
+            has_sports_complex,
+            bbox,
+        )
+        if zoom is not None and zoom < self.cluster_max_zoom:
+            # Сетка как ST_SnapToGrid: координата округляется до узла с шагом cell
+            cell = 360.0 / (2 ** zoom) / self.cluster_cells
+            rows = self._fetchall(
+                "SELECT COUNT(*) AS cnt, AVG(s.lon), AVG(s.lat), MIN(s.school_id) FROM school_summary s"
+                + where
+                + " GROUP BY CAST(round(s.lon / ?) AS INTEGER), CAST(round(s.lat / ?) AS INTEGER)"
+                " ORDER BY cnt DESC",
+                params + [cell, cell],
+            )
+            clusters = [
+                {
+                    "count": cnt,
+                    "location": {"type": "Point", "coordinates": [float(lon), float(lat)]},
+                    "school_id": school_id if cnt == 1 else None,
+                }
+                for cnt, lon, lat, school_id in rows
+            ]
+            return {"clusters": clusters, "count": sum(c["count"] for c in clusters), "zoom": zoom}
+
+        # С поиском сначала совпадения по названию, внутри групп — по school_id
+        query = self._normalize(search)
+        order = " ORDER BY s.school_id"
+        order_params: List[Any] = []
+        if query:
+            order = " ORDER BY instr(s.search_name, ?) = 0, s.school_id"
+            order_params.append(query)
+        rows = self._fetchall("SELECT " + MAP_COLUMNS + " FROM school_summary s" + where + order, params + order_params)
+        schools = [_map_row_to_dict(row) for row in rows]
+        return {"schools": schools, "count": len(schools)}
+
+    def suggest(self, query: str, limit: int) -> Dict[str, Any]:
+        where, params = self._where(query, None, None, None, None, None, None, None, None)
+        rows = self._fetchall(
+            "SELECT s.school_id, s.name_2gis, s.name_ym, s.school_address FROM school_summary s"
+            + where
+            + " ORDER BY substr(s.search_name, 1, length(?)) = ? DESC, instr(s.search_name, ?) = 0, s.school_id"
+            " LIMIT ?",
+            params + [query, query, query, limit],
+        )
+        suggestions = [
+            {"school_id": row[0], "name_2gis": row[1], "name_ym": row[2], "school_address": row[3]}
+            for row in rows
+        ]
+        return {"query": query, "suggestions": suggestions}
+
+    def nearest(self, lat: float, lon: float, k: int, *filters: Any) -> Dict[str, Any]:
+        where, params = self._where(*filters)
+        rows = self._fetchall(
+            "SELECT " + MAP_COLUMNS + ", distance_m(s.lon, s.lat, ?, ?) AS distance_m FROM school_summary s"
+            + where
+            + " ORDER BY distance_m LIMIT ?",
+            [lon, lat] + params + [k],
+        )
+        schools = []
+        for row in rows:
+            school = _map_row_to_dict(row)
+            school["distance_m"] = round(float(row[12]), 1)
+            schools.append(school)
+        return {"schools": schools, "count": len(schools)}
+
+    def school_by_id(self, school_id: int) -> Dict[str, Any]:
+        rows = self._fetchall(
+            "SELECT " + DETAIL_COLUMNS + " FROM school_summary s WHERE s.school_id = ?", [school_id]
+        )
+        if not rows:
+            raise HTTPException(status_code=404, detail="Школа не найдена")
+        return _detail_row_to_dict(rows[0])
+
+    def schools_batch(self, school_ids: Tuple[int, ...]) -> Dict[str, Any]:
+        # Список id — JSON-массив, разворачиваемый json_each: один запрос при любом числе id
+        rows = self._fetchall(
+            "SELECT " + DETAIL_COLUMNS + " FROM school_summary s"
+            " WHERE s.school_id IN (SELECT value FROM json_each(?))",
+            [json.dumps(list(school_ids))],
+        )
+        found = {row[0]: _detail_row_to_dict(row) for row in rows}
+        schools = [found[school_id] for school_id in school_ids if school_id in found]
+        missing = [school_id for school_id in school_ids if school_id not in found]
+        return {"schools": schools, "count": len(schools), "missing": missing}
+
+    def reviews_topics(self, school_id: int) -> Dict[str, Any]:
+        rows = self._fetchall(
+            "SELECT review_date, topics FROM review"
+            " WHERE school_id = ? AND review_date IS NOT NULL ORDER BY review_date",
+            [school_id],
+        )
+        reviews = []
+        for review_date, topics in rows:
+            topics = _loads_topics(topics)
+            reviews.append({"review_date": review_date, "topics": topics if isinstance(topics, dict) else {}})
+        return {"reviews": reviews}
+
+    def topics_timeline(self, school_id: int, interval: str) -> Dict[str, Any]:
+        rows = self._fetchall(
+            "SELECT " + SQLITE_PERIOD_EXPRESSIONS[interval] + """ AS period,
+                t.key AS topic,
+                SUM(t.value = 'pos') AS pos,
+                SUM(t.value = 'neg') AS neg,
+                SUM(t.value = 'neutral') AS neutral,
+                COUNT(*) AS mentions
+            FROM review r, json_each(r.topics) t
+            WHERE r.school_id = ?
+              AND r.review_date IS NOT NULL
+              AND json_type(r.topics) = 'object'
+            GROUP BY 1, 2
+            ORDER BY 1, 2
+            """,
+            [school_id],
+        )
+        # Столбцовый ответ, как в _query_topics_timeline
+        periods = sorted({row[0] for row in rows})
+        index = {period: i for i, period in enumerate(periods)}
+        topics: Dict[str, Dict[str, List[int]]] = {}
+        mentions: Dict[str, int] = {}
+        for period, topic, pos, neg, neutral, total in rows:
+            counts = topics.get(topic)
+            if counts is None:
+                counts = topics[topic] = {key: [0] * len(periods) for key in ("pos", "neg", "neutral")}
+            i = index[period]
+            counts["pos"][i] = pos
+            counts["neg"][i] = neg
+            counts["neutral"][i] = neutral
+            mentions[topic] = mentions.get(topic, 0) + total
+        return {
+            "school_id": school_id,
+            "interval": interval,
+            "periods": periods,
+            "topics": topics,
+            "mentions": mentions,
+        }
+
+    @staticmethod
+    def _reviews_query(
+        school_id: int,
+        date_start: Optional[date],
+        date_end: Optional[date],
+        after: Optional[Tuple[Optional[date], int]],
+    ) -> Tuple[str, List[Any]]:
+        """Тот же порядок и keyset-условие, что _reviews_query в main.py; даты сравниваются как строки ISO."""
+        query = "SELECT " + REVIEW_COLUMNS + " FROM review WHERE school_id = ?"
+        params: List[Any] = [school_id]
+        if date_start is not None:
+            query += " AND (review_date >= ? OR review_date IS NULL)"
+            params.append(date_start.isoformat())
+        if date_end is not None:
+            query += " AND (review_date <= ? OR review_date IS NULL)"
+            params.append(date_end.isoformat())
+        if after is not None:
+            after_date, after_id = after
+            if after_date is not None:
+                query += (
+                    " AND (review_date < ? OR (review_date = ? AND review_id > ?)"
+                    " OR review_date IS NULL)"
+                )
+                params.extend([after_date.isoformat(), after_date.isoformat(), after_id])
+            else:
+                query += " AND review_date IS NULL AND review_id > ?"
+                params.append(after_id)
+        query += " ORDER BY review_date DESC NULLS LAST, review_id"
+        return query, params
+
+    def reviews_page(
+        self,
+        school_id: int,
+        date_start: Optional[date],
+        date_end: Optional[date],
+        after: Optional[Tuple[Optional[date], int]] = None,
+        limit: int = 100,
+    ) -> Dict[str, Any]:
+        query, params = self._reviews_query(school_id, date_start, date_end, after)
+        rows = self._fetchall(query + " LIMIT ?", params + [limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_more:
+            last_date = date.fromisoformat(rows[-1][2]) if rows[-1][2] else None
+            next_cursor = self._encode_cursor(last_date, rows[-1][0])
+        return {"reviews": [_review_row_to_dict(row) for row in rows], "next_cursor": next_cursor}
+
+    def reviews_stream(
+        self,
+        school_id: int,
+        date_start: Optional[date],
+        date_end: Optional[date],
+        after: Optional[Tuple[Optional[date], int]] = None,
+    ) -> Iterator[bytes]:
+        """
+        Поток NDJSON. StreamingResponse перебирает генератор в разных потоках,
+        поэтому у потока своё подключение без привязки к потоку-создателю.
+        """
+        query, params = self._reviews_query(school_id, date_start, date_end, after)
+        conn = self._open_connection(check_same_thread=False)
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(REVIEWS_STREAM_FETCH)
+                if not rows:
+                    break
+                for row in rows:
+                    yield api_json.dumps(_review_row_to_dict(row)) + b"\n"
+        except sqlite3.Error as e:
+            print(f"[ERROR] Ошибка БД при выгрузке отзывов school_id={school_id}: {e}")
+            yield api_json.dumps({"error": f"Ошибка БД: {str(e)}"}) + b"\n"
+        finally:
+            conn.close()
+
+
+__all__ = [
+    "STORAGE_BACKEND",
+    "SQLITE_CONFIG",
+    "SchoolRepository",
+    "SQLiteRepository",
+    "build_database",
+]
+
+
+def main() -> None:
+    """Собрать файл SQLite для STORAGE_BACKEND=sqlite из JSON школ и отзывов."""
+    build_database(api_search.normalize_school_query)
+
+
+if __name__ == "__main__":
+    main()
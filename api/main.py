@@ -4,19 +4,70 @@
 Простое API на FastAPI для работы с данными школ и отзывов из PostgreSQL.
 """
 
-from fastapi import FastAPI, Query, HTTPException
+from contextlib import asynccontextmanager, contextmanager
+from fastapi import Body, FastAPI, Query, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import Optional, List, Dict, Any
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Optional, List, Dict, Any, Iterator, Tuple
 from datetime import date
-import psycopg2
+import base64
+import itertools
+import json
 import os
-from dotenv import load_dotenv
+import re
+import psycopg2
+
+try:
+    from api import api_cache, api_db, api_export, api_json, api_metrics, api_search, api_snapshot, api_storage
+except ImportError:  # запуск как `python api/main.py`
+    import api_cache
+    import api_db
+    import api_export
+    import api_json
+    import api_metrics
+    import api_search
+    import api_snapshot
+    import api_storage
 
-# Загрузка переменных окружения
-load_dotenv()
 
-app = FastAPI(title="Schools API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Пул подключений к БД (или локальное хранилище) живёт столько же, сколько приложение."""
+    repository.open()
+    try:
+        yield
+    finally:
+        api_db.close_pool()
+
+
+app = FastAPI(
+    title="Schools API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=api_json.FastJSONResponse,
+)
+
+# Кэш ответов, инвалидируется по sa.data_version (см. api_cache.py)
+response_cache = api_cache.ResponseCache()
+# Векторные тайлы — бинарные, поэтому всегда в памяти процесса; версия данных общая
+tile_cache = api_cache.ResponseCache(
+    backend=api_cache.MemoryBackend(
+        int(os.getenv('TILE_CACHE_MAXSIZE', '2048')),
+        api_cache.CACHE_CONFIG['ttl'],
+    ),
+    data_version=response_cache.data_version,
+)
+# Одинаковые одновременные запросы, которых ещё нет в кэше, выполняются один раз
+single_flight = api_cache.SingleFlight()
+# Готовые байты ответов карты (JSON + gzip/brotli) — в том же бэкенде, что response_cache
+# (с CACHE_BACKEND=redis — общие для воркеров), упакованные EncodedBody.pack
+map_body_cache = api_cache.ResponseCache(
+    backend=api_cache.create_backend(
+        prefix="schools_api:body:",
+        codec=(api_json.EncodedBody.pack, api_json.EncodedBody.unpack),
+    ),
+    data_version=response_cache.data_version,
+)
 
 # Настройка CORS для работы с React приложением
 app.add_middleware(
@@ -25,25 +76,85 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
-# Параметры подключения к БД
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST'),
-    'port': os.getenv('DB_PORT'),
-    'database': os.getenv('DB_NAME'),
-    'user': os.getenv('DB_USER'),
-    'password': os.getenv('DB_PASSWORD')
-}
+# Метрики запросов для /metrics (см. api_metrics.py); добавлен последним — снаружи CORS
+if api_metrics.METRICS_CONFIG['enabled']:
+    app.add_middleware(api_metrics.MetricsMiddleware)
+
+# Браузер хранит ответ, но каждый раз перепроверяет его через If-None-Match
+CACHE_CONTROL = "no-cache"
 
 
+@contextmanager
 def get_db_connection():
-    """Создает подключение к базе данных"""
+    """Выдаёт подключение из пула на время блока with"""
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        return conn
+        pool = api_db.get_pool()
     except psycopg2.Error as e:
         raise HTTPException(status_code=500, detail=f"Ошибка подключения к БД: {str(e)}")
+    try:
+        with pool.connection() as conn:
+            yield conn
+    except api_db.PoolTimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+def _query_data_version() -> int:
+    """Прочитать sa.data_version: выполняется в потоке пула БД"""
+    try:
+        with get_db_connection() as conn:
+            return response_cache.data_version.read(conn)
+    except psycopg2.Error as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка БД: {str(e)}")
+
+
+async def current_data_version() -> int:
+    """Текущая версия данных; к БД обращаемся не чаще раза в DATA_VERSION_TTL секунд"""
+    data_version = response_cache.data_version
+    if data_version.is_fresh():
+        return data_version.cached()
+    version = data_version.store(await api_db.run_in_db_thread(repository.data_version))
+    response_cache.on_version(version)
+    tile_cache.on_version(version)
+    map_body_cache.on_version(version)
+    return version
+
+
+async def conditional_etag(
+    request: Request,
+    response: Response,
+    namespace: str,
+    params: Tuple,
+    compressible: bool = False,
+) -> Tuple[int, Optional[Response]]:
+    """
+    Условный GET: ETag строится по версии данных и параметрам запроса, без обращения к данным.
+    Возвращает (версия данных, ответ 304 или None). Если ответ 304 не нужен —
+    ETag уже проставлен в response, и эндпоинт формирует тело как обычно.
+    compressible — тело отдаётся через api_json.EncodedBody: 304 несёт тот же Vary, что и 200.
+    """
+    version = await current_data_version()
+    etag = api_cache.make_etag(version, namespace, params)
+    if etag is None:
+        return version, None
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if api_cache.etag_matches(request.headers.get("if-none-match"), etag):
+        if compressible and api_json.COMPRESS_CONFIG['enabled']:
+            headers["Vary"] = "Accept-Encoding"
+        return version, Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return version, None
+
+
+def etag_headers(response: Response) -> Dict[str, str]:
+    """ETag/Cache-Control, проставленные conditional_etag, — для ответов, собираемых вручную"""
+    return {
+        name: response.headers[name]
+        for name in ("etag", "cache-control")
+        if name in response.headers
+    }
 
 
 @app.get("/")
@@ -52,40 +163,358 @@ async def root():
     return {"message": "Schools API", "version": "1.1.0"}
 
 
+@app.get("/api/health")
+async def health():
+    """Состояние хранилища (пула подключений к БД) и кэша ответов"""
+    try:
+        storage = repository.stats()
+    except psycopg2.Error as e:
+        raise HTTPException(status_code=503, detail=f"Ошибка подключения к БД: {str(e)}")
+    return {
+        "status": "ok",
+        "backend": repository.name,
+        **storage,
+        "cache": response_cache.stats(),
+        "tile_cache": tile_cache.stats(),
+        "map_body_cache": map_body_cache.stats(),
+        "single_flight": single_flight.stats(),
+        "snapshot": map_snapshot.stats() if map_snapshot is not None else {"enabled": False},
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Метрики в текстовом формате Prometheus: задержки, время БД и сериализации, пул, кэши"""
+    if not api_metrics.METRICS_CONFIG['enabled']:
+        raise HTTPException(status_code=404, detail="Метрики отключены (METRICS_ENABLED=0)")
+    try:
+        pool_stats = repository.stats().get("pool")
+    except psycopg2.Error:
+        pool_stats = None
+    body = api_metrics.render(
+        pool=pool_stats if isinstance(pool_stats, dict) else None,
+        caches={
+            "response": response_cache.stats(),
+            "tile": tile_cache.stats(),
+            "map_body": map_body_cache.stats(),
+        },
+        single_flight=single_flight.stats(),
+    )
+    return Response(content=body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _query_schools() -> Dict[str, Any]:
+    """Синхронная часть /schools: выполняется в потоке пула БД"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT school_id, name_2gis, name_ym, school_address FROM sa.school ORDER BY school_id"
+            )
+            rows = cursor.fetchall()
+            schools = [
+                {
+                    "school_id": row[0],
+                    "name_2gis": row[1],
+                    "name_ym": row[2],
+                    "school_address": row[3],
+                }
+                for row in rows
+            ]
+            cursor.close()
+            return {"schools": schools}
+    except psycopg2.Error as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка БД: {str(e)}")
+
+
 @app.get("/schools")
-async def get_schools():
+async def get_schools(request: Request, response: Response):
     """Получить список всех школ из sa.school"""
-    conn = None
+    _, not_modified = await conditional_etag(request, response, "schools", ())
+    if not_modified is not None:
+        return not_modified
+    return await api_db.run_in_db_thread(repository.schools)
+
+
+# --- Эндпоинт для страницы карты (sa.school_summary + фильтры) ---
+
+# Ниже этого зума /api/schools/map отдаёт кластеры вместо отдельных школ
+MAP_CLUSTER_MAX_ZOOM = int(os.getenv('MAP_CLUSTER_MAX_ZOOM', '12'))
+# Ячеек сетки кластеризации на ширину тайла 256px (4 → ячейка ~64px)
+MAP_CLUSTER_CELLS = int(os.getenv('MAP_CLUSTER_CELLS', '4'))
+
+# MAP_SNAPSHOT=1: фильтры карты считаются по снимку школ в памяти (см. api_snapshot.py);
+# снимок читается из PostgreSQL, локальное хранилище фильтрует сам SQLite.
+# Запросы с search идут в БД и при включённом снимке (см. _build_map_body)
+map_snapshot = (
+    api_snapshot.create_holder(api_cache.CACHE_CONFIG['ttl'])
+    if api_storage.STORAGE_BACKEND == 'postgres' else None
+)
+
+
+def _search_order(search: Optional[str]) -> Tuple[str, List[Any]]:
+    """ORDER BY для выдачи с поиском: сначала по релевантности (ts_rank_cd, триграммы), затем по id."""
+    query = api_search.normalize_school_query(search)
+    if not query:
+        return " ORDER BY s.school_id", []
+    return (
+        " ORDER BY ts_rank_cd(s.search_tsv, plainto_tsquery('russian', %s)) DESC,"
+        " word_similarity(%s, s.search_name) DESC, s.school_id",
+        [query, query],
+    )
+
+
+def _map_where(
+    search: Optional[str],
+    year_min: Optional[int],
+    year_max: Optional[int],
+    rating_min: Optional[float],
+    rating_max: Optional[float],
+    has_pool: Optional[bool],
+    has_stadium: Optional[bool],
+    has_sports_ground: Optional[bool],
+    has_sports_complex: Optional[bool],
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+) -> Tuple[str, List[Any]]:
+    """
+    WHERE-часть запроса по фильтрам карты (s — sa.school_summary).
+    bbox = (lon_min, lat_min, lon_max, lat_max) фильтруется через && по GIST-индексу idx_school_summary_location.
+    """
+    where = " WHERE 1=1"
+    params: List[Any] = []
+
+    if year_min is not None:
+        where += " AND s.year_built >= %s"
+        params.append(year_min)
+    if year_max is not None:
+        where += " AND s.year_built <= %s"
+        params.append(year_max)
+    if rating_min is not None:
+        where += " AND s.rating_yandex >= %s"
+        params.append(rating_min)
+    if rating_max is not None:
+        where += " AND s.rating_yandex <= %s"
+        params.append(rating_max)
+    if has_pool is not None:
+        where += " AND s.has_pool = %s"
+        params.append(has_pool)
+    if has_stadium is not None:
+        where += " AND s.has_stadium = %s"
+        params.append(has_stadium)
+    if has_sports_ground is not None:
+        where += " AND s.has_sports_ground = %s"
+        params.append(has_sports_ground)
+    if has_sports_complex is not None:
+        where += " AND s.has_sports_complex = %s"
+        params.append(has_sports_complex)
+
+    # Поиск: полнотекстовый по search_tsv, подстрока и нечёткое совпадение по триграммам
+    # (все условия обслуживаются GIN-индексами sa.school_summary).
+    # Нормализуется только запрос к search_name/search_tsv: в school_address пунктуация
+    # не убрана, поэтому адрес ищется подстрокой исходного запроса («ул. Ленина, 5»)
+    if search and search.strip():
+        query = api_search.normalize_school_query(search)
+        address_term = f"%{search.strip()}%"
+        if query:
+            where += (
+                " AND (s.search_tsv @@ plainto_tsquery('russian', %s)"
+                " OR s.search_name LIKE %s OR s.school_address ILIKE %s"
+                " OR %s <%% s.search_name)"
+            )
+            params.extend([query, f"%{query}%", address_term, query])
+        else:
+            where += " AND s.school_address ILIKE %s"
+            params.append(address_term)
+
+    if bbox is not None:
+        where += " AND s.location && ST_MakeEnvelope(%s, %s, %s, %s, 4326)::geography"
+        params.extend(bbox)
+
+    return where, params
+
+
+def _query_map_clusters(cursor, where: str, params: List[Any], zoom: int) -> Dict[str, Any]:
+    """
+    Кластеры школ для мелкого масштаба: точки группируются по сетке,
+    размер ячейки зависит от зума. Для каждой ячейки — число школ и центроид.
+    """
+    cell = 360.0 / (2 ** zoom) / MAP_CLUSTER_CELLS
+    cursor.execute(
+        """
+        SELECT
+            COUNT(*) AS cnt,
+            ST_X(ST_Centroid(ST_Collect(s.location::geometry))) AS lon,
+            ST_Y(ST_Centroid(ST_Collect(s.location::geometry))) AS lat,
+            MIN(s.school_id) AS school_id
+        FROM sa.school_summary s
+        """
+        + where
+        + """
+        GROUP BY ST_SnapToGrid(s.location::geometry, %s)
+        ORDER BY cnt DESC
+        """,
+        params + [cell],
+    )
+    clusters = []
+    total = 0
+    for cnt, lon, lat, school_id in cursor.fetchall():
+        total += cnt
+        clusters.append({
+            "count": cnt,
+            "location": {"type": "Point", "coordinates": [float(lon), float(lat)]},
+            # Для кластера из одной школы сразу отдаём её id, чтобы по клику открыть карточку
+            "school_id": school_id if cnt == 1 else None,
+        })
+    return {"clusters": clusters, "count": total, "zoom": zoom}
+
+
+def _query_schools_for_map(
+    search: Optional[str],
+    year_min: Optional[int],
+    year_max: Optional[int],
+    rating_min: Optional[float],
+    rating_max: Optional[float],
+    has_pool: Optional[bool],
+    has_stadium: Optional[bool],
+    has_sports_ground: Optional[bool],
+    has_sports_complex: Optional[bool],
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    zoom: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Синхронная часть /api/schools/map: выполняется в потоке пула БД"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT school_id, name_2gis, name_ym, school_address FROM sa.school ORDER BY school_id"
-        )
-        rows = cursor.fetchall()
-        schools = [
-            {
-                "school_id": row[0],
-                "name_2gis": row[1],
-                "name_ym": row[2],
-                "school_address": row[3],
-            }
-            for row in rows
-        ]
-        cursor.close()
-        return {"schools": schools}
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            where, params = _map_where(
+                search,
+                year_min,
+                year_max,
+                rating_min,
+                rating_max,
+                has_pool,
+                has_stadium,
+                has_sports_ground,
+                has_sports_complex,
+                bbox,
+            )
+
+            if zoom is not None and zoom < MAP_CLUSTER_MAX_ZOOM:
+                result = _query_map_clusters(cursor, where, params, zoom)
+                cursor.close()
+                return result
+
+            # Сводка sa.school_summary: рейтинг и координаты уже в строке школы, без JOIN
+            query = """
+                SELECT
+                    s.school_id,
+                    s.name_2gis,
+                    s.name_ym,
+                    s.school_address,
+                    s.year_built,
+                    s.has_sports_complex,
+                    s.has_pool,
+                    s.has_stadium,
+                    s.has_sports_ground,
+                    s.lon,
+                    s.lat,
+                    s.rating_yandex
+                FROM sa.school_summary s
+            """ + where
+            order, order_params = _search_order(search)
+            query += order
+            cursor.execute(query, params + order_params)
+            rows = cursor.fetchall()
+
+            # Порядок колонок: school_id, name_2gis, name_ym, school_address, year_built,
+            # has_sports_complex, has_pool, has_stadium, has_sports_ground, lon, lat, rating_yandex (0–11)
+            schools = []
+            for row in rows:
+                lon, lat = row[9], row[10]
+                rating = row[11]
+                schools.append({
+                    "school_id": row[0],
+                    "name_2gis": row[1],
+                    "name_ym": row[2],
+                    "school_address": row[3],
+                    "year_built": row[4],
+                    "has_sports_complex": row[5],
+                    "has_pool": row[6],
+                    "has_stadium": row[7],
+                    "has_sports_ground": row[8],
+                    "location": {
+                        "type": "Point",
+                        "coordinates": [float(lon), float(lat)] if lon is not None and lat is not None else None,
+                    },
+                    "rating_yandex": float(rating) if rating is not None else None,
+                })
+
+            cursor.close()
+            return {"schools": schools, "count": len(schools)}
     except psycopg2.Error as e:
         raise HTTPException(status_code=500, detail=f"Ошибка БД: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
 
 
-# --- Эндпоинт для страницы карты (sa.school + фильтры) ---
+def _load_map_snapshot(version: int) -> api_snapshot.SchoolSnapshot:
+    """Собрать снимок школ версии version: выполняется в потоке пула БД"""
+    try:
+        with get_db_connection() as conn:
+            return map_snapshot.load(conn, version)
+    except psycopg2.Error as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка БД: {str(e)}")
+
+
+def _query_map_snapshot(
+    snapshot: api_snapshot.SchoolSnapshot,
+    year_min: Optional[int],
+    year_max: Optional[int],
+    rating_min: Optional[float],
+    rating_max: Optional[float],
+    has_pool: Optional[bool],
+    has_stadium: Optional[bool],
+    has_sports_ground: Optional[bool],
+    has_sports_complex: Optional[bool],
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    zoom: Optional[int] = None,
+) -> Dict[str, Any]:
+    """То же, что _query_schools_for_map без search, но по снимку в памяти (без запроса к БД)"""
+    filters = (
+        year_min,
+        year_max,
+        rating_min,
+        rating_max,
+        has_pool,
+        has_stadium,
+        has_sports_ground,
+        has_sports_complex,
+        bbox,
+    )
+    if zoom is not None and zoom < MAP_CLUSTER_MAX_ZOOM:
+        return snapshot.clusters(*filters, zoom=zoom, cells=MAP_CLUSTER_CELLS)
+    return snapshot.schools(*filters)
+
+
+async def _build_map_body(version: int, filters: Tuple) -> api_json.EncodedBody:
+    """Ответ карты на промахе кэша: снимок или БД, кодирование, запись в кэш"""
+    search = filters[0]
+    # Текстовый поиск — только в БД (search_tsv, триграммы, _search_order): снимок ищет
+    # иначе, а ответ под одним ключом кэша и ETag не должен зависеть от MAP_SNAPSHOT
+    if map_snapshot is not None and search is None:
+        snapshot = map_snapshot.get(version)
+        if snapshot is None:
+            snapshot = await api_db.run_in_db_thread(_load_map_snapshot, version)
+        result = _query_map_snapshot(snapshot, *filters[1:])
+    else:
+        result = await api_db.run_in_db_thread(repository.schools_for_map, *filters)
+    body = api_json.EncodedBody.encode(result)
+    map_body_cache.set("map", version, filters, body)
+    return body
+
 
 @app.get("/api/schools/map")
 async def get_schools_for_map(
-    search: Optional[str] = Query(None, description="Строка поиска (передаётся на бэк для будущей реализации)"),
+    request: Request,
+    response: Response,
+    search: Optional[str] = Query(None, description="Строка поиска по названию и адресу школы"),
     year_min: Optional[int] = Query(None, ge=1800, le=2100, description="Год постройки от"),
     year_max: Optional[int] = Query(None, ge=1800, le=2100, description="Год постройки до"),
     rating_min: Optional[float] = Query(None, ge=1.0, le=5.0, description="Рейтинг Яндекс от"),
@@ -94,11 +523,19 @@ async def get_schools_for_map(
     has_stadium: Optional[bool] = Query(None, description="Наличие стадиона/футбольного поля"),
     has_sports_ground: Optional[bool] = Query(None, description="Наличие спорт площадки"),
     has_sports_complex: Optional[bool] = Query(None, description="Наличие спорткомплекса"),
+    lat_min: Optional[float] = Query(None, ge=-90, le=90, description="Видимая область: широта от"),
+    lat_max: Optional[float] = Query(None, ge=-90, le=90, description="Видимая область: широта до"),
+    lon_min: Optional[float] = Query(None, ge=-180, le=180, description="Видимая область: долгота от"),
+    lon_max: Optional[float] = Query(None, ge=-180, le=180, description="Видимая область: долгота до"),
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Зум карты; на мелком масштабе отдаются кластеры"),
 ):
     """
-    Список школ для карты из sa.school с опциональной фильтрацией.
+    Список школ для карты из сводки sa.school_summary с опциональной фильтрацией.
     Возвращает поля для отображения на карте и в фильтрах, включая location в формате GeoJSON.
-    Рейтинг берётся из sa.rating (rating_yandex).
+    Рейтинг (rating_yandex) и координаты уже лежат в сводке, JOIN с sa.rating не нужен.
+
+    С lat_min/lat_max/lon_min/lon_max возвращаются только школы в видимой области.
+    При zoom < MAP_CLUSTER_MAX_ZOOM вместо школ возвращаются кластеры (число школ и центроид).
     """
     # Проверка диапазона года
     if year_min is not None and year_max is not None and year_min > year_max:
@@ -111,308 +548,730 @@ async def get_schools_for_map(
             status_code=400,
             detail="Рейтинг: минимальное значение не может быть больше максимального"
         )
+    bbox_parts = (lon_min, lat_min, lon_max, lat_max)
+    if any(v is not None for v in bbox_parts) and any(v is None for v in bbox_parts):
+        raise HTTPException(
+            status_code=400,
+            detail="Видимая область: нужно передать все четыре параметра lat_min, lat_max, lon_min, lon_max"
+        )
+    bbox = bbox_parts if lat_min is not None else None
+    if bbox is not None and (lat_min > lat_max or lon_min > lon_max):
+        raise HTTPException(
+            status_code=400,
+            detail="Видимая область: минимальное значение не может быть больше максимального"
+        )
+
+    # Нормализованный набор фильтров — он же ключ кэша
+    # Поиск в ключе — исходная строка без крайних пробелов: нормализуется он только
+    # в _map_where, адрес ищется по исходному тексту («ул. Ленина, 5»)
+    search = (search or "").strip() or None
+    filters = (
+        search,
+        year_min,
+        year_max,
+        rating_min,
+        rating_max,
+        has_pool,
+        has_stadium,
+        has_sports_ground,
+        has_sports_complex,
+        bbox,
+        zoom,
+    )
+    version, not_modified = await conditional_etag(request, response, "map", filters, compressible=True)
+    if not_modified is not None:
+        return not_modified
+
+    # В кэше — уже закодированное (и сжатое) тело: при попадании сериализации нет
+    body = map_body_cache.get("map", version, filters)
+    if body is None:
+        body = await single_flight.do("map", version, filters, _build_map_body, version, filters)
+    return body.response(request, etag_headers(response))
+
 
-    conn = None
+# Подсказок в /api/schools/suggest по умолчанию и максимум
+SUGGEST_LIMIT = 10
+SUGGEST_LIMIT_MAX = 20
+
+
+def _query_school_suggest(query: str, limit: int) -> Dict[str, Any]:
+    """
+    Синхронная часть /api/schools/suggest: выполняется в потоке пула БД.
+    Сначала названия, начинающиеся с запроса, затем по сходству триграмм и рангу полнотекстового поиска.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Базовый запрос: sa.school + рейтинг из sa.rating. Координаты из PostGIS.
-        query = """
-            SELECT
-                s.school_id,
-                s.name_2gis,
-                s.name_ym,
-                s.school_address,
-                s.year_built,
-                s.has_sports_complex,
-                s.has_pool,
-                s.has_stadium,
-                s.has_sports_ground,
-                ST_X(s.location::geometry) AS lon,
-                ST_Y(s.location::geometry) AS lat,
-                r.rating_yandex
-            FROM sa.school s
-            LEFT JOIN sa.rating r ON r.school_id = s.school_id
-            WHERE 1=1
-        """
-        params = []
-
-        if year_min is not None:
-            query += " AND s.year_built >= %s"
-            params.append(year_min)
-        if year_max is not None:
-            query += " AND s.year_built <= %s"
-            params.append(year_max)
-        if rating_min is not None:
-            query += " AND r.rating_yandex >= %s"
-            params.append(rating_min)
-        if rating_max is not None:
-            query += " AND r.rating_yandex <= %s"
-            params.append(rating_max)
-        if has_pool is not None:
-            query += " AND s.has_pool = %s"
-            params.append(has_pool)
-        if has_stadium is not None:
-            query += " AND s.has_stadium = %s"
-            params.append(has_stadium)
-        if has_sports_ground is not None:
-            query += " AND s.has_sports_ground = %s"
-            params.append(has_sports_ground)
-        if has_sports_complex is not None:
-            query += " AND s.has_sports_complex = %s"
-            params.append(has_sports_complex)
-
-        # Поиск: пока просто передаём на бэк; можно добавить ILIKE по name_2gis, name_ym, school_address
-        if search and search.strip():
-            search_term = f"%{search.strip()}%"
-            query += " AND (s.name_2gis ILIKE %s OR s.name_ym ILIKE %s OR s.school_address ILIKE %s)"
-            params.extend([search_term, search_term, search_term])
-
-        query += " ORDER BY s.school_id"
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-
-        # Порядок колонок: school_id, name_2gis, name_ym, school_address, year_built,
-        # has_sports_complex, has_pool, has_stadium, has_sports_ground, lon, lat, rating_yandex (0–11)
-        schools = []
-        for row in rows:
-            lon, lat = row[9], row[10]
-            rating = row[11]
-            schools.append({
-                "school_id": row[0],
-                "name_2gis": row[1],
-                "name_ym": row[2],
-                "school_address": row[3],
-                "year_built": row[4],
-                "has_sports_complex": row[5],
-                "has_pool": row[6],
-                "has_stadium": row[7],
-                "has_sports_ground": row[8],
-                "location": {
-                    "type": "Point",
-                    "coordinates": [float(lon), float(lat)] if lon is not None and lat is not None else None,
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT s.school_id, s.name_2gis, s.name_ym, s.school_address
+                FROM sa.school_summary s
+                WHERE s.search_name LIKE %(contains)s
+                   OR %(query)s <%% s.search_name
+                   OR s.search_tsv @@ plainto_tsquery('russian', %(query)s)
+                ORDER BY
+                    s.search_name LIKE %(prefix)s DESC,
+                    word_similarity(%(query)s, s.search_name) DESC,
+                    ts_rank_cd(s.search_tsv, plainto_tsquery('russian', %(query)s)) DESC,
+                    s.school_id
+                LIMIT %(limit)s
+                """,
+                {
+                    "query": query,
+                    "contains": f"%{query}%",
+                    "prefix": f"{query}%",
+                    "limit": limit,
                 },
-                "rating_yandex": float(rating) if rating is not None else None,
-            })
-
-        cursor.close()
-        return {"schools": schools, "count": len(schools)}
+            )
+            suggestions = [
+                {
+                    "school_id": row[0],
+                    "name_2gis": row[1],
+                    "name_ym": row[2],
+                    "school_address": row[3],
+                }
+                for row in cursor.fetchall()
+            ]
+            cursor.close()
+            return {"query": query, "suggestions": suggestions}
     except psycopg2.Error as e:
         raise HTTPException(status_code=500, detail=f"Ошибка БД: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
 
 
-@app.get("/api/schools/{school_id}")
-async def get_school_by_id(school_id: int):
+@app.get("/api/schools/suggest")
+async def suggest_schools(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=100, description="Начало названия или адреса школы"),
+    limit: int = Query(SUGGEST_LIMIT, ge=1, le=SUGGEST_LIMIT_MAX, description="Число подсказок"),
+):
     """
-    Одна школа по id для детальной панели: sa.school + sa.link (только ссылки на школу).
+    Подсказки для строки поиска (автодополнение): не больше limit школ по нормализованному запросу.
+    """
+    query = api_search.normalize_school_query(q)
+    if not query:
+        return {"query": query, "suggestions": []}
+
+    params = (query, limit)
+    version, not_modified = await conditional_etag(request, response, "suggest", params)
+    if not_modified is not None:
+        return not_modified
+
+    cached = response_cache.get("suggest", version, params)
+    if cached is not None:
+        return cached
+
+    result = await api_db.run_in_db_thread(repository.suggest, query, limit)
+    response_cache.set("suggest", version, params, result)
+    return result
+
+
+# Ближайших школ в /api/schools/nearest по умолчанию и максимум
+NEAREST_K = 5
+NEAREST_K_MAX = 50
+
+
+def _query_nearest_schools(
+    lat: float,
+    lon: float,
+    k: int,
+    search: Optional[str],
+    year_min: Optional[int],
+    year_max: Optional[int],
+    rating_min: Optional[float],
+    rating_max: Optional[float],
+    has_pool: Optional[bool],
+    has_stadium: Optional[bool],
+    has_sports_ground: Optional[bool],
+    has_sports_complex: Optional[bool],
+) -> Dict[str, Any]:
+    """
+    Синхронная часть /api/schools/nearest: выполняется в потоке пула БД.
+    ORDER BY location <-> точка с LIMIT — KNN-обход GIST-индекса idx_school_summary_location:
+    читаются только ближайшие k подходящих школ, без сортировки всей таблицы.
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT
-                s.school_id,
-                s.name_2gis,
-                s.name_ym,
-                s.school_address,
-                s.building_type,
-                s.floors,
-                s.year_built,
-                s.reconstruction_year,
-                s.has_sports_complex,
-                s.has_pool,
-                s.has_stadium,
-                s.has_sports_ground,
-                ST_X(s.location::geometry) AS lon,
-                ST_Y(s.location::geometry) AS lat,
-                l.link_2gis,
-                l.link_yandex
-            FROM sa.school s
-            LEFT JOIN sa.link l ON l.school_id = s.school_id
-            WHERE s.school_id = %s
-            """,
-            (school_id,),
-        )
-        row = cursor.fetchone()
-        cursor.close()
-        if not row:
-            raise HTTPException(status_code=404, detail="Школа не найдена")
-        lon, lat = row[12], row[13]
-        return {
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            where, params = _map_where(
+                search,
+                year_min,
+                year_max,
+                rating_min,
+                rating_max,
+                has_pool,
+                has_stadium,
+                has_sports_ground,
+                has_sports_complex,
+            )
+            point = "ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography"
+            cursor.execute(
+                """
+                SELECT
+                    s.school_id,
+                    s.name_2gis,
+                    s.name_ym,
+                    s.school_address,
+                    s.year_built,
+                    s.has_sports_complex,
+                    s.has_pool,
+                    s.has_stadium,
+                    s.has_sports_ground,
+                    s.lon,
+                    s.lat,
+                    s.rating_yandex,
+                    ST_Distance(s.location, """ + point + """) AS distance_m
+                FROM sa.school_summary s
+                """
+                + where
+                + " ORDER BY s.location <-> " + point + " LIMIT %s",
+                [lon, lat] + params + [lon, lat, k],
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+    except psycopg2.Error as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка БД: {str(e)}")
+
+    schools = []
+    for row in rows:
+        lon_s, lat_s, rating = row[9], row[10], row[11]
+        schools.append({
             "school_id": row[0],
             "name_2gis": row[1],
             "name_ym": row[2],
             "school_address": row[3],
-            "building_type": row[4],
-            "floors": row[5],
-            "year_built": row[6],
-            "reconstruction_year": row[7],
-            "has_sports_complex": row[8],
-            "has_pool": row[9],
-            "has_stadium": row[10],
-            "has_sports_ground": row[11],
+            "year_built": row[4],
+            "has_sports_complex": row[5],
+            "has_pool": row[6],
+            "has_stadium": row[7],
+            "has_sports_ground": row[8],
             "location": {
                 "type": "Point",
-                "coordinates": [float(lon), float(lat)] if lon is not None and lat is not None else None,
+                "coordinates": [float(lon_s), float(lat_s)] if lon_s is not None and lat_s is not None else None,
             },
-            "link_2gis": row[14],
-            "link_yandex": row[15],
-        }
+            "rating_yandex": float(rating) if rating is not None else None,
+            "distance_m": round(float(row[12]), 1),
+        })
+    return {"schools": schools, "count": len(schools)}
+
+
+@app.get("/api/schools/nearest")
+async def get_nearest_schools(
+    request: Request,
+    response: Response,
+    lat: float = Query(..., ge=-90, le=90, description="Широта точки"),
+    lon: float = Query(..., ge=-180, le=180, description="Долгота точки"),
+    k: int = Query(NEAREST_K, ge=1, le=NEAREST_K_MAX, description="Число ближайших школ"),
+    search: Optional[str] = Query(None, description="Строка поиска по названию и адресу школы"),
+    year_min: Optional[int] = Query(None, ge=1800, le=2100, description="Год постройки от"),
+    year_max: Optional[int] = Query(None, ge=1800, le=2100, description="Год постройки до"),
+    rating_min: Optional[float] = Query(None, ge=1.0, le=5.0, description="Рейтинг Яндекс от"),
+    rating_max: Optional[float] = Query(None, ge=1.0, le=5.0, description="Рейтинг Яндекс до"),
+    has_pool: Optional[bool] = Query(None, description="Наличие бассейна"),
+    has_stadium: Optional[bool] = Query(None, description="Наличие стадиона/футбольного поля"),
+    has_sports_ground: Optional[bool] = Query(None, description="Наличие спорт площадки"),
+    has_sports_complex: Optional[bool] = Query(None, description="Наличие спорткомплекса"),
+):
+    """
+    k ближайших к точке школ (по расстоянию по поверхности Земли) с фильтрами как у /api/schools/map.
+    distance_m — расстояние от точки до школы в метрах; школы отсортированы по нему.
+    """
+    if year_min is not None and year_max is not None and year_min > year_max:
+        raise HTTPException(
+            status_code=400,
+            detail="Год постройки: начальное значение не может быть больше конечного"
+        )
+    if rating_min is not None and rating_max is not None and rating_min > rating_max:
+        raise HTTPException(
+            status_code=400,
+            detail="Рейтинг: минимальное значение не может быть больше максимального"
+        )
+
+    params = (
+        lat,
+        lon,
+        k,
+        (search or "").strip() or None,
+        year_min,
+        year_max,
+        rating_min,
+        rating_max,
+        has_pool,
+        has_stadium,
+        has_sports_ground,
+        has_sports_complex,
+    )
+    _, not_modified = await conditional_etag(request, response, "nearest", params)
+    if not_modified is not None:
+        return not_modified
+    return await api_db.run_in_db_thread(repository.nearest, *params)
+
+
+# Колонки карточки школы в sa.school_summary (разбираются _school_detail_row_to_dict)
+SCHOOL_DETAIL_COLUMNS = """
+    s.school_id,
+    s.name_2gis,
+    s.name_ym,
+    s.school_address,
+    s.building_type,
+    s.floors,
+    s.year_built,
+    s.reconstruction_year,
+    s.has_sports_complex,
+    s.has_pool,
+    s.has_stadium,
+    s.has_sports_ground,
+    s.lon,
+    s.lat,
+    s.link_2gis,
+    s.link_yandex,
+    s.rating_yandex,
+    s.rating_2gis,
+    s.review_count,
+    s.last_review_date,
+    s.topic_neg_share
+"""
+
+# Максимум id в одном запросе /api/schools/batch
+SCHOOLS_BATCH_MAX = 500
+
+
+def _school_detail_row_to_dict(row) -> Dict[str, Any]:
+    """Строка SCHOOL_DETAIL_COLUMNS → объект карточки школы."""
+    lon, lat = row[12], row[13]
+    return {
+        "school_id": row[0],
+        "name_2gis": row[1],
+        "name_ym": row[2],
+        "school_address": row[3],
+        "building_type": row[4],
+        "floors": row[5],
+        "year_built": row[6],
+        "reconstruction_year": row[7],
+        "has_sports_complex": row[8],
+        "has_pool": row[9],
+        "has_stadium": row[10],
+        "has_sports_ground": row[11],
+        "location": {
+            "type": "Point",
+            "coordinates": [float(lon), float(lat)] if lon is not None and lat is not None else None,
+        },
+        "link_2gis": row[14],
+        "link_yandex": row[15],
+        "rating_yandex": float(row[16]) if row[16] is not None else None,
+        "rating_2gis": float(row[17]) if row[17] is not None else None,
+        "review_count": row[18],
+        "last_review_date": row[19].isoformat() if row[19] is not None else None,
+        "topic_neg_share": {k: float(v) for k, v in (row[20] or {}).items()},
+    }
+
+
+def _query_school_by_id(school_id: int) -> Dict[str, Any]:
+    """Синхронная часть /api/schools/{school_id}: выполняется в потоке пула БД"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT " + SCHOOL_DETAIL_COLUMNS + " FROM sa.school_summary s WHERE s.school_id = %s",
+                (school_id,),
+            )
+            row = cursor.fetchone()
+            cursor.close()
+            if not row:
+                raise HTTPException(status_code=404, detail="Школа не найдена")
+            return _school_detail_row_to_dict(row)
+    except psycopg2.Error as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка БД: {str(e)}")
+
+
+def _query_schools_batch(school_ids: Tuple[int, ...]) -> Dict[str, Any]:
+    """
+    Синхронная часть /api/schools/batch: выполняется в потоке пула БД.
+    Все школы одним запросом school_id = ANY(массив) по уникальному индексу сводки;
+    порядок ответа — порядок запрошенных id, отсутствующие id — в missing.
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT " + SCHOOL_DETAIL_COLUMNS + " FROM sa.school_summary s WHERE s.school_id = ANY(%s)",
+                (list(school_ids),),
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+    except psycopg2.Error as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка БД: {str(e)}")
+
+    found = {row[0]: _school_detail_row_to_dict(row) for row in rows}
+    schools = [found[school_id] for school_id in school_ids if school_id in found]
+    missing = [school_id for school_id in school_ids if school_id not in found]
+    return {"schools": schools, "count": len(schools), "missing": missing}
+
+
+def parse_school_ids(values: List[Any]) -> Tuple[int, ...]:
+    """
+    id школ из запроса без повторов, в порядке первого появления.
+    Элемент может быть числом или строкой с id через запятую: ids=1,2&ids=3.
+    """
+    result: Dict[int, None] = {}
+    for value in values:
+        for part in str(value).split(","):
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                school_id = int(part)
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail=f"Некорректный id школы: {part!r}")
+            result[school_id] = None
+    if not result:
+        raise HTTPException(status_code=400, detail="Не указаны id школ")
+    if len(result) > SCHOOLS_BATCH_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Слишком много id школ: {len(result)}, максимум {SCHOOLS_BATCH_MAX}"
+        )
+    return tuple(result)
+
+
+@app.get("/api/schools/batch")
+async def get_schools_batch(
+    request: Request,
+    response: Response,
+    ids: List[str] = Query(..., description="id школ через запятую: ids=1,2,3 (или ids=1&ids=2)"),
+):
+    """
+    Карточки нескольких школ одним запросом (поля как у /api/schools/{school_id}).
+    schools — в порядке запрошенных id, missing — id, которых нет в БД.
+    """
+    school_ids = parse_school_ids(ids)
+    version, not_modified = await conditional_etag(request, response, "school_batch", school_ids)
+    if not_modified is not None:
+        return not_modified
+    return await single_flight.do(
+        "school_batch", version, school_ids, api_db.run_in_db_thread, repository.schools_batch, school_ids
+    )
+
+
+@app.post("/api/schools/batch")
+async def post_schools_batch(ids: List[int] = Body(..., embed=True, description="id школ")):
+    """
+    То же, что GET /api/schools/batch, для длинных списков id: тело {"ids": [1, 2, 3]}.
+    """
+    school_ids = parse_school_ids(ids)
+    version = await current_data_version()
+    return await single_flight.do(
+        "school_batch", version, school_ids, api_db.run_in_db_thread, repository.schools_batch, school_ids
+    )
+
+
+@app.get("/api/schools/{school_id}")
+async def get_school_by_id(school_id: int, request: Request, response: Response):
+    """
+    Одна школа по id для детальной панели из сводки sa.school_summary:
+    данные школы, ссылки, рейтинги и статистика отзывов (доля негатива по темам).
+    """
+    version, not_modified = await conditional_etag(request, response, "school", (school_id,))
+    if not_modified is not None:
+        return not_modified
+    return await single_flight.do(
+        "school", version, (school_id,), api_db.run_in_db_thread, repository.school_by_id, school_id
+    )
+
+
+def _query_school_reviews_topics(school_id: int) -> Dict[str, Any]:
+    """Синхронная часть /api/schools/{school_id}/reviews/topics: выполняется в потоке пула БД"""
+    import json as json_lib
+
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT review_date, topics
+                FROM sa.review
+                WHERE school_id = %s AND review_date IS NOT NULL
+                ORDER BY review_date
+                """,
+                (school_id,),
+            )
+            rows = cursor.fetchall()
+            reviews = []
+            for row in rows:
+                topics = None
+                if row[1] is not None:
+                    if isinstance(row[1], str) and row[1].strip():
+                        try:
+                            topics = json_lib.loads(row[1])
+                        except (json_lib.JSONDecodeError, TypeError):
+                            topics = {}
+                    else:
+                        topics = row[1] if isinstance(row[1], dict) else {}
+                reviews.append({
+                    "review_date": row[0].isoformat() if hasattr(row[0], "isoformat") else str(row[0]),
+                    "topics": topics or {},
+                })
+            cursor.close()
+            return {"reviews": reviews}
     except psycopg2.Error as e:
         raise HTTPException(status_code=500, detail=f"Ошибка БД: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
 
 
 @app.get("/api/schools/{school_id}/reviews/topics")
-async def get_school_reviews_topics(school_id: int):
+async def get_school_reviews_topics(school_id: int, request: Request, response: Response):
     """
     Отзывы школы только с датой и темами (topics) для графика тональности.
     topics — JSON-объект вида {"учителя": "pos", "ремонт": "neg", ...}.
     """
-    import json as json_lib
+    _, not_modified = await conditional_etag(request, response, "review_topics", (school_id,))
+    if not_modified is not None:
+        return not_modified
+    return await api_db.run_in_db_thread(repository.reviews_topics, school_id)
+
 
-    conn = None
+# Интервалы графика тональности → формат ключа периода (совпадает с ключами AnalyticsView)
+TIMELINE_PERIOD_FORMATS = {
+    "week": "YYYY-MM-DD",
+    "month": "YYYY-MM",
+    "quarter": "YYYY-\"Q\"Q",
+    "year": "YYYY",
+}
+
+
+def _query_topics_timeline(school_id: int, interval: str) -> Dict[str, Any]:
+    """
+    Синхронная часть /api/schools/{school_id}/reviews/topics/timeline.
+    Агрегация тем × периодов выполняется в SQL: из БД приходит по строке
+    на пару (период, тема), а не по строке на отзыв.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT review_date, topics
-            FROM sa.review
-            WHERE school_id = %s AND review_date IS NOT NULL
-            ORDER BY review_date
-            """,
-            (school_id,),
-        )
-        rows = cursor.fetchall()
-        reviews = []
-        for row in rows:
-            topics = None
-            if row[1] is not None:
-                if isinstance(row[1], str) and row[1].strip():
-                    try:
-                        topics = json_lib.loads(row[1])
-                    except (json_lib.JSONDecodeError, TypeError):
-                        topics = {}
-                else:
-                    topics = row[1] if isinstance(row[1], dict) else {}
-            reviews.append({
-                "review_date": row[0].isoformat() if hasattr(row[0], "isoformat") else str(row[0]),
-                "topics": topics or {},
-            })
-        cursor.close()
-        return {"reviews": reviews}
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT
+                    to_char(date_trunc(%s, r.review_date::timestamp), %s) AS period,
+                    t.topic,
+                    COUNT(*) FILTER (WHERE t.tone = 'pos') AS pos,
+                    COUNT(*) FILTER (WHERE t.tone = 'neg') AS neg,
+                    COUNT(*) FILTER (WHERE t.tone = 'neutral') AS neutral,
+                    COUNT(*) AS mentions
+                FROM sa.review r
+                CROSS JOIN LATERAL jsonb_each_text(r.topics) AS t(topic, tone)
+                WHERE r.school_id = %s
+                  AND r.review_date IS NOT NULL
+                  AND jsonb_typeof(r.topics) = 'object'
+                GROUP BY 1, 2
+                ORDER BY 1, 2
+                """,
+                (interval, TIMELINE_PERIOD_FORMATS[interval], school_id),
+            )
+            rows = cursor.fetchall()
+            cursor.close()
     except psycopg2.Error as e:
         raise HTTPException(status_code=500, detail=f"Ошибка БД: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
 
+    # Столбцовый ответ: periods + по каждой теме массивы счётчиков той же длины
+    periods = sorted({row[0] for row in rows})
+    index = {period: i for i, period in enumerate(periods)}
+    topics: Dict[str, Dict[str, List[int]]] = {}
+    mentions: Dict[str, int] = {}
+    for period, topic, pos, neg, neutral, total in rows:
+        counts = topics.get(topic)
+        if counts is None:
+            counts = topics[topic] = {key: [0] * len(periods) for key in ("pos", "neg", "neutral")}
+        i = index[period]
+        counts["pos"][i] = pos
+        counts["neg"][i] = neg
+        counts["neutral"][i] = neutral
+        mentions[topic] = mentions.get(topic, 0) + total
 
-@app.get("/schools/{school_id}/reviews")
-async def get_school_reviews(
+    return {
+        "school_id": school_id,
+        "interval": interval,
+        "periods": periods,
+        "topics": topics,
+        "mentions": mentions,
+    }
+
+
+@app.get("/api/schools/{school_id}/reviews/topics/timeline")
+async def get_school_topics_timeline(
     school_id: int,
-    date_start: Optional[date] = Query(None, description="Начальная дата (YYYY-MM-DD)"),
-    date_end: Optional[date] = Query(None, description="Конечная дата (YYYY-MM-DD)")
+    request: Request,
+    response: Response,
+    interval: str = Query("month", pattern="^(week|month|quarter|year)$", description="Период: week, month, quarter, year"),
 ):
-    """Получить отзывы по школе с фильтрацией по датам"""
-    import json as json_lib
-    
-    conn = None
+    """
+    Тональность тем отзывов школы по периодам для графика AnalyticsView.
+    Для каждой темы — число положительных, отрицательных и нейтральных упоминаний
+    в каждом периоде; размер ответа зависит от числа тем и периодов, а не отзывов.
+    """
+    params = (school_id, interval)
+    version, not_modified = await conditional_etag(request, response, "topics_timeline", params)
+    if not_modified is not None:
+        return not_modified
+
+    cached = response_cache.get("topics_timeline", version, params)
+    if cached is not None:
+        return cached
+
+    result = await api_db.run_in_db_thread(repository.topics_timeline, school_id, interval)
+    response_cache.set("topics_timeline", version, params, result)
+    return result
+
+
+# sa.review: review_id, school_id, review_date, review_text, likes_count, dislikes_count, review_rating, topics, overall
+REVIEW_COLUMNS = """
+    review_id,
+    school_id,
+    review_date,
+    review_text,
+    likes_count,
+    dislikes_count,
+    review_rating,
+    topics,
+    overall
+"""
+
+# Размер страницы отзывов по умолчанию и максимальный
+REVIEWS_PAGE_SIZE = 100
+REVIEWS_PAGE_MAX = 1000
+# Сколько строк за раз забирает серверный курсор в режиме NDJSON
+REVIEWS_STREAM_ITERSIZE = 500
+
+
+def _int_or_none(val):
+    if val is None:
+        return None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # sa.review: review_id, school_id, review_date, review_text, likes_count, dislikes_count, review_rating, topics, overall
-        query = """
-            SELECT
-                review_id,
-                school_id,
-                review_date,
-                review_text,
-                likes_count,
-                dislikes_count,
-                review_rating,
-                topics,
-                overall
-            FROM sa.review
-            WHERE school_id = %s
-        """
-        params = [school_id]
-        if date_start is not None:
-            query += " AND (review_date >= %s OR review_date IS NULL)"
-            params.append(date_start)
-        if date_end is not None:
-            query += " AND (review_date <= %s OR review_date IS NULL)"
-            params.append(date_end)
-        query += " ORDER BY review_date DESC NULLS LAST, review_id"
-
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+        return int(val)
+    except (ValueError, TypeError):
+        return None
+
 
+def _review_row_to_dict(row) -> Dict[str, Any]:
+    """Строка sa.review (порядок REVIEW_COLUMNS) → объект отзыва для ответа API"""
+    topics = None
+    if row[7] is not None:
+        if isinstance(row[7], str) and row[7].strip():
+            try:
+                topics = json.loads(row[7])
+            except (json.JSONDecodeError, TypeError):
+                topics = None
+        else:
+            topics = row[7]
+
+    review_date_str = None
+    if row[2] is not None:
+        review_date_str = row[2].isoformat() if hasattr(row[2], "isoformat") else str(row[2])
+
+    review_rating = None
+    if row[6] is not None and row[6] != "":
+        try:
+            review_rating = int(row[6])
+        except (ValueError, TypeError):
+            review_rating = None
+
+    return {
+        "review_id": row[0],
+        "school_id": str(row[1]) if row[1] is not None else None,
+        "date": review_date_str,
+        "review_date": review_date_str,
+        "text": row[3] if row[3] is not None else None,
+        "review_text": row[3] if row[3] is not None else None,
+        "topics": topics,
+        "review_topic": topics,
+        "overall": row[8] if row[8] is not None else None,
+        "review_overall": row[8] if row[8] is not None else None,
+        "review_likes": _int_or_none(row[4]),
+        "review_dislikes": _int_or_none(row[5]),
+        "review_rating": review_rating,
+    }
+
+
+def encode_review_cursor(review_date: Optional[date], review_id: int) -> str:
+    """Курсор страницы: позиция последнего отзыва (review_date, review_id) в base64url"""
+    raw = f"{review_date.isoformat() if review_date else ''}|{review_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_review_cursor(cursor: str) -> Tuple[Optional[date], int]:
+    """Обратное к encode_review_cursor; при неверном курсоре — 400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw_date, raw_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|")
+        return (date.fromisoformat(raw_date) if raw_date else None), int(raw_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор страницы отзывов")
+
+
+def _reviews_query(
+    school_id: int,
+    date_start: Optional[date],
+    date_end: Optional[date],
+    after: Optional[Tuple[Optional[date], int]],
+) -> Tuple[str, List[Any]]:
+    """
+    SELECT отзывов школы в порядке review_date DESC NULLS LAST, review_id.
+    after — позиция последнего отданного отзыва: keyset-условие продолжает выборку
+    сразу за ним по индексу idx_review_school_date, без OFFSET.
+    """
+    query = "SELECT " + REVIEW_COLUMNS + " FROM sa.review WHERE school_id = %s"
+    params: List[Any] = [school_id]
+    if date_start is not None:
+        query += " AND (review_date >= %s OR review_date IS NULL)"
+        params.append(date_start)
+    if date_end is not None:
+        query += " AND (review_date <= %s OR review_date IS NULL)"
+        params.append(date_end)
+    if after is not None:
+        after_date, after_id = after
+        if after_date is not None:
+            query += (
+                " AND (review_date < %s OR (review_date = %s AND review_id > %s)"
+                " OR review_date IS NULL)"
+            )
+            params.extend([after_date, after_date, after_id])
+        else:
+            query += " AND review_date IS NULL AND review_id > %s"
+            params.append(after_id)
+    query += " ORDER BY review_date DESC NULLS LAST, review_id"
+    return query, params
+
+
+def _query_school_reviews(
+    school_id: int,
+    date_start: Optional[date],
+    date_end: Optional[date],
+    after: Optional[Tuple[Optional[date], int]] = None,
+    limit: int = REVIEWS_PAGE_SIZE,
+) -> Dict[str, Any]:
+    """Синхронная часть /schools/{school_id}/reviews: одна страница, выполняется в потоке пула БД"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            query, params = _reviews_query(school_id, date_start, date_end, after)
+            # Берём на одну строку больше, чтобы понять, есть ли следующая страница
+            cursor.execute(query + " LIMIT %s", params + [limit + 1])
+            rows = cursor.fetchall()
+            cursor.close()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         reviews = []
         for row in rows:
             try:
-                topics = None
-                if row[7] is not None:
-                    if isinstance(row[7], str) and row[7].strip():
-                        try:
-                            topics = json_lib.loads(row[7])
-                        except (json_lib.JSONDecodeError, TypeError):
-                            topics = None
-                    else:
-                        topics = row[7]
-
-                review_date_str = None
-                if row[2] is not None:
-                    review_date_str = row[2].isoformat() if hasattr(row[2], "isoformat") else str(row[2])
-
-                review_rating = None
-                if row[6] is not None and row[6] != "":
-                    try:
-                        review_rating = int(row[6])
-                    except (ValueError, TypeError):
-                        review_rating = None
-
-                def _int_or_none(val):
-                    if val is None:
-                        return None
-                    try:
-                        return int(val)
-                    except (ValueError, TypeError):
-                        return None
-
-                review = {
-                    "review_id": row[0],
-                    "school_id": str(row[1]) if row[1] is not None else None,
-                    "date": review_date_str,
-                    "review_date": review_date_str,
-                    "text": row[3] if row[3] is not None else None,
-                    "review_text": row[3] if row[3] is not None else None,
-                    "topics": topics,
-                    "review_topic": topics,
-                    "overall": row[8] if row[8] is not None else None,
-                    "review_overall": row[8] if row[8] is not None else None,
-                    "review_likes": _int_or_none(row[4]),
-                    "review_dislikes": _int_or_none(row[5]),
-                    "review_rating": review_rating,
-                }
-                reviews.append(review)
+                reviews.append(_review_row_to_dict(row))
             except Exception as e:
                 print(f"[WARN] Ошибка обработки записи review_id={row[0]}: {e}")
                 continue
 
-        cursor.close()
-        return {"reviews": reviews}
-        
+        next_cursor = encode_review_cursor(rows[-1][2], rows[-1][0]) if has_more else None
+        return {"reviews": reviews, "next_cursor": next_cursor}
+
+    except HTTPException:
+        raise
     except psycopg2.Error as e:
         import traceback
         error_detail = f"Ошибка БД: {str(e)}"
@@ -425,9 +1284,521 @@ async def get_school_reviews(
         print(f"[ERROR] {error_detail}")
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=error_detail)
-    finally:
-        if conn:
-            conn.close()
+
+
+def _stream_school_reviews(
+    school_id: int,
+    date_start: Optional[date],
+    date_end: Optional[date],
+    after: Optional[Tuple[Optional[date], int]] = None,
+) -> Iterator[bytes]:
+    """
+    Все отзывы школы в формате NDJSON (по объекту на строку).
+    Серверный (именованный) курсор отдаёт строки порциями по REVIEWS_STREAM_ITERSIZE,
+    поэтому память не растёт с числом отзывов, а первая строка уходит клиенту сразу.
+    Генератор синхронный: StreamingResponse перебирает его в пуле потоков.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor(name=f"reviews_stream_{school_id}")
+        cursor.itersize = REVIEWS_STREAM_ITERSIZE
+        try:
+            query, params = _reviews_query(school_id, date_start, date_end, after)
+            cursor.execute(query, params)
+            for row in cursor:
+                try:
+                    review = _review_row_to_dict(row)
+                except Exception as e:
+                    print(f"[WARN] Ошибка обработки записи review_id={row[0]}: {e}")
+                    continue
+                yield api_json.dumps(review) + b"\n"
+        except psycopg2.Error as e:
+            # Статус уже отправлен: сообщаем об ошибке последней строкой потока
+            print(f"[ERROR] Ошибка БД при выгрузке отзывов school_id={school_id}: {e}")
+            yield api_json.dumps({"error": f"Ошибка БД: {str(e)}"}) + b"\n"
+        finally:
+            cursor.close()
+
+
+@app.get("/schools/{school_id}/reviews")
+async def get_school_reviews(
+    school_id: int,
+    request: Request,
+    response: Response,
+    date_start: Optional[date] = Query(None, description="Начальная дата (YYYY-MM-DD)"),
+    date_end: Optional[date] = Query(None, description="Конечная дата (YYYY-MM-DD)"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (next_cursor из прошлого ответа)"),
+    limit: int = Query(REVIEWS_PAGE_SIZE, ge=1, le=REVIEWS_PAGE_MAX, description="Отзывов на странице"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json — страница, ndjson — поток всех отзывов"),
+):
+    """
+    Получить отзывы по школе с фильтрацией по датам.
+    json: страница из limit отзывов и next_cursor для следующей (null — отзывов больше нет).
+    ndjson: все отзывы потоком, по объекту на строку.
+    """
+    after = decode_review_cursor(cursor) if cursor else None
+    _, not_modified = await conditional_etag(
+        request, response, "reviews", (school_id, date_start, date_end, cursor, limit, format)
+    )
+    if not_modified is not None:
+        return not_modified
+
+    if format == "ndjson":
+        # Первую порцию берём до отправки заголовков: ошибки подключения к БД
+        # ещё можно вернуть обычным статусом, а не обрывом потока
+        stream = repository.reviews_stream(school_id, date_start, date_end, after)
+        first = await api_db.run_in_db_thread(next, stream, b"")
+        return StreamingResponse(
+            itertools.chain([first], stream),
+            media_type="application/x-ndjson",
+            headers=etag_headers(response),
+        )
+    result = await api_db.run_in_db_thread(
+        repository.reviews_page, school_id, date_start, date_end, after, limit
+    )
+    # Страница отзывов может быть большой: кодируем сразу, без jsonable_encoder
+    return api_json.FastJSONResponse(result, headers=etag_headers(response))
+
+
+# --- Выгрузка таблиц целиком (CSV / Arrow / Parquet), см. api_export.py ---
+
+
+def _stream_export(table: str, fmt: str, school_id: Optional[int]) -> Iterator[bytes]:
+    """
+    Выгрузка таблицы потоком порций байт; подключение из пула занято до конца выгрузки.
+    Генератор синхронный: StreamingResponse перебирает его в пуле потоков.
+    """
+    started = False
+    with get_db_connection() as conn:
+        try:
+            for chunk in api_export.stream_export(conn, table, fmt, school_id):
+                started = True
+                yield chunk
+        except psycopg2.Error as e:
+            if not started:
+                raise HTTPException(status_code=500, detail=f"Ошибка БД: {str(e)}")
+            # Статус уже отправлен: обрываем поток, чтобы клиент не принял неполный файл за целый
+            print(f"[ERROR] Ошибка БД при выгрузке {table} ({fmt}): {e}")
+            raise
+
+
+async def _export_response(
+    request: Request,
+    response: Response,
+    table: str,
+    fmt: str,
+    school_id: Optional[int] = None,
+) -> Response:
+    if fmt != "csv" and not api_export.pyarrow_available():
+        raise HTTPException(
+            status_code=501,
+            detail=f"Формат {fmt} недоступен: пакет pyarrow не установлен (pip install pyarrow)"
+        )
+    _, not_modified = await conditional_etag(request, response, "export", (table, fmt, school_id))
+    if not_modified is not None:
+        return not_modified
+
+    media_type, extension = api_export.FORMATS[fmt]
+    filename = f"{table}_{school_id}.{extension}" if school_id is not None else f"{table}.{extension}"
+    headers = etag_headers(response)
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    # Первую порцию берём до отправки заголовков: ошибки подключения к БД
+    # ещё можно вернуть обычным статусом, а не обрывом потока
+    stream = repository.export(table, fmt, school_id)
+    first = await api_db.run_in_db_thread(next, stream, b"")
+    return StreamingResponse(itertools.chain([first], stream), media_type=media_type, headers=headers)
+
+
+@app.get("/api/export/schools")
+async def export_schools(
+    request: Request,
+    response: Response,
+    format: str = Query("csv", pattern="^(csv|arrow|parquet)$", description="csv, arrow (Arrow IPC stream) или parquet"),
+):
+    """Все школы из sa.school_summary одним файлом (рейтинги, ссылки, число отзывов)."""
+    return await _export_response(request, response, "schools", format)
+
+
+@app.get("/api/export/reviews")
+async def export_reviews(
+    request: Request,
+    response: Response,
+    format: str = Query("csv", pattern="^(csv|arrow|parquet)$", description="csv, arrow (Arrow IPC stream) или parquet"),
+    school_id: Optional[int] = Query(None, description="Только отзывы одной школы"),
+):
+    """Все отзывы из sa.review одним файлом; topics — JSON-строка."""
+    return await _export_response(request, response, "reviews", format, school_id)
+
+
+# --- Закрепление домов за школами (sa.catchment_rule, sa.catchment_house, sa.catchment_area) ---
+
+# Радиус (м) поиска геокодированного закреплённого дома вокруг точки в /api/catchment/lookup
+CATCHMENT_HOUSE_RADIUS_M = float(os.getenv('CATCHMENT_HOUSE_RADIUS_M', '30'))
+
+# «ул. Чернышевского, д. 118а» → улица «ул. Чернышевского», дом «118а»
+RE_ADDRESS_HOUSE = re.compile(
+    r"^(?P<street>.*?)[\s,]+(?:д\.?|дом)?\s*(?P<house>\d+\s*[а-яa-z]?(?:\s*[/\\к]\s*\d+\s*[а-я]?)?)\s*$",
+    re.IGNORECASE,
+)
+RE_HOUSE_BASE = re.compile(r"\d+")
+
+
+def split_address(address: str) -> Tuple[str, Optional[str]]:
+    """Разделить адрес на улицу и номер дома (последний номер в строке); без номера — (адрес, None)."""
+    match = RE_ADDRESS_HOUSE.match(address.strip())
+    if not match or not match.group("street").strip(" ,"):
+        return address.strip(), None
+    return match.group("street").strip(" ,"), match.group("house")
+
+
+def _catchment_school(row: Tuple, offset: int) -> Dict[str, Any]:
+    """Поля школы из sa.school_summary, начиная с колонки offset."""
+    lon, lat = row[offset + 3], row[offset + 4]
+    return {
+        "name_2gis": row[offset],
+        "name_ym": row[offset + 1],
+        "school_address": row[offset + 2],
+        "location": {
+            "type": "Point",
+            "coordinates": [float(lon), float(lat)] if lon is not None and lat is not None else None,
+        },
+    }
+
+
+def _query_catchment_lookup(
+    street: Optional[str],
+    house: Optional[str],
+    lat: Optional[float],
+    lon: Optional[float],
+) -> Dict[str, Any]:
+    """
+    Синхронная часть /api/catchment/lookup: выполняется в потоке пула БД.
+    По адресу — один проход GIST-индекса idx_catchment_rule_street_houses:
+    street_norm = нормализованная улица AND houses @> номер дома, затем чётность и литера.
+    По точке — полигоны закреплённых улиц (ST_Intersects) и геокодированные дома в радиусе.
+    """
+    schools: List[Dict[str, Any]] = []
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            if street is not None:
+                base = int(RE_HOUSE_BASE.search(house).group()) if house else None
+                cursor.execute(
+                    """
+                    SELECT DISTINCT ON (COALESCE(c.school_id::text, c.school_name))
+                        c.school_id,
+                        c.school_name,
+                        c.district,
+                        c.street,
+                        c.houses_raw,
+                        s.name_2gis,
+                        s.name_ym,
+                        s.school_address,
+                        s.lon,
+                        s.lat
+                    FROM sa.catchment_rule c
+                    LEFT JOIN sa.school_summary s ON s.school_id = c.school_id
+                    WHERE c.street_norm = sa.normalize_street(%(street)s)
+                      AND (%(base)s::int IS NULL OR (
+                          c.houses @> %(base)s::int
+                          AND (c.parity IS NULL OR c.parity = %(base)s::int %% 2)
+                          AND (c.house_exact IS NULL OR c.house_exact = sa.normalize_house(%(house)s))
+                      ))
+                    ORDER BY COALESCE(c.school_id::text, c.school_name), c.rule_id
+                    """,
+                    {'street': street, 'house': house, 'base': base},
+                )
+                for row in cursor.fetchall():
+                    school = {
+                        "school_id": row[0],
+                        "school_name": row[1],
+                        "district": row[2],
+                        "match": "address",
+                        "street": row[3],
+                        "houses": row[4],
+                    }
+                    school.update(_catchment_school(row, 5))
+                    schools.append(school)
+
+            if lat is not None and lon is not None:
+                cursor.execute(
+                    """
+                    WITH point AS (
+                        SELECT ST_SetSRID(ST_MakePoint(%(lon)s, %(lat)s), 4326)::geography AS geog
+                    ),
+                    matched AS (
+                        SELECT a.school_id, 'area' AS match, a.street AS source, 0.0 AS distance_m
+                        FROM sa.catchment_area a, point
+                        WHERE ST_Intersects(a.area, point.geog)
+                        UNION ALL
+                        SELECT h.school_id, 'house', h.address, ST_Distance(h.location, point.geog)
+                        FROM sa.catchment_house h, point
+                        WHERE ST_DWithin(h.location, point.geog, %(radius)s)
+                    )
+                    SELECT DISTINCT ON (m.school_id)
+                        m.school_id,
+                        m.match,
+                        m.source,
+                        s.name_2gis,
+                        s.name_ym,
+                        s.school_address,
+                        s.lon,
+                        s.lat
+                    FROM matched m
+                    LEFT JOIN sa.school_summary s ON s.school_id = m.school_id
+                    ORDER BY m.school_id, m.distance_m
+                    """,
+                    {'lon': lon, 'lat': lat, 'radius': CATCHMENT_HOUSE_RADIUS_M},
+                )
+                known = {school["school_id"] for school in schools if school["school_id"] is not None}
+                for row in cursor.fetchall():
+                    if row[0] in known:
+                        continue
+                    school = {
+                        "school_id": row[0],
+                        "school_name": row[3] or row[4],
+                        "district": None,
+                        "match": row[1],
+                        "street": row[2] if row[1] == "area" else None,
+                        "houses": row[2] if row[1] == "house" else None,
+                    }
+                    school.update(_catchment_school(row, 3))
+                    schools.append(school)
+            cursor.close()
+    except psycopg2.Error as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка БД: {str(e)}")
+
+    return {
+        "street": street,
+        "house": house,
+        "schools": schools,
+        "count": len(schools),
+    }
+
+
+@app.get("/api/catchment/lookup")
+async def lookup_catchment(
+    request: Request,
+    response: Response,
+    address: Optional[str] = Query(None, min_length=2, max_length=200, description="Адрес: улица и номер дома"),
+    street: Optional[str] = Query(None, min_length=2, max_length=200, description="Улица (вместо address)"),
+    house: Optional[str] = Query(None, max_length=20, description="Номер дома: 118, 13а, 9/1, 8к1"),
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Широта точки"),
+    lon: Optional[float] = Query(None, ge=-180, le=180, description="Долгота точки"),
+):
+    """
+    Школы, за которыми закреплён адрес или точка.
+    По адресу — правила распоряжения (sa.catchment_rule): улица + диапазон домов и чётность;
+    без номера дома — все школы, за которыми закреплены дома улицы.
+    По точке — полигоны закреплённых улиц и геокодированные дома рядом.
+    match — как найдено: address, area или house.
+    """
+    if address is not None and street is not None:
+        raise HTTPException(status_code=400, detail="Укажите либо address, либо street и house")
+    if (lat is None) != (lon is None):
+        raise HTTPException(status_code=400, detail="Координаты: нужны и lat, и lon")
+    if address is not None:
+        street, parsed_house = split_address(address)
+        house = house or parsed_house
+    if house is not None and not RE_HOUSE_BASE.search(house):
+        raise HTTPException(status_code=400, detail="Номер дома должен содержать число")
+    if street is None and lat is None:
+        raise HTTPException(status_code=400, detail="Укажите address, street или lat и lon")
+
+    params = (street, house, lat, lon)
+    _, not_modified = await conditional_etag(request, response, "catchment", params)
+    if not_modified is not None:
+        return not_modified
+    return await api_db.run_in_db_thread(repository.catchment_lookup, *params)
+
+
+# --- Векторные тайлы (Mapbox Vector Tile) для карты ---
+
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+
+
+def _query_tile(z: int, x: int, y: int) -> bytes:
+    """
+    Синхронная часть /tiles/{z}/{x}/{y}.mvt: один запрос собирает три слоя тайла.
+      schools          — школы с рейтингами и спортивными объектами;
+      catchment_houses — закреплённые за школами дома;
+      catchment_areas  — полигоны закреплённых улиц.
+    Отбор по тайлу идёт через && по GIST-индексам (геометрия тайла переводится в geography).
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                WITH bounds AS (
+                    SELECT
+                        ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS geom,
+                        ST_Transform(ST_TileEnvelope(%(z)s, %(x)s, %(y)s), 4326)::geography AS geog
+                ),
+                schools AS (
+                    SELECT
+                        ST_AsMVTGeom(
+                            ST_Transform(s.location::geometry, 3857), b.geom, %(extent)s, %(buffer)s, true
+                        ) AS geom,
+                        s.school_id,
+                        COALESCE(s.name_2gis, s.name_ym) AS name,
+                        s.rating_yandex::float8 AS rating_yandex,
+                        s.rating_2gis::float8 AS rating_2gis,
+                        s.has_sports_complex,
+                        s.has_pool,
+                        s.has_stadium,
+                        s.has_sports_ground
+                    FROM sa.school_summary s
+                    CROSS JOIN bounds b
+                    WHERE s.location && b.geog
+                ),
+                houses AS (
+                    SELECT
+                        ST_AsMVTGeom(
+                            ST_Transform(h.location::geometry, 3857), b.geom, %(extent)s, %(buffer)s, true
+                        ) AS geom,
+                        h.house_id,
+                        h.school_id,
+                        h.address
+                    FROM sa.catchment_house h
+                    CROSS JOIN bounds b
+                    WHERE h.location && b.geog
+                ),
+                areas AS (
+                    SELECT
+                        ST_AsMVTGeom(
+                            ST_Transform(a.area::geometry, 3857), b.geom, %(extent)s, %(buffer)s, true
+                        ) AS geom,
+                        a.area_id,
+                        a.school_id,
+                        a.street
+                    FROM sa.catchment_area a
+                    CROSS JOIN bounds b
+                    WHERE a.area && b.geog
+                )
+                SELECT
+                    COALESCE((SELECT ST_AsMVT(schools, 'schools', %(extent)s, 'geom') FROM schools), ''::bytea)
+                    || COALESCE((SELECT ST_AsMVT(houses, 'catchment_houses', %(extent)s, 'geom') FROM houses), ''::bytea)
+                    || COALESCE((SELECT ST_AsMVT(areas, 'catchment_areas', %(extent)s, 'geom') FROM areas), ''::bytea)
+                """,
+                {"z": z, "x": x, "y": y, "extent": MVT_EXTENT, "buffer": MVT_BUFFER},
+            )
+            row = cursor.fetchone()
+            cursor.close()
+            return bytes(row[0]) if row and row[0] is not None else b""
+    except psycopg2.Error as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка БД: {str(e)}")
+
+
+async def _build_tile(version: int, z: int, x: int, y: int) -> bytes:
+    """Тайл на промахе кэша: запрос к БД и запись в кэш"""
+    tile = await api_db.run_in_db_thread(repository.tile, z, x, y)
+    tile_cache.set("tile", version, (z, x, y), tile)
+    return tile
+
+
+@app.get("/tiles/{z}/{x}/{y}.mvt")
+async def get_tile(z: int, x: int, y: int, request: Request, response: Response):
+    """
+    Векторный тайл (Mapbox Vector Tile) со слоями schools, catchment_houses, catchment_areas.
+    Тайлы кэшируются по (z, x, y, версия данных); клиент скачивает только видимые тайлы.
+    """
+    if not 0 <= z <= 22 or not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+        raise HTTPException(status_code=400, detail="Некорректные координаты тайла")
+
+    version, not_modified = await conditional_etag(request, response, "tile", (z, x, y))
+    if not_modified is not None:
+        return not_modified
+
+    tile = tile_cache.get("tile", version, (z, x, y))
+    if tile is None:
+        tile = await single_flight.do("tile", version, (z, x, y), _build_tile, version, z, x, y)
+
+    return Response(
+        content=tile,
+        media_type="application/vnd.mapbox-vector-tile",
+        headers=etag_headers(response),
+    )
+
+
+# --- Хранилище данных: PostgreSQL или локальный SQLite (см. api_storage.py) ---
+
+
+class PostgresRepository(api_storage.SchoolRepository):
+    """Основной backend: запросы _query_* к PostgreSQL/PostGIS через пул api_db"""
+
+    name = "postgres"
+
+    def open(self) -> None:
+        try:
+            api_db.init_pool()
+        except psycopg2.Error as e:
+            # API стартует и без БД: пул будет создан при первом запросе
+            print(f"[WARN] Не удалось создать пул подключений к БД: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        # Пул не создаётся здесь: stats() вызывается в event loop (/api/health, /metrics)
+        pool_stats = api_db.pool_stats()
+        return {"pool": pool_stats if pool_stats is not None else "not initialised"}
+
+    def data_version(self) -> int:
+        return _query_data_version()
+
+    def schools(self) -> Dict[str, Any]:
+        return _query_schools()
+
+    def schools_for_map(self, *filters: Any) -> Dict[str, Any]:
+        return _query_schools_for_map(*filters)
+
+    def suggest(self, query: str, limit: int) -> Dict[str, Any]:
+        return _query_school_suggest(query, limit)
+
+    def nearest(self, *params: Any) -> Dict[str, Any]:
+        return _query_nearest_schools(*params)
+
+    def school_by_id(self, school_id: int) -> Dict[str, Any]:
+        return _query_school_by_id(school_id)
+
+    def schools_batch(self, school_ids: Tuple[int, ...]) -> Dict[str, Any]:
+        return _query_schools_batch(school_ids)
+
+    def reviews_topics(self, school_id: int) -> Dict[str, Any]:
+        return _query_school_reviews_topics(school_id)
+
+    def topics_timeline(self, school_id: int, interval: str) -> Dict[str, Any]:
+        return _query_topics_timeline(school_id, interval)
+
+    def reviews_page(self, *params: Any) -> Dict[str, Any]:
+        return _query_school_reviews(*params)
+
+    def reviews_stream(self, *params: Any) -> Iterator[bytes]:
+        return _stream_school_reviews(*params)
+
+    def catchment_lookup(self, *params: Any) -> Dict[str, Any]:
+        return _query_catchment_lookup(*params)
+
+    def tile(self, z: int, x: int, y: int) -> bytes:
+        return _query_tile(z, x, y)
+
+    def export(self, table: str, fmt: str, school_id: Optional[int]) -> Iterator[bytes]:
+        return _stream_export(table, fmt, school_id)
+
+
+def create_repository() -> api_storage.SchoolRepository:
+    """Хранилище по STORAGE_BACKEND: postgres (по умолчанию) или sqlite"""
+    if api_storage.STORAGE_BACKEND == 'sqlite':
+        return api_storage.SQLiteRepository(
+            api_search.normalize_school_query,
+            encode_review_cursor,
+            MAP_CLUSTER_MAX_ZOOM,
+            MAP_CLUSTER_CELLS,
+        )
+    if api_storage.STORAGE_BACKEND != 'postgres':
+        raise SystemExit(f"[ERROR] Неизвестный STORAGE_BACKEND={api_storage.STORAGE_BACKEND}: postgres или sqlite")
+    return PostgresRepository()
+
+
+repository = create_repository()
 
 
 if __name__ == "__main__":
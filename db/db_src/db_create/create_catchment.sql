@@ -0,0 +1,31 @@
+-- Закреплённые за школами территории (микрорайоны).
+-- sa.catchment_house — геокодированные дома, sa.catchment_area — полигоны улиц.
+-- Отдаются слоями catchment_houses / catchment_areas в векторных тайлах /tiles/{z}/{x}/{y}.mvt.
+-- Выполнить один раз на уже созданной БД (в create_script.sql таблицы уже есть).
+CREATE TABLE IF NOT EXISTS sa.catchment_house (
+    house_id SERIAL PRIMARY KEY,
+    school_id INTEGER NOT NULL REFERENCES sa.school(school_id),
+    address TEXT NOT NULL,
+    LOCATION GEOGRAPHY(Point, 4326) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (school_id, address)
+);
+
+CREATE TABLE IF NOT EXISTS sa.catchment_area (
+    area_id SERIAL PRIMARY KEY,
+    school_id INTEGER NOT NULL REFERENCES sa.school(school_id),
+    street TEXT NOT NULL,
+    area GEOGRAPHY(Polygon, 4326) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (school_id, street)
+);
+
+CREATE INDEX IF NOT EXISTS idx_catchment_house_location ON
+sa.catchment_house
+    USING GIST(location);
+
+CREATE INDEX IF NOT EXISTS idx_catchment_area_area ON
+sa.catchment_area
+    USING GIST(area);
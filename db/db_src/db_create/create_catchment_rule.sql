@@ -0,0 +1,92 @@
+-- Закрепление домов за школами: улица + диапазоны номеров домов (sa.catchment_rule)
+-- и функции нормализации улицы и номера дома. Отвечает на вопрос
+-- «к какой школе закреплён мой дом» в /api/catchment/lookup.
+-- Выполнить один раз на уже созданной БД (в create_script.sql таблица уже есть).
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- Нормализация названия улицы для поиска закрепления: нижний регистр, ё → е,
+-- сокращения типа улицы → полные слова (пл → площадь, пер → переулок, ...),
+-- без «ул»/«им.»/инициалов/города, слова по алфавиту:
+-- «им. Чернышевского Н.Г.» и «ул. Чернышевского» → «чернышевского».
+CREATE OR REPLACE FUNCTION sa.normalize_street(value TEXT)
+RETURNS TEXT
+LANGUAGE SQL
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+    SELECT array_to_string(ARRAY(
+        SELECT CASE token
+            WHEN 'пл' THEN 'площадь'
+            WHEN 'пер' THEN 'переулок'
+            WHEN 'туп' THEN 'тупик'
+            WHEN 'наб' THEN 'набережная'
+            WHEN 'пр' THEN 'проспект'
+            WHEN 'просп' THEN 'проспект'
+            WHEN 'прт' THEN 'проспект'
+            WHEN 'прд' THEN 'проезд'
+            WHEN 'бр' THEN 'бульвар'
+            WHEN 'мкр' THEN 'микрорайон'
+            ELSE token
+        END AS word
+        FROM unnest(string_to_array(
+            regexp_replace(
+                -- пр-т, пр-д, б-р склеиваем до замены дефисов на пробелы
+                regexp_replace(translate(lower(COALESCE(value, '')), 'ё', 'е'), '(^|[^а-я])(пр|б)-(т|д|р)(?![а-я])', '\1\2\3', 'g'),
+                '[^а-я0-9a-z]+', ' ', 'g'
+            ),
+            ' '
+        )) AS token
+        WHERE token <> ''
+          -- однобуквенные слова — инициалы и окончания «1-й», «2-я»; цифры оставляем
+          AND (length(token) > 1 OR token ~ '^[0-9]$')
+          AND token NOT IN ('ул', 'улица', 'им', 'имени', 'город', 'саратов', 'дом')
+        ORDER BY word
+    ), ' ')
+$$;
+
+-- Нормализация номера дома: нижний регистр, без пробелов и «д.», «\» → «/»:
+-- «д. 13 А» → «13а», «9\1» → «9/1». Номер без литеры и дроби → NULL (подходит любой корпус).
+CREATE OR REPLACE FUNCTION sa.normalize_house(value TEXT)
+RETURNS TEXT
+LANGUAGE SQL
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+    SELECT NULLIF(house, '') FROM (
+        SELECT CASE WHEN house ~ '^[0-9]+$' THEN NULL ELSE house END AS house
+        FROM (
+            SELECT regexp_replace(
+                regexp_replace(translate(lower(COALESCE(value, '')), 'ё\', 'е/'), '[^0-9а-яa-z/]', '', 'g'),
+                '^[^0-9]+', ''
+            ) AS house
+        ) AS cleaned
+    ) AS result
+$$;
+
+-- Закрепление домов за школами (распоряжения комитета по образованию):
+-- одна строка — школа, улица и диапазон номеров домов (или отдельный дом).
+-- Заполняется db_src/db_insert/db_insert_data_catchment_rule.py из
+-- adreses_nears_school/ans_data/ans_stage1_adres_near_school.csv.
+CREATE TABLE IF NOT EXISTS sa.catchment_rule (
+    rule_id SERIAL PRIMARY KEY,
+    district TEXT,
+    school_name TEXT NOT NULL,
+    -- NULL, если школа из распоряжения не сопоставлена с sa.school
+    school_id INTEGER REFERENCES sa.school(school_id),
+    street TEXT NOT NULL,
+    street_norm TEXT NOT NULL,
+    -- Номера домов: [118,146]; «все дома» — [0,); «с 112» — [112,)
+    houses INT4RANGE NOT NULL,
+    -- 0 — только чётные, 1 — только нечётные, NULL — все
+    parity SMALLINT CHECK (parity IN (0, 1)),
+    -- Для отдельного дома с литерой/дробью/корпусом: «9/1», «13а», «8к1»
+    house_exact TEXT,
+    -- Исходная строка «Номера домов»
+    houses_raw TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Поиск по улице и номеру дома одним обходом индекса: street_norm = ... AND houses @> номер
+CREATE INDEX IF NOT EXISTS idx_catchment_rule_street_houses ON
+sa.catchment_rule
+    USING GIST(street_norm, houses);
@@ -0,0 +1,8 @@
+-- Хэш содержимого строк sa.school и sa.review: загрузчики db_insert_data_school.py
+-- и db_insert_data_review.py сравнивают его с хэшем строки из JSON и переписывают
+-- только изменившиеся строки (без лишних UPDATE, WAL и обновлений индексов).
+-- Выполнить один раз на уже созданной БД (в create_script.sql колонки уже есть).
+-- Пока хэш не заполнен (NULL), первая загрузка обновит все строки один раз.
+ALTER TABLE sa.school ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+ALTER TABLE sa.review ADD COLUMN IF NOT EXISTS content_hash TEXT;
@@ -0,0 +1,12 @@
+-- Версия данных: одна строка, которую загрузчики из db_src/db_insert увеличивают
+-- в той же транзакции, что и запись данных. API использует её для сброса кэша.
+-- Выполнить один раз на уже созданной БД (в create_script.sql таблица уже есть).
+CREATE TABLE IF NOT EXISTS sa.data_version (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO sa.data_version (id, version)
+VALUES (1, 1)
+ON CONFLICT (id) DO NOTHING;
@@ -0,0 +1,5 @@
+-- Индекс для постраничной выдачи отзывов школы (keyset-пагинация в /schools/{id}/reviews):
+-- порядок совпадает с ORDER BY review_date DESC NULLS LAST, review_id.
+-- Выполнить один раз на уже созданной БД (в create_script.sql индекс уже есть).
+CREATE INDEX IF NOT EXISTS idx_review_school_date ON
+sa.review(school_id, review_date DESC NULLS LAST, review_id);
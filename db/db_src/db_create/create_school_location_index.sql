@@ -0,0 +1,9 @@
+-- Пространственный индекс по координатам школ.
+-- Используется фильтром видимой области карты (s.location && ST_MakeEnvelope(...))
+-- и кластеризацией в /api/schools/map.
+-- Выполнить один раз на уже созданной БД (в create_script.sql индекс уже есть).
+CREATE INDEX IF NOT EXISTS idx_school_location ON
+sa.school
+    USING GIST(location);
+
+ANALYZE sa.school;
@@ -0,0 +1,37 @@
+-- Быстрый поиск школ: расширение pg_trgm, нормализованное название и tsvector (конфигурация russian).
+-- Колонки вычисляются самой БД (GENERATED ... STORED) и попадают в sa.school_summary,
+-- где по ним построены GIN-индексы (см. create_school_summary.sql).
+-- Выполнить один раз на уже созданной БД, затем пересоздать сводку:
+--     psql ... -f create_school_search.sql
+--     psql ... -f create_school_summary.sql
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Нормализация названия школы для поиска (та же логика, что normalize_school_query в api/api_search.py
+-- и norm() в parsing_data_main.py): нижний регистр, ё → е, только буквы и цифры,
+-- «средняя общеобразовательная школа» → «сош», без типа учреждения (МОУ, МАОУ, ...).
+CREATE OR REPLACE FUNCTION sa.normalize_school_name(value TEXT)
+RETURNS TEXT
+LANGUAGE SQL
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+    SELECT btrim(regexp_replace(
+        regexp_replace(
+            regexp_replace(
+                ' ' || regexp_replace(translate(lower(COALESCE(value, '')), 'ё', 'е'), '[^а-я0-9a-z]+', ' ', 'g') || ' ',
+                ' средн\S*\s+общеобразовательн\S*\s+школ\S*(?= )', ' сош', 'g'
+            ),
+            ' (моу|маоу|гоу|гбоу|фгоу|фгбоу|чоу|аноо|мкоу|мбоу|гапоу|гаоу|мау)(?= )', ' ', 'g'
+        ),
+        '\s+', ' ', 'g'
+    ))
+$$;
+
+ALTER TABLE sa.school
+    ADD COLUMN IF NOT EXISTS search_name TEXT GENERATED ALWAYS AS (
+        sa.normalize_school_name(COALESCE(name_2gis, '') || ' ' || COALESCE(name_ym, ''))
+    ) STORED,
+    ADD COLUMN IF NOT EXISTS search_tsv TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', sa.normalize_school_name(COALESCE(name_2gis, '') || ' ' || COALESCE(name_ym, ''))), 'A')
+        || setweight(to_tsvector('russian', COALESCE(school_address, '')), 'B')
+    ) STORED;
@@ -0,0 +1,86 @@
+-- Сводка по школам для API (карта и карточка школы): sa.school + sa.rating + sa.link
+-- + статистика отзывов. Читается одним сканом без JOIN на каждый запрос.
+-- Обновляется загрузчиками из db/db_src/db_insert (REFRESH MATERIALIZED VIEW CONCURRENTLY).
+-- Выполнить один раз на уже созданной БД (в create_script.sql представление уже есть).
+-- Требует колонок поиска из create_school_search.sql.
+DROP MATERIALIZED VIEW IF EXISTS sa.school_summary;
+
+CREATE MATERIALIZED VIEW sa.school_summary AS
+WITH review_stats AS (
+    SELECT
+        school_id,
+        COUNT(*) AS review_count,
+        MAX(review_date) AS last_review_date
+    FROM sa.review
+    GROUP BY school_id
+),
+topic_stats AS (
+    -- Доля отрицательных упоминаний каждой темы среди всех её упоминаний
+    SELECT
+        r.school_id,
+        t.topic,
+        ROUND(COUNT(*) FILTER (WHERE t.tone = 'neg')::NUMERIC / COUNT(*), 3) AS neg_share
+    FROM sa.review r
+    CROSS JOIN LATERAL jsonb_each_text(r.topics) AS t(topic, tone)
+    WHERE jsonb_typeof(r.topics) = 'object'
+    GROUP BY r.school_id, t.topic
+),
+topic_shares AS (
+    SELECT
+        school_id,
+        jsonb_object_agg(topic, neg_share) AS topic_neg_share
+    FROM topic_stats
+    GROUP BY school_id
+)
+SELECT
+    s.school_id,
+    s.name_2gis,
+    s.name_ym,
+    s.school_address,
+    s.building_type,
+    s.floors,
+    s.year_built,
+    s.reconstruction_year,
+    s.has_sports_complex,
+    s.has_pool,
+    s.has_stadium,
+    s.has_sports_ground,
+    s.search_name,
+    s.search_tsv,
+    s.location,
+    ST_X(s.location::geometry) AS lon,
+    ST_Y(s.location::geometry) AS lat,
+    r.rating_yandex,
+    r.rating_2gis,
+    l.link_2gis,
+    l.link_yandex,
+    COALESCE(rs.review_count, 0) AS review_count,
+    rs.last_review_date,
+    -- {"учителя": 0.25, "еда": 0.6}
+    COALESCE(ts.topic_neg_share, '{}'::jsonb) AS topic_neg_share
+FROM sa.school s
+LEFT JOIN sa.rating r ON r.school_id = s.school_id
+LEFT JOIN sa.link l ON l.school_id = s.school_id
+LEFT JOIN review_stats rs ON rs.school_id = s.school_id
+LEFT JOIN topic_shares ts ON ts.school_id = s.school_id;
+
+-- Уникальный индекс нужен для REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX idx_school_summary_id ON
+sa.school_summary(school_id);
+
+CREATE INDEX idx_school_summary_location ON
+sa.school_summary
+    USING GIST(location);
+
+-- Поиск: триграммы (ILIKE '%...%', нечёткое совпадение) и полнотекстовый индекс
+CREATE INDEX idx_school_summary_search_name ON
+sa.school_summary
+    USING GIN(search_name gin_trgm_ops);
+
+CREATE INDEX idx_school_summary_address ON
+sa.school_summary
+    USING GIN(school_address gin_trgm_ops);
+
+CREATE INDEX idx_school_summary_search_tsv ON
+sa.school_summary
+    USING GIN(search_tsv);
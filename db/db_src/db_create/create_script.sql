@@ -3,6 +3,31 @@ CREATE SCHEMA IF NOT EXISTS sa;
 
 CREATE EXTENSION IF NOT EXISTS postgis;
 
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- Нормализация названия школы для поиска (та же логика, что normalize_school_query в api/api_search.py
+-- и norm() в parsing_data_main.py): нижний регистр, ё → е, только буквы и цифры,
+-- «средняя общеобразовательная школа» → «сош», без типа учреждения (МОУ, МАОУ, ...).
+CREATE OR REPLACE FUNCTION sa.normalize_school_name(value TEXT)
+RETURNS TEXT
+LANGUAGE SQL
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+    SELECT btrim(regexp_replace(
+        regexp_replace(
+            regexp_replace(
+                ' ' || regexp_replace(translate(lower(COALESCE(value, '')), 'ё', 'е'), '[^а-я0-9a-z]+', ' ', 'g') || ' ',
+                ' средн\S*\s+общеобразовательн\S*\s+школ\S*(?= )', ' сош', 'g'
+            ),
+            ' (моу|маоу|гоу|гбоу|фгоу|фгбоу|чоу|аноо|мкоу|мбоу|гапоу|гаоу|мау)(?= )', ' ', 'g'
+        ),
+        '\s+', ' ', 'g'
+    ))
+$$;
+
 -- Таблица школ
 CREATE TABLE sa.school (
     school_id INTEGER PRIMARY KEY,
@@ -25,6 +50,16 @@ CREATE TABLE sa.school (
     has_stadium BOOLEAN,
     has_sports_ground BOOLEAN,
     LOCATION GEOGRAPHY(Point, 4326) NOT NULL,
+    -- Поля поиска: нормализованное название и tsvector (название — вес A, адрес — вес B)
+    search_name TEXT GENERATED ALWAYS AS (
+        sa.normalize_school_name(COALESCE(name_2gis, '') || ' ' || COALESCE(name_ym, ''))
+    ) STORED,
+    search_tsv TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', sa.normalize_school_name(COALESCE(name_2gis, '') || ' ' || COALESCE(name_ym, ''))), 'A')
+        || setweight(to_tsvector('russian', COALESCE(school_address, '')), 'B')
+    ) STORED,
+    -- md5 содержимого строки: загрузчик переписывает школу, только если он изменился
+    content_hash TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -73,13 +108,228 @@ CREATE TABLE sa.review (
         review_text IS NOT NULL
         OR review_date IS NOT NULL
     ),
+    -- md5 содержимого строки: загрузчик переписывает отзыв, только если он изменился
+    content_hash TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE INDEX idx_school_location ON
+sa.school
+    USING GIST(location);
+
 CREATE INDEX idx_review_school ON
 sa.review(school_id);
 
+CREATE INDEX idx_review_school_date ON
+sa.review(school_id, review_date DESC NULLS LAST, review_id);
+
 CREATE INDEX idx_review_topics ON
 sa.review
-    USING GIN(topics);
\ No newline at end of file
+    USING GIN(topics);
+
+-- Закреплённые за школами территории: геокодированные дома и полигоны улиц
+CREATE TABLE sa.catchment_house (
+    house_id SERIAL PRIMARY KEY,
+    school_id INTEGER NOT NULL REFERENCES sa.school(school_id),
+    address TEXT NOT NULL,
+    LOCATION GEOGRAPHY(Point, 4326) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (school_id, address)
+);
+
+CREATE TABLE sa.catchment_area (
+    area_id SERIAL PRIMARY KEY,
+    school_id INTEGER NOT NULL REFERENCES sa.school(school_id),
+    street TEXT NOT NULL,
+    area GEOGRAPHY(Polygon, 4326) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (school_id, street)
+);
+
+CREATE INDEX idx_catchment_house_location ON
+sa.catchment_house
+    USING GIST(location);
+
+CREATE INDEX idx_catchment_area_area ON
+sa.catchment_area
+    USING GIST(area);
+
+-- Нормализация названия улицы для поиска закрепления: нижний регистр, ё → е,
+-- сокращения типа улицы → полные слова (пл → площадь, пер → переулок, ...),
+-- без «ул»/«им.»/инициалов/города, слова по алфавиту:
+-- «им. Чернышевского Н.Г.» и «ул. Чернышевского» → «чернышевского».
+CREATE OR REPLACE FUNCTION sa.normalize_street(value TEXT)
+RETURNS TEXT
+LANGUAGE SQL
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+    SELECT array_to_string(ARRAY(
+        SELECT CASE token
+            WHEN 'пл' THEN 'площадь'
+            WHEN 'пер' THEN 'переулок'
+            WHEN 'туп' THEN 'тупик'
+            WHEN 'наб' THEN 'набережная'
+            WHEN 'пр' THEN 'проспект'
+            WHEN 'просп' THEN 'проспект'
+            WHEN 'прт' THEN 'проспект'
+            WHEN 'прд' THEN 'проезд'
+            WHEN 'бр' THEN 'бульвар'
+            WHEN 'мкр' THEN 'микрорайон'
+            ELSE token
+        END AS word
+        FROM unnest(string_to_array(
+            regexp_replace(
+                -- пр-т, пр-д, б-р склеиваем до замены дефисов на пробелы
+                regexp_replace(translate(lower(COALESCE(value, '')), 'ё', 'е'), '(^|[^а-я])(пр|б)-(т|д|р)(?![а-я])', '\1\2\3', 'g'),
+                '[^а-я0-9a-z]+', ' ', 'g'
+            ),
+            ' '
+        )) AS token
+        WHERE token <> ''
+          -- однобуквенные слова — инициалы и окончания «1-й», «2-я»; цифры оставляем
+          AND (length(token) > 1 OR token ~ '^[0-9]$')
+          AND token NOT IN ('ул', 'улица', 'им', 'имени', 'город', 'саратов', 'дом')
+        ORDER BY word
+    ), ' ')
+$$;
+
+-- Нормализация номера дома: нижний регистр, без пробелов и «д.», «\» → «/»:
+-- «д. 13 А» → «13а», «9\1» → «9/1». Номер без литеры и дроби → NULL (подходит любой корпус).
+CREATE OR REPLACE FUNCTION sa.normalize_house(value TEXT)
+RETURNS TEXT
+LANGUAGE SQL
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+    SELECT NULLIF(house, '') FROM (
+        SELECT CASE WHEN house ~ '^[0-9]+$' THEN NULL ELSE house END AS house
+        FROM (
+            SELECT regexp_replace(
+                regexp_replace(translate(lower(COALESCE(value, '')), 'ё\', 'е/'), '[^0-9а-яa-z/]', '', 'g'),
+                '^[^0-9]+', ''
+            ) AS house
+        ) AS cleaned
+    ) AS result
+$$;
+
+-- Закрепление домов за школами (распоряжения комитета по образованию):
+-- одна строка — школа, улица и диапазон номеров домов (или отдельный дом).
+-- Заполняется db_src/db_insert/db_insert_data_catchment_rule.py из
+-- adreses_nears_school/ans_data/ans_stage1_adres_near_school.csv.
+CREATE TABLE sa.catchment_rule (
+    rule_id SERIAL PRIMARY KEY,
+    district TEXT,
+    school_name TEXT NOT NULL,
+    -- NULL, если школа из распоряжения не сопоставлена с sa.school
+    school_id INTEGER REFERENCES sa.school(school_id),
+    street TEXT NOT NULL,
+    street_norm TEXT NOT NULL,
+    -- Номера домов: [118,146]; «все дома» — [0,); «с 112» — [112,)
+    houses INT4RANGE NOT NULL,
+    -- 0 — только чётные, 1 — только нечётные, NULL — все
+    parity SMALLINT CHECK (parity IN (0, 1)),
+    -- Для отдельного дома с литерой/дробью/корпусом: «9/1», «13а», «8к1»
+    house_exact TEXT,
+    -- Исходная строка «Номера домов»
+    houses_raw TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Поиск по улице и номеру дома одним обходом индекса: street_norm = ... AND houses @> номер
+CREATE INDEX idx_catchment_rule_street_houses ON
+sa.catchment_rule
+    USING GIST(street_norm, houses);
+
+-- Сводка по школам для API (карта и карточка школы), обновляется загрузчиками
+CREATE MATERIALIZED VIEW sa.school_summary AS
+WITH review_stats AS (
+    SELECT
+        school_id,
+        COUNT(*) AS review_count,
+        MAX(review_date) AS last_review_date
+    FROM sa.review
+    GROUP BY school_id
+),
+topic_stats AS (
+    -- Доля отрицательных упоминаний каждой темы среди всех её упоминаний
+    SELECT
+        r.school_id,
+        t.topic,
+        ROUND(COUNT(*) FILTER (WHERE t.tone = 'neg')::NUMERIC / COUNT(*), 3) AS neg_share
+    FROM sa.review r
+    CROSS JOIN LATERAL jsonb_each_text(r.topics) AS t(topic, tone)
+    WHERE jsonb_typeof(r.topics) = 'object'
+    GROUP BY r.school_id, t.topic
+),
+topic_shares AS (
+    SELECT
+        school_id,
+        jsonb_object_agg(topic, neg_share) AS topic_neg_share
+    FROM topic_stats
+    GROUP BY school_id
+)
+SELECT
+    s.school_id,
+    s.name_2gis,
+    s.name_ym,
+    s.school_address,
+    s.building_type,
+    s.floors,
+    s.year_built,
+    s.reconstruction_year,
+    s.has_sports_complex,
+    s.has_pool,
+    s.has_stadium,
+    s.has_sports_ground,
+    s.search_name,
+    s.search_tsv,
+    s.location,
+    ST_X(s.location::geometry) AS lon,
+    ST_Y(s.location::geometry) AS lat,
+    r.rating_yandex,
+    r.rating_2gis,
+    l.link_2gis,
+    l.link_yandex,
+    COALESCE(rs.review_count, 0) AS review_count,
+    rs.last_review_date,
+    -- {"учителя": 0.25, "еда": 0.6}
+    COALESCE(ts.topic_neg_share, '{}'::jsonb) AS topic_neg_share
+FROM sa.school s
+LEFT JOIN sa.rating r ON r.school_id = s.school_id
+LEFT JOIN sa.link l ON l.school_id = s.school_id
+LEFT JOIN review_stats rs ON rs.school_id = s.school_id
+LEFT JOIN topic_shares ts ON ts.school_id = s.school_id;
+
+-- Уникальный индекс нужен для REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX idx_school_summary_id ON
+sa.school_summary(school_id);
+
+CREATE INDEX idx_school_summary_location ON
+sa.school_summary
+    USING GIST(location);
+
+-- Поиск: триграммы (ILIKE '%...%', нечёткое совпадение) и полнотекстовый индекс
+CREATE INDEX idx_school_summary_search_name ON
+sa.school_summary
+    USING GIN(search_name gin_trgm_ops);
+
+CREATE INDEX idx_school_summary_address ON
+sa.school_summary
+    USING GIN(school_address gin_trgm_ops);
+
+CREATE INDEX idx_school_summary_search_tsv ON
+sa.school_summary
+    USING GIN(search_tsv);
+
+-- Версия данных (увеличивается загрузчиками, по ней API сбрасывает кэш)
+CREATE TABLE sa.data_version (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO sa.data_version (id, version) VALUES (1, 1);
\ No newline at end of file
@@ -5,10 +5,14 @@
 Подключение берётся из переменных окружения (.env).
 """
 
+import json
 import os
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import psycopg2
 from dotenv import load_dotenv
+from psycopg2.extras import Json, execute_values
 
 # Загружаем переменные окружения из .env рядом с корнем проекта
 load_dotenv()
@@ -33,5 +37,260 @@ def get_connection():
     return psycopg2.connect(**DB_CONFIG)
 
 
-__all__ = ["get_connection", "DB_CONFIG"]
+def bump_data_version(cur) -> None:
+    """
+    Увеличивает версию данных в sa.data_version.
+
+    Вызывается загрузчиками в той же транзакции, что и запись данных:
+    API сравнивает версию и сбрасывает кэш ответов после каждой загрузки.
+    """
+    cur.execute(
+        """
+        UPDATE sa.data_version
+        SET version = version + 1,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = 1;
+        """
+    )
+
+
+def refresh_school_summary(cur) -> None:
+    """
+    Пересчитывает материализованное представление sa.school_summary.
+
+    Вызывается загрузчиками school/rating/link/review после записи данных,
+    в той же транзакции. CONCURRENTLY (по уникальному индексу idx_school_summary_id)
+    не блокирует чтение: API продолжает отдавать старую сводку до коммита.
+    """
+    cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY sa.school_summary;")
+
+
+def copy_text(value: Any) -> str:
+    """
+    Значение → поле текстового формата COPY: NULL — \\N, спецсимволы экранируются.
+    psycopg2 Json (колонки JSONB) превращается в JSON-текст.
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, Json):
+        value = json.dumps(value.adapted, ensure_ascii=False)
+    elif isinstance(value, bool):
+        value = "t" if value else "f"
+    else:
+        value = str(value)
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class CopyRowsReader:
+    """
+    Файл для cursor.copy_expert("COPY ... FROM STDIN"): строки COPY формируются
+    из кортежей по мере того, как PostgreSQL их читает, — весь поток в памяти не собирается.
+    """
+
+    def __init__(self, rows: Iterable[Tuple]):
+        self._rows = iter(rows)
+        self._buffer = ""
+        self.count = 0
+
+    def read(self, size: int = -1) -> str:
+        parts = [self._buffer]
+        buffered = len(self._buffer)
+        while size < 0 or buffered < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            line = "\t".join(copy_text(value) for value in row) + "\n"
+            parts.append(line)
+            buffered += len(line)
+            self.count += 1
+        data = "".join(parts)
+        if size < 0 or len(data) <= size:
+            self._buffer = ""
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+    def readline(self, size: int = -1) -> str:
+        return self.read(size)
+
+
+def copy_rows(cur, table: str, columns: List[str], rows: Iterable[Tuple]) -> int:
+    """Загрузить кортежи rows в table (колонки columns) одним COPY FROM STDIN. Возвращает число строк."""
+    reader = CopyRowsReader(rows)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", reader)
+    return reader.count
+
+
+def iter_json_array(path: str, chunk_size: int = 64 * 1024) -> Iterator[Any]:
+    """
+    Элементы JSON-массива верхнего уровня из файла по одному, без json.load всего файла.
+
+    Файл читается кусками по chunk_size символов, элементы разбираются
+    json.JSONDecoder.raw_decode: в памяти — непрочитанный остаток куска и один элемент.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer, pos, eof = "", 0, False
+        # "[" — начало массива, "first" — первый элемент или "]", "," — разделитель или "]"
+        expect = "["
+        while True:
+            while True:
+                while pos < len(buffer) and buffer[pos].isspace():
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    break
+                buffer, pos = f.read(chunk_size), 0
+                eof = not buffer
+            if pos >= len(buffer):
+                raise ValueError(f"{path}: неожиданный конец JSON-массива")
+
+            char = buffer[pos]
+            if expect == "[":
+                if char != "[":
+                    raise ValueError(f"{path}: ожидается JSON-массив")
+                pos += 1
+                expect = "first"
+                continue
+            if expect in ("first", ",") and char == "]":
+                return
+            if expect == ",":
+                if char != ",":
+                    raise ValueError(f"{path}: ожидается ',' или ']' (символ {char!r})")
+                pos += 1
+                expect = "item"
+                continue
+
+            # Элемент может быть разрезан границей куска: дочитываем и разбираем заново.
+            # Число, за которым в куске ещё ничего нет или идёт цифра/точка/экспонента,
+            # тоже может продолжаться в следующем куске
+            while True:
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    number = isinstance(item, (int, float)) and not isinstance(item, bool)
+                    if eof or (end < len(buffer) and not (number and buffer[end] in "0123456789.eE+-")):
+                        break
+                except ValueError:
+                    if eof:
+                        raise
+                more = f.read(chunk_size)
+                buffer, pos = buffer[pos:] + more, 0
+                eof = not more
+            yield item
+            pos = end
+            expect = ","
+
+
+def iter_batches(rows: Iterable[Tuple], size: int) -> Iterator[List[Tuple]]:
+    """Порции по size строк из итератора: в памяти не больше одной порции."""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_batches(
+    cur,
+    rows: Iterable[Any],
+    write_batch: Callable[[Any, List[Tuple]], None],
+    batch_size: int = 1000,
+    table: str = "",
+    prepare: Optional[Callable[[Any], Optional[Tuple]]] = None,
+) -> Tuple[int, int]:
+    """
+    Пишем строки порциями по batch_size в текущей транзакции: write_batch(cur, batch).
+
+    С prepare rows — исходные записи (например, объекты JSON), строка получается
+    prepare(record); None — запись не нужна. Запись, на которой prepare упал
+    (нет обязательного поля, неверный тип), пропускается с [WARN].
+
+    Каждая порция — под SAVEPOINT. Если порция не записалась (тип, NOT NULL, CHECK, FK),
+    откатываемся к точке сохранения и пишем её строки по одной, тоже под SAVEPOINT:
+    ошибочные строки пропускаются с [WARN], остальные строки и порции сохраняются.
+    Возвращает (записано строк, пропущено записей и строк).
+    """
+    written = skipped = 0
+
+    def prepared() -> Iterator[Tuple]:
+        nonlocal skipped
+        for record in rows:
+            if prepare is None:
+                yield record
+                continue
+            try:
+                row = prepare(record)
+            except (AttributeError, KeyError, TypeError, ValueError) as e:
+                skipped += 1
+                print(f"[WARN] {table}: запись пропущена: {type(e).__name__}: {e}")
+                continue
+            if row is not None:
+                yield row
+
+    for batch in iter_batches(prepared(), batch_size):
+        cur.execute("SAVEPOINT load_batch;")
+        try:
+            write_batch(cur, batch)
+            written += len(batch)
+        except psycopg2.Error:
+            cur.execute("ROLLBACK TO SAVEPOINT load_batch;")
+            for row in batch:
+                cur.execute("SAVEPOINT load_row;")
+                try:
+                    write_batch(cur, [row])
+                    written += 1
+                except psycopg2.Error as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT load_row;")
+                    skipped += 1
+                    print(f"[WARN] {table}: строка {row[0]} пропущена: {str(e).strip()}")
+                cur.execute("RELEASE SAVEPOINT load_row;")
+        cur.execute("RELEASE SAVEPOINT load_batch;")
+    return written, skipped
+
+
+def upsert_changed(cur, sql: str, batch: List[Tuple], counts: Dict[str, int], page_size: int = 500) -> None:
+    """
+    UPSERT порции через execute_values: sql — INSERT ... VALUES %s ON CONFLICT DO UPDATE ...
+    WHERE (...) IS DISTINCT FROM (...) RETURNING (xmax = 0). Строки, которые не изменились,
+    не обновляются и не возвращаются; в counts прибавляются вставленные и обновлённые.
+    Счётчики меняются только после того, как порция записалась целиком.
+    """
+    result = execute_values(cur, sql, batch, page_size=page_size, fetch=True)
+    inserted = sum(1 for (is_new,) in result if is_new)
+    counts["inserted"] += inserted
+    counts["updated"] += len(result) - inserted
+
+
+def report_changes(table: str, counts: Dict[str, int], missing: int, delete_missing: bool) -> None:
+    """
+    Итог инкрементальной загрузки: сколько строк вставлено, обновлено, не изменилось
+    и удалено. Строки, которых нет в источнике, удаляются только с --delete-missing.
+    """
+    print(
+        f"[OK] {table}: вставлено {counts['inserted']}, обновлено {counts['updated']}, "
+        f"без изменений {counts['unchanged']}, удалено {counts['deleted']}"
+    )
+    if missing and not delete_missing:
+        print(f"[INFO] {table}: строк нет в источнике: {missing} (оставлены; удалить — флаг --delete-missing)")
+
+
+__all__ = [
+    "get_connection",
+    "bump_data_version",
+    "refresh_school_summary",
+    "copy_text",
+    "CopyRowsReader",
+    "copy_rows",
+    "iter_json_array",
+    "iter_batches",
+    "write_batches",
+    "upsert_changed",
+    "report_changes",
+    "DB_CONFIG",
+]
 
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Полная загрузка схемы `sa` одной командой: школы, рейтинги, ссылки и отзывы.
+
+`school_data/sd_2_stage/sd_2_stage_schools.json` разбирается один раз: каждая запись
+раздаётся сразу трём загрузчикам (db_insert_data_school / rating / link), которые пишут
+в порядке внешних ключей — sa.school, затем sa.rating и sa.link — в одной транзакции
+с одним обновлением версии данных и сводки. Затем отзывы загружаются так же,
+как db_insert_data_review.py (с --parallel — пулом процессов). В конце — время по этапам:
+
+    python db/db_src/db_insert/db_insert_data_all.py [--delete-missing] [--parallel]
+
+--delete-missing удаляет школы и отзывы, которых больше нет в источниках.
+"""
+
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from db_config_sa import bump_data_version, get_connection, refresh_school_summary, report_changes
+from db_insert_data_link import prepare_link_row, write_links
+from db_insert_data_rating import prepare_rating_row, write_ratings
+from db_insert_data_review import (
+    REVIEWS_DIR,
+    insert_reviews_copy,
+    insert_reviews_parallel,
+    iter_review_files,
+    iter_reviews,
+)
+from db_insert_data_school import (
+    SCHOOLS_JSON_PATH,
+    delete_missing_schools,
+    load_schools,
+    merge_schools,
+    prepare_school_row,
+    report_foreign_key_error,
+    stage_schools,
+)
+
+
+def fan_out(ratings: List[Tuple], links: List[Tuple]) -> Callable[[Dict[str, Any]], Tuple]:
+    """
+    prepare для stage_schools: один проход по школам. Строка sa.school уходит в COPY,
+    строки sa.rating и sa.link откладываются до слияния школ — им нужны school_id в sa.school.
+    Отложенных строк не больше, чем школ (по одной короткой строке на школу).
+    Если школа пропущена (ошибка в данных), её рейтинг и ссылки не откладываются.
+    """
+    def prepare(s: Dict[str, Any]) -> Tuple:
+        row = prepare_school_row(s)
+        rating = prepare_rating_row(s)
+        link = prepare_link_row(s)
+        if rating is not None:
+            ratings.append(rating)
+        if link is not None:
+            links.append(link)
+        return row
+
+    return prepare
+
+
+def load_school_tables(timings: List[Tuple[str, float]], delete_missing: bool = False) -> bool:
+    """
+    sa.school → sa.rating → sa.link из одного разбора JSON в одной транзакции.
+    С delete_missing школы, которых нет в JSON, удаляются последними — после записи рейтингов
+    и ссылок, вместе со ссылающимися на них строками (delete_missing_schools).
+    Возвращает False, если в JSON нет школ.
+    """
+    ratings: List[Tuple] = []
+    links: List[Tuple] = []
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            started = time.perf_counter()
+            copied, skipped = stage_schools(
+                cur, load_schools(SCHOOLS_JSON_PATH), prepare=fan_out(ratings, links)
+            )
+            timings.append(("разбор JSON и COPY школ", time.perf_counter() - started))
+            if not copied:
+                print("[WARN] В JSON со школами нет данных")
+                return False
+
+            started = time.perf_counter()
+            counts, missing = merge_schools(cur)
+            timings.append(("sa.school", time.perf_counter() - started))
+
+            started = time.perf_counter()
+            rating_counts, rating_skipped = write_ratings(cur, ratings, prepare=None)
+            timings.append(("sa.rating", time.perf_counter() - started))
+
+            started = time.perf_counter()
+            link_counts, link_skipped = write_links(cur, links, prepare=None)
+            timings.append(("sa.link", time.perf_counter() - started))
+
+            if delete_missing and missing and skipped:
+                # Пропущенные строки тоже попали бы в «отсутствующие» — не удаляем ничего
+                print("[WARN] --delete-missing не выполнен: часть строк пропущена из-за ошибок")
+            elif delete_missing and missing:
+                started = time.perf_counter()
+                counts["deleted"] = delete_missing_schools(cur)
+                timings.append(("удаление школ", time.perf_counter() - started))
+
+            started = time.perf_counter()
+            # Версия данных и сводка — только если что-то действительно изменилось:
+            # иначе кэш ответов и ETag API остаются действительными
+            changed = (
+                counts["inserted"] or counts["updated"] or counts["deleted"]
+                or rating_counts["inserted"] or rating_counts["updated"]
+                or link_counts["inserted"] or link_counts["updated"]
+            )
+            if changed:
+                bump_data_version(cur)
+                refresh_school_summary(cur)
+            conn.commit()
+            timings.append(("сводка и коммит", time.perf_counter() - started))
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        report_foreign_key_error(e)
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+    report_changes("sa.school", counts, missing, delete_missing)
+    report_changes("sa.rating", rating_counts, 0, False)
+    report_changes("sa.link", link_counts, 0, False)
+    skipped_total = skipped + rating_skipped + link_skipped
+    if skipped_total:
+        print(f"[WARN] Пропущено строк с ошибками: {skipped_total}")
+    return True
+
+
+def print_timings(timings: List[Tuple[str, float]]) -> None:
+    """Время по этапам и общее."""
+    print("[INFO] Время по этапам:")
+    for name, seconds in timings:
+        print(f"  {name:<26} {seconds:8.2f} с")
+    print(f"  {'всего':<26} {sum(seconds for _, seconds in timings):8.2f} с")
+
+
+def main() -> None:
+    """
+    Точка входа:
+    1. Один разбор JSON со школами → sa.school, sa.rating, sa.link в одной транзакции.
+    2. Отзывы: COPY и слияние в одной транзакции или, с --parallel, по файлу на транзакцию.
+    3. Время по этапам.
+    """
+    delete_missing = "--delete-missing" in sys.argv
+    timings: List[Tuple[str, float]] = []
+
+    if not load_school_tables(timings, delete_missing):
+        return
+
+    started = time.perf_counter()
+    ok = True
+    if "--parallel" in sys.argv:
+        ok = insert_reviews_parallel(sorted(iter_review_files(REVIEWS_DIR)), delete_missing=delete_missing)
+    else:
+        insert_reviews_copy(iter_reviews(REVIEWS_DIR), delete_missing=delete_missing)
+    timings.append(("sa.review", time.perf_counter() - started))
+
+    print_timings(timings)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Скрипт для заполнения таблиц sa.catchment_house и sa.catchment_area
+(закреплённые за школой дома и полигоны улиц) на основе результатов
+геокодирования из `geocoding/geocode_test`:
+    geocoded_addresses.json — дома: lat, lon, address
+    street_polygons.json    — улицы: street, polygon [[lon, lat], ...]
+
+Эти данные отдаются слоями векторных тайлов API (/tiles/{z}/{x}/{y}.mvt).
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_batch
+
+from db_config_sa import bump_data_version, get_connection
+
+# Пути к файлам
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_ROOT = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+PROJECT_ROOT = os.path.dirname(DB_ROOT)
+GEOCODE_TEST_DIR = os.path.join(PROJECT_ROOT, "geocoding", "geocode_test")
+
+# Какие файлы геокодирования к какой школе (sa.school.school_id) относятся
+CATCHMENT_SOURCES: List[Dict[str, Any]] = [
+    {
+        # МОУ Средняя общеобразовательная школа №6
+        "school_id": 3,
+        "addresses": os.path.join(GEOCODE_TEST_DIR, "geocoded_addresses.json"),
+        "polygons": os.path.join(GEOCODE_TEST_DIR, "street_polygons.json"),
+    },
+]
+
+
+def load_json(path: str) -> List[Dict[str, Any]]:
+    """Загружаем список объектов из JSON."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def prepare_house_row(school_id: int, item: Dict[str, Any]) -> Optional[Tuple]:
+    """
+    Готовим строку для sa.catchment_house.
+
+    sa.catchment_house (
+        house_id SERIAL PRIMARY KEY,
+        school_id INTEGER NOT NULL,
+        address TEXT NOT NULL,
+        location GEOGRAPHY(Point, 4326) NOT NULL
+    )
+    """
+    lat = item.get("lat")
+    lon = item.get("lon")
+    address = item.get("address")
+    if lat is None or lon is None or not address:
+        return None
+    return (school_id, address, lon, lat)
+
+
+def prepare_area_row(school_id: int, item: Dict[str, Any]) -> Optional[Tuple]:
+    """
+    Готовим строку для sa.catchment_area: полигон передаём как WKT.
+
+    sa.catchment_area (
+        area_id SERIAL PRIMARY KEY,
+        school_id INTEGER NOT NULL,
+        street TEXT NOT NULL,
+        area GEOGRAPHY(Polygon, 4326) NOT NULL
+    )
+    """
+    street = item.get("street")
+    ring = item.get("polygon") or []
+    if not street or len(ring) < 4:
+        return None
+    # Кольцо полигона должно быть замкнуто
+    if ring[0] != ring[-1]:
+        ring = ring + [ring[0]]
+    wkt = "POLYGON((" + ", ".join(f"{lon} {lat}" for lon, lat in ring) + "))"
+    return (school_id, street, wkt)
+
+
+def insert_catchment(houses: List[Tuple], areas: List[Tuple], batch_size: int = 500) -> None:
+    """
+    Вставляем/обновляем дома и полигоны улиц в одной транзакции.
+    """
+    if not houses and not areas:
+        print("[INFO] Нет данных о закреплённых территориях для вставки")
+        return
+
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            houses_sql = """
+                INSERT INTO sa.catchment_house (school_id, address, location)
+                VALUES (%s, %s, ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography)
+                ON CONFLICT (school_id, address) DO UPDATE SET
+                    location = EXCLUDED.location,
+                    updated_at = CURRENT_TIMESTAMP;
+            """
+            areas_sql = """
+                INSERT INTO sa.catchment_area (school_id, street, area)
+                VALUES (%s, %s, ST_GeogFromText('SRID=4326;' || %s))
+                ON CONFLICT (school_id, street) DO UPDATE SET
+                    area = EXCLUDED.area,
+                    updated_at = CURRENT_TIMESTAMP;
+            """
+            execute_batch(cur, houses_sql, houses, page_size=batch_size)
+            execute_batch(cur, areas_sql, areas, page_size=batch_size)
+            bump_data_version(cur)
+        conn.commit()
+        print(f"[OK] Вставлено/обновлено домов: {len(houses)}, полигонов улиц: {len(areas)}")
+    except Exception:
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+
+def main() -> None:
+    """
+    Точка входа:
+    1. Для каждой школы из CATCHMENT_SOURCES читаем дома и полигоны улиц.
+    2. Готовим строки для sa.catchment_house / sa.catchment_area.
+    3. Вставляем батчами с UPSERT.
+    """
+    houses: List[Tuple] = []
+    areas: List[Tuple] = []
+    for source in CATCHMENT_SOURCES:
+        school_id = source["school_id"]
+        for item in load_json(source["addresses"]):
+            row = prepare_house_row(school_id, item)
+            if row is not None:
+                houses.append(row)
+        for item in load_json(source["polygons"]):
+            row = prepare_area_row(school_id, item)
+            if row is not None:
+                areas.append(row)
+
+    insert_catchment(houses, areas)
+
+
+if __name__ == "__main__":
+    main()
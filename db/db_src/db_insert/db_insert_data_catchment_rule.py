@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Скрипт заполнения sa.catchment_rule — закрепления домов за школами по распоряжениям
+комитета по образованию — из результатов пайплайна `adreses_nears_school`:
+    ans_data/ans_stage1_adres_near_school.csv — Район; Краткое наименование ОУ;
+                                                Название улицы; Номера домов
+
+Ячейка «Номера домов» разбирается на отдельные правила:
+    «118-146», «с 24 по 54»     → диапазон [118,146] (концы одной чётности — только эта сторона)
+    «с 112 (четные)»            → [112,) только чётные
+    «151», «9/1», «8к1», «3\\2»  → отдельный дом (литера/дробь/корпус сверяются точно)
+    «все дома», «частный сектор» → все дома улицы, если других номеров в ячейке нет
+    «частный сектор 18»          → дом 18 (пометка отбрасывается)
+Нераспознанные фрагменты пропускаются и выводятся в отчёт.
+
+Название школы сопоставляется с sa.school по нормализованному названию
+(sa.normalize_school_name), а если точного совпадения нет — по типу и номеру
+(«гимназия 2», «сош 6»), когда такая школа одна. Несопоставленные правила
+сохраняются с school_id = NULL и тоже выводятся в отчёт.
+
+Таблица перезаписывается целиком в одной транзакции. Используется /api/catchment/lookup.
+"""
+
+import csv
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_batch
+
+from db_config_sa import bump_data_version, get_connection
+
+# Пути к файлам
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_ROOT = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+PROJECT_ROOT = os.path.dirname(DB_ROOT)
+
+RULES_CSV_PATH = os.path.join(
+    PROJECT_ROOT,
+    "adreses_nears_school",
+    "ans_data",
+    "ans_stage1_adres_near_school.csv",
+)
+
+# (нижняя граница, верхняя граница или None, чётность или None, номер дома для точного сравнения)
+HouseRule = Tuple[int, Optional[int], Optional[int], Optional[str]]
+
+RE_HOUSE = re.compile(r"^\d+\s*[а-яa-z]?(?:\s*[/к]\s*\d+\s*[а-я]?)?$")
+RE_RANGE = re.compile(r"^(?:с\s*)?(\d+)\S*\s*(?:-|–|—|по)\s*(\d+)\S*$")
+RE_OPEN_RANGE = re.compile(r"^(?:с|от)\s*(\d+)\S*(?:\s*(?:и\s*)?(?:до\s*конца|далее))?$")
+RE_PARENS = re.compile(r"\([^)]*\)?")
+RE_SCHOOL_KEY = re.compile(r"(прогимназия|гимназия|лицей|сош|оош|нош|кадетская школа интернат|школа)\s+(\d+)")
+
+ALL_HOUSES_MARKERS = ("все дома", "частный сектор", "коттеджная застройка", "вся улица", "все номера")
+# Пометки чётности без скобок: «все дома четная сторона»
+RE_PARITY_NOTE = re.compile(r"\S*ч[её]т\S*|\bсторон\S*")
+
+
+def parity_of(text: str) -> Optional[int]:
+    """Чётность из пометок «(четные)», «нечетная сторона»: 0 — чётные, 1 — нечётные."""
+    if "нечет" in text or "нечёт" in text:
+        return 1
+    if "чет" in text or "чёт" in text:
+        return 0
+    return None
+
+
+def parse_houses(cell: str) -> Tuple[List[HouseRule], List[str]]:
+    """
+    Разбираем ячейку «Номера домов» на правила.
+    Возвращаем (правила, нераспознанные фрагменты).
+    """
+    text = (cell or "").lower().replace("ё", "е").replace("\\", "/").replace("№", "")
+    if not text.strip():
+        return [], []
+
+    rules: List[HouseRule] = []
+    skipped: List[str] = []
+    # Фрагменты с «все дома» / «частный сектор» без номеров домов:
+    # (фрагмент, чётность, во фрагменте только пометка и чётность)
+    whole_street: List[Tuple[str, Optional[int], bool]] = []
+    for part in re.split(r"[,;]", text):
+        part = part.strip()
+        if not part:
+            continue
+        parity = parity_of(part)
+        item = RE_PARENS.sub(" ", part)
+        # Пометка относится к фрагменту, а не ко всей ячейке: «частный сектор 18» — дом 18
+        marked = any(marker in item for marker in ALL_HOUSES_MARKERS)
+        if marked:
+            for marker in ALL_HOUSES_MARKERS:
+                item = item.replace(marker, " ")
+            item = RE_PARITY_NOTE.sub(" ", item)
+            if not item.strip(" ."):
+                whole_street.append((part, parity, True))
+                continue
+        item = re.sub(r"\b(?:дом|д)\.?\s*(?=\d)", "", item)
+        item = re.sub(r"\s*корп(?:ус)?\.?\s*", "к", item).replace("«", "").replace("»", "")
+        item = re.sub(r"\s+", " ", item).strip(" .")
+        if not item:
+            # «(четные)» без номеров — вся сторона улицы
+            if parity is not None:
+                rules.append((0, None, parity, None))
+            else:
+                skipped.append(part)
+            continue
+
+        match = RE_RANGE.match(item)
+        if match:
+            low, high = int(match.group(1)), int(match.group(2))
+            if low > high:
+                low, high = high, low
+            # «118-146»: концы одной чётности — правило для одной стороны улицы
+            if parity is None and low != high and low % 2 == high % 2:
+                parity = low % 2
+            rules.append((low, high, parity, None))
+            continue
+
+        match = RE_OPEN_RANGE.match(item)
+        if match:
+            rules.append((int(match.group(1)), None, parity, None))
+            continue
+
+        if RE_HOUSE.match(item):
+            base = int(re.match(r"\d+", item).group())
+            rules.append((base, base, None, item))
+            continue
+
+        if marked:
+            # «снт «строитель 5» все дома» — пояснение без номеров домов
+            whole_street.append((part, parity, False))
+        else:
+            skipped.append(part)
+
+    if not rules:
+        rules = sorted({(0, None, parity, None) for _, parity, _ in whole_street}, key=str)
+        return rules, skipped
+    for part, parity, pure in whole_street:
+        if pure and parity is not None:
+            # «…, все дома четной стороны» — вся сторона улицы
+            rules.append((0, None, parity, None))
+        else:
+            # «1/1, …, 21/1, коттеджная застройка»: какие ещё дома входят — неизвестно,
+            # правило на всю улицу перехватило бы дома других школ; остаются явные номера
+            skipped.append(part)
+    return rules, skipped
+
+
+def load_rules_csv(path: str) -> List[Dict[str, str]]:
+    """Строки CSV (разделитель «;») с непустыми школой и улицей."""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f, delimiter=";")
+        next(reader, None)  # заголовок
+        rows = []
+        for record in reader:
+            if len(record) < 4:
+                continue
+            district, school, street, houses = (value.strip() for value in record[:4])
+            if school and street:
+                rows.append({"district": district, "school": school, "street": street, "houses": houses})
+        return rows
+
+
+def school_key(name: str) -> Optional[str]:
+    """Тип и номер школы из нормализованного названия: «гимназия 2», «сош 6»."""
+    match = RE_SCHOOL_KEY.search(name or "")
+    return f"{match.group(1)} {match.group(2)}" if match else None
+
+
+def match_schools(cur, names: List[str]) -> Dict[str, Optional[int]]:
+    """
+    Сопоставляем названия школ из распоряжения с sa.school.school_id.
+    Нормализация — та же sa.normalize_school_name, что у поиска школ.
+    """
+    cur.execute(
+        """
+        SELECT school_id, sa.normalize_school_name(name_2gis), sa.normalize_school_name(name_ym)
+        FROM sa.school
+        """
+    )
+    by_name: Dict[str, int] = {}
+    by_key: Dict[str, set] = {}
+    for school_id, name_2gis, name_ym in cur.fetchall():
+        for name in (name_2gis, name_ym):
+            if not name:
+                continue
+            by_name.setdefault(name, school_id)
+            key = school_key(name)
+            if key:
+                by_key.setdefault(key, set()).add(school_id)
+
+    result: Dict[str, Optional[int]] = {}
+    for name in names:
+        # «(5-11-е классы)», «(по согласованию)» к названию не относятся
+        cur.execute("SELECT sa.normalize_school_name(%s)", (RE_PARENS.sub(" ", name),))
+        normalized = cur.fetchone()[0]
+        school_id = by_name.get(normalized)
+        if school_id is None:
+            candidates = by_key.get(school_key(normalized) or "", set())
+            if len(candidates) == 1:
+                school_id = next(iter(candidates))
+        result[name] = school_id
+    return result
+
+
+def insert_rules(rows: List[Dict[str, str]], batch_size: int = 1000) -> None:
+    """
+    Перезаписываем sa.catchment_rule в одной транзакции:
+    до коммита API видит прежние правила, после — новые целиком.
+    """
+    if not rows:
+        print("[INFO] Нет правил закрепления для вставки")
+        return
+
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            schools = match_schools(cur, sorted({row["school"] for row in rows}))
+
+            values = []
+            skipped: List[Tuple[str, str]] = []
+            for row in rows:
+                rules, bad = parse_houses(row["houses"])
+                skipped.extend((row["street"], part) for part in bad)
+                school_id = schools.get(row["school"])
+                for low, high, parity, exact in rules:
+                    values.append((
+                        row["district"] or None,
+                        row["school"],
+                        school_id,
+                        row["street"],
+                        row["street"],
+                        low,
+                        high,
+                        parity,
+                        exact,
+                        row["houses"],
+                    ))
+
+            cur.execute("DELETE FROM sa.catchment_rule")
+            insert_sql = """
+                INSERT INTO sa.catchment_rule (
+                    district, school_name, school_id, street, street_norm,
+                    houses, parity, house_exact, houses_raw
+                )
+                VALUES (
+                    %s, %s, %s, %s, sa.normalize_street(%s),
+                    int4range(%s, %s, '[]'), %s, sa.normalize_house(%s), %s
+                );
+            """
+            execute_batch(cur, insert_sql, values, page_size=batch_size)
+            bump_data_version(cur)
+        conn.commit()
+
+        print(f"[OK] Вставлено правил закрепления: {len(values)} (строк CSV: {len(rows)})")
+        unmatched = Counter(row["school"] for row in rows if schools.get(row["school"]) is None)
+        if unmatched:
+            print(f"[WARN] Не сопоставлено с sa.school школ: {len(unmatched)} (правила сохранены с school_id = NULL)")
+            for name, count in unmatched.most_common():
+                print(f"    {name} — строк: {count}")
+        if skipped:
+            print(f"[WARN] Не распознано фрагментов номеров домов: {len(skipped)}")
+            for street, part in skipped[:20]:
+                print(f"    {street}: {part}")
+    except Exception:
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+
+def main() -> None:
+    """
+    Точка входа:
+    1. Читаем CSV закрепления домов.
+    2. Разбираем номера домов на диапазоны и сопоставляем школы с sa.school.
+    3. Перезаписываем sa.catchment_rule.
+    """
+    rows = load_rules_csv(RULES_CSV_PATH)
+    insert_rules(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,18 @@
 Каждая запись в sa.link соответствует одной школе (1:1 по school_id).
 """
 
-import json
 import os
-from typing import Any, Dict, List, Optional, Tuple
-
-from psycopg2.extras import execute_batch
-
-from db_config_sa import get_connection
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from db_config_sa import (
+    bump_data_version,
+    get_connection,
+    iter_json_array,
+    refresh_school_summary,
+    report_changes,
+    upsert_changed,
+    write_batches,
+)
 
 # Пути к файлам
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -26,10 +31,9 @@ SCHOOLS_JSON_PATH = os.path.join(
 )
 
 
-def load_schools(path: str) -> List[Dict[str, Any]]:
-    """Загружаем школы из JSON."""
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+def load_schools(path: str) -> Iterator[Dict[str, Any]]:
+    """Школы из JSON по одной (массив разбирается потоково)."""
+    return iter_json_array(path)
 
 
 def prepare_link_row(s: Dict[str, Any]) -> Optional[Tuple]:
@@ -61,37 +65,77 @@ def prepare_link_row(s: Dict[str, Any]) -> Optional[Tuple]:
     return (school_id, link_yandex, review_link_ym, link_2gis, review_link_2gis)
 
 
-def insert_links(data: List[Tuple], batch_size: int = 500) -> None:
+# Неизменившиеся строки не обновляются (updated_at не трогается) и не попадают в RETURNING:
+# по числу вставленных и обновлённых загрузчик решает, обновлять ли версию данных и сводку
+LINK_UPSERT_SQL = """
+    INSERT INTO sa.link (
+        school_id,
+        link_yandex,
+        review_link_ym,
+        link_2gis,
+        review_link_2gis
+    )
+    VALUES %s
+    ON CONFLICT (school_id) DO UPDATE SET
+        link_yandex = EXCLUDED.link_yandex,
+        review_link_ym = EXCLUDED.review_link_ym,
+        link_2gis = EXCLUDED.link_2gis,
+        review_link_2gis = EXCLUDED.review_link_2gis,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE (
+        sa.link.link_yandex, sa.link.review_link_ym, sa.link.link_2gis, sa.link.review_link_2gis
+    ) IS DISTINCT FROM (
+        EXCLUDED.link_yandex, EXCLUDED.review_link_ym, EXCLUDED.link_2gis, EXCLUDED.review_link_2gis
+    )
+    RETURNING (xmax = 0);
+"""
+
+
+def write_links(
+    cur,
+    schools: Iterable[Any],
+    batch_size: int = 500,
+    prepare: Optional[Callable[[Dict[str, Any]], Optional[Tuple]]] = prepare_link_row,
+) -> Tuple[Dict[str, int], int]:
     """
-    Вставляем/обновляем данные в sa.link.
+    UPSERT строк в sa.link в текущей транзакции порциями по batch_size под SAVEPOINT.
+    schools — школы из JSON (строки готовит prepare) или, с prepare=None, готовые строки.
+    Возвращает (счётчики inserted/updated/unchanged/deleted для report_changes, пропущено строк).
     """
-    if not data:
-        print("[INFO] Нет ссылок для вставки")
-        return
+    counts = {"inserted": 0, "updated": 0}
+    written, skipped = write_batches(
+        cur,
+        schools,
+        lambda c, batch: upsert_changed(c, LINK_UPSERT_SQL, batch, counts, batch_size),
+        batch_size,
+        "sa.link",
+        prepare=prepare,
+    )
+    counts["unchanged"] = written - counts["inserted"] - counts["updated"]
+    counts["deleted"] = 0
+    return counts, skipped
 
+
+def insert_links(schools: Iterable[Dict[str, Any]], batch_size: int = 500) -> None:
+    """
+    Вставляем/обновляем данные в sa.link порциями по batch_size под SAVEPOINT.
+    Если ни одна строка не изменилась, версия данных и сводка не трогаются.
+    """
     conn = None
     try:
         conn = get_connection()
         with conn.cursor() as cur:
-            sql = """
-                INSERT INTO sa.link (
-                    school_id,
-                    link_yandex,
-                    review_link_ym,
-                    link_2gis,
-                    review_link_2gis
-                )
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (school_id) DO UPDATE SET
-                    link_yandex = EXCLUDED.link_yandex,
-                    review_link_ym = EXCLUDED.review_link_ym,
-                    link_2gis = EXCLUDED.link_2gis,
-                    review_link_2gis = EXCLUDED.review_link_2gis,
-                    updated_at = CURRENT_TIMESTAMP;
-            """
-            execute_batch(cur, sql, data, page_size=batch_size)
+            counts, skipped = write_links(cur, schools, batch_size)
+            if not (counts["inserted"] or counts["updated"] or counts["unchanged"]):
+                print("[INFO] Нет ссылок для вставки")
+                return
+            if counts["inserted"] or counts["updated"]:
+                bump_data_version(cur)
+                refresh_school_summary(cur)
         conn.commit()
-        print(f"[OK] Вставлено/обновлено записей link: {len(data)}")
+        report_changes("sa.link", counts, 0, False)
+        if skipped:
+            print(f"[WARN] Пропущено строк с ошибками: {skipped}")
     except Exception:
         if conn:
             conn.rollback()
@@ -106,16 +150,9 @@ def main() -> None:
     Точка входа:
     1. Читаем JSON со школами.
     2. Готовим строки для sa.link.
-    3. Вставляем батчами.
+    3. Вставляем батчами: строки готовятся по мере чтения JSON, в памяти — одна порция.
     """
-    schools = load_schools(SCHOOLS_JSON_PATH)
-    rows: List[Tuple] = []
-    for s in schools:
-        row = prepare_link_row(s)
-        if row is not None:
-            rows.append(row)
-
-    insert_links(rows)
+    insert_links(load_schools(SCHOOLS_JSON_PATH))
 
 
 if __name__ == "__main__":
@@ -7,13 +7,18 @@
 rating — отдельная динамическая сущность, завязанная на school_id.
 """
 
-import json
 import os
-from typing import Any, Dict, List, Optional, Tuple
-
-from psycopg2.extras import execute_batch
-
-from db_config_sa import get_connection
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from db_config_sa import (
+    bump_data_version,
+    get_connection,
+    iter_json_array,
+    refresh_school_summary,
+    report_changes,
+    upsert_changed,
+    write_batches,
+)
 
 # Пути к файлам
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -28,10 +33,9 @@ SCHOOLS_JSON_PATH = os.path.join(
 )
 
 
-def load_schools(path: str) -> List[Dict[str, Any]]:
-    """Загружаем школы из JSON."""
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+def load_schools(path: str) -> Iterator[Dict[str, Any]]:
+    """Школы из JSON по одной (массив разбирается потоково)."""
+    return iter_json_array(path)
 
 
 def to_numeric_rating(value: Any) -> Optional[float]:
@@ -76,35 +80,72 @@ def prepare_rating_row(s: Dict[str, Any]) -> Optional[Tuple]:
     return (school_id, rating_2gis, rating_yandex, review_date_score)
 
 
-def insert_ratings(data: List[Tuple], batch_size: int = 500) -> None:
+# Неизменившиеся строки не обновляются (updated_at не трогается) и не попадают в RETURNING:
+# по числу вставленных и обновлённых загрузчик решает, обновлять ли версию данных и сводку
+RATING_UPSERT_SQL = """
+    INSERT INTO sa.rating (
+        school_id,
+        rating_2gis,
+        rating_yandex,
+        review_date_score
+    )
+    VALUES %s
+    ON CONFLICT (school_id) DO UPDATE SET
+        rating_2gis = EXCLUDED.rating_2gis,
+        rating_yandex = EXCLUDED.rating_yandex,
+        review_date_score = EXCLUDED.review_date_score,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE (sa.rating.rating_2gis, sa.rating.rating_yandex, sa.rating.review_date_score)
+        IS DISTINCT FROM (EXCLUDED.rating_2gis, EXCLUDED.rating_yandex, EXCLUDED.review_date_score)
+    RETURNING (xmax = 0);
+"""
+
+
+def write_ratings(
+    cur,
+    schools: Iterable[Any],
+    batch_size: int = 500,
+    prepare: Optional[Callable[[Dict[str, Any]], Optional[Tuple]]] = prepare_rating_row,
+) -> Tuple[Dict[str, int], int]:
     """
-    Вставляем/обновляем данные в sa.rating.
+    UPSERT строк в sa.rating в текущей транзакции порциями по batch_size под SAVEPOINT.
+    schools — школы из JSON (строки готовит prepare) или, с prepare=None, готовые строки.
+    Возвращает (счётчики inserted/updated/unchanged/deleted для report_changes, пропущено строк).
     """
-    if not data:
-        print("[INFO] Нет рейтингов для вставки")
-        return
+    counts = {"inserted": 0, "updated": 0}
+    written, skipped = write_batches(
+        cur,
+        schools,
+        lambda c, batch: upsert_changed(c, RATING_UPSERT_SQL, batch, counts, batch_size),
+        batch_size,
+        "sa.rating",
+        prepare=prepare,
+    )
+    counts["unchanged"] = written - counts["inserted"] - counts["updated"]
+    counts["deleted"] = 0
+    return counts, skipped
+
 
+def insert_ratings(schools: Iterable[Dict[str, Any]], batch_size: int = 500) -> None:
+    """
+    Вставляем/обновляем данные в sa.rating порциями по batch_size под SAVEPOINT.
+    Если ни одна строка не изменилась, версия данных и сводка не трогаются.
+    """
     conn = None
     try:
         conn = get_connection()
         with conn.cursor() as cur:
-            sql = """
-                INSERT INTO sa.rating (
-                    school_id,
-                    rating_2gis,
-                    rating_yandex,
-                    review_date_score
-                )
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (school_id) DO UPDATE SET
-                    rating_2gis = EXCLUDED.rating_2gis,
-                    rating_yandex = EXCLUDED.rating_yandex,
-                    review_date_score = EXCLUDED.review_date_score,
-                    updated_at = CURRENT_TIMESTAMP;
-            """
-            execute_batch(cur, sql, data, page_size=batch_size)
+            counts, skipped = write_ratings(cur, schools, batch_size)
+            if not (counts["inserted"] or counts["updated"] or counts["unchanged"]):
+                print("[INFO] Нет рейтингов для вставки")
+                return
+            if counts["inserted"] or counts["updated"]:
+                bump_data_version(cur)
+                refresh_school_summary(cur)
         conn.commit()
-        print(f"[OK] Вставлено/обновлено записей rating: {len(data)}")
+        report_changes("sa.rating", counts, 0, False)
+        if skipped:
+            print(f"[WARN] Пропущено строк с ошибками: {skipped}")
     except Exception:
         if conn:
             conn.rollback()
@@ -119,16 +160,9 @@ def main() -> None:
     Точка входа:
     1. Читаем JSON со школами.
     2. Готовим строки для sa.rating.
-    3. Вставляем батчами.
+    3. Вставляем батчами: строки готовятся по мере чтения JSON, в памяти — одна порция.
     """
-    schools = load_schools(SCHOOLS_JSON_PATH)
-    rows: List[Tuple] = []
-    for s in schools:
-        row = prepare_rating_row(s)
-        if row is not None:
-            rows.append(row)
-
-    insert_ratings(rows)
+    insert_ratings(load_schools(SCHOOLS_JSON_PATH))
 
 
 if __name__ == "__main__":
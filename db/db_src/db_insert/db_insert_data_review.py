@@ -7,15 +7,44 @@
 Учитывает новую структуру таблицы sa.review:
     review_id, school_id, review_date, review_text,
     likes_count, dislikes_count, review_rating, topics, overall.
+
+По умолчанию отзывы загружаются пакетно: COPY FROM STDIN во временную таблицу
+review_stage и одно слияние INSERT ... SELECT ... ON CONFLICT в sa.review.
+Слияние инкрементальное: пишутся только отзывы, у которых изменился хэш содержимого
+(sa.review.content_hash), в итоге — число вставленных, обновлённых, неизменных и удалённых.
+--delete-missing удаляет отзывы, которых больше нет в файлах.
+С флагом --batch — прежним построчным UPSERT через execute_batch.
+
+Файлы читаются потоково (iter_json_array), строки пишутся порциями по BATCH_SIZE
+под SAVEPOINT в одной транзакции: в памяти не больше одной порции, сколько бы файлов
+ни было, а ошибочные строки пропускаются с [WARN] без отката всей загрузки.
+
+С флагом --parallel файлы раздаются пулу из LOAD_WORKERS процессов (по умолчанию —
+число ядер): каждый процесс держит своё подключение, разбирает файл и сливает его
+отзывы в sa.review отдельной транзакцией. Ошибка в файле откатывает только этот файл.
+В конце — проверка согласованности, версия данных и сводка обновляются один раз:
+
+    python db/db_src/db_insert/db_insert_data_review.py [--delete-missing] [--batch | --parallel]
 """
 
-import json
 import os
-from typing import Any, Dict, Iterable, List, Tuple
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from psycopg2.extras import execute_batch, Json
 
-from db_config_sa import get_connection
+from db_config_sa import (
+    bump_data_version,
+    copy_rows,
+    get_connection,
+    iter_json_array,
+    refresh_school_summary,
+    report_changes,
+    write_batches,
+)
 
 # Пути к данным
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -28,6 +57,12 @@ REVIEWS_DIR = os.path.join(
     "rd_3_stage_data",
 )
 
+# Строк в одной порции (COPY или execute_batch под одним SAVEPOINT)
+BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", "1000"))
+
+# Процессов в режиме --parallel
+WORKERS = int(os.getenv("LOAD_WORKERS", str(os.cpu_count() or 1)))
+
 
 def iter_review_files(directory: str) -> Iterable[str]:
     """
@@ -41,13 +76,12 @@ def iter_review_files(directory: str) -> Iterable[str]:
         yield os.path.join(directory, name)
 
 
-def load_reviews_from_file(path: str) -> List[Dict[str, Any]]:
+def load_reviews_from_file(path: str) -> Iterator[Dict[str, Any]]:
     """
-    Загружаем список отзывов из одного файла.
-    Каждый файл содержит массив объектов.
+    Отзывы из одного файла по одному.
+    Каждый файл содержит массив объектов; он разбирается потоково, целиком не загружается.
     """
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return iter_json_array(path)
 
 
 def is_empty_review(review: Dict[str, Any]) -> bool:
@@ -137,17 +171,222 @@ def prepare_review_row(review: Dict[str, Any]) -> Tuple:
     )
 
 
-def insert_reviews(rows: List[Tuple], batch_size: int = 1000) -> None:
+REVIEW_COLUMNS = [
+    "review_id",
+    "school_id",
+    "review_date",
+    "review_text",
+    "likes_count",
+    "dislikes_count",
+    "review_rating",
+    "topics",
+    "overall",
+]
+
+# Временная таблица не пишется в WAL и удаляется при коммите; seq — порядок строк в COPY,
+# чтобы при повторе review_id, как и при построчном UPSERT, осталась последняя версия.
+# Ограничения те же, что у sa.review: ошибочная строка отсеивается уже на COPY (под SAVEPOINT),
+# а не валит слияние. Внешний ключ на sa.school временная таблица иметь не может —
+# его проверяет REVIEW_UNKNOWN_SCHOOL_SQL перед слиянием
+REVIEW_STAGE_SQL = """
+    CREATE TEMP TABLE review_stage (
+        seq BIGSERIAL,
+        review_id INTEGER NOT NULL,
+        school_id INTEGER NOT NULL,
+        review_date DATE,
+        review_text TEXT,
+        likes_count INTEGER,
+        dislikes_count INTEGER,
+        review_rating INTEGER CHECK (review_rating BETWEEN 1 AND 5),
+        topics JSONB,
+        overall TEXT,
+        CHECK (review_text IS NOT NULL OR review_date IS NOT NULL)
+    ) ON COMMIT DROP;
+"""
+
+# Отзывы школ, которых нет в sa.school, слияние не пропустит (REFERENCES sa.school)
+REVIEW_UNKNOWN_SCHOOL_SQL = """
+    DELETE FROM review_stage st
+    WHERE NOT EXISTS (SELECT 1 FROM sa.school s WHERE s.school_id = st.school_id)
+    RETURNING st.review_id, st.school_id;
+"""
+
+# Слияние с проверкой хэша: пишутся только новые отзывы и те, у которых изменилось
+# содержимое (content_hash), остальные строки sa.review не трогаются.
+# xmax = 0 у вставленной строки, у обновлённой — id транзакции.
+REVIEW_MERGE_SQL = """
+    WITH source AS (
+        SELECT DISTINCT ON (review_id)
+            review_id,
+            school_id,
+            review_date,
+            review_text,
+            likes_count,
+            dislikes_count,
+            review_rating,
+            topics,
+            overall,
+            md5(ROW(
+                school_id, review_date, review_text, likes_count, dislikes_count,
+                review_rating, topics, overall
+            )::text) AS content_hash
+        FROM review_stage
+        ORDER BY review_id, seq DESC
+    ),
+    changed AS (
+        INSERT INTO sa.review (
+            review_id,
+            school_id,
+            review_date,
+            review_text,
+            likes_count,
+            dislikes_count,
+            review_rating,
+            topics,
+            overall,
+            content_hash
+        )
+        SELECT src.*
+        FROM source src
+        LEFT JOIN sa.review r ON r.review_id = src.review_id
+        WHERE r.content_hash IS DISTINCT FROM src.content_hash
+        ON CONFLICT (review_id) DO UPDATE SET
+            school_id = EXCLUDED.school_id,
+            review_date = EXCLUDED.review_date,
+            review_text = EXCLUDED.review_text,
+            likes_count = EXCLUDED.likes_count,
+            dislikes_count = EXCLUDED.dislikes_count,
+            review_rating = EXCLUDED.review_rating,
+            topics = EXCLUDED.topics,
+            overall = EXCLUDED.overall,
+            content_hash = EXCLUDED.content_hash,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT
+        COUNT(*) FILTER (WHERE inserted),
+        COUNT(*) FILTER (WHERE NOT inserted),
+        (SELECT COUNT(*) FROM source)
+    FROM changed;
+"""
+
+# Отзывы sa.review, которых нет в загружаемых файлах
+REVIEW_MISSING_SQL = """
+    SELECT COUNT(*) FROM sa.review r
+    WHERE NOT EXISTS (SELECT 1 FROM review_stage st WHERE st.review_id = r.review_id);
+"""
+
+REVIEW_DELETE_MISSING_SQL = """
+    DELETE FROM sa.review r
+    WHERE NOT EXISTS (SELECT 1 FROM review_stage st WHERE st.review_id = r.review_id);
+"""
+
+
+def review_row(review: Dict[str, Any]) -> Optional[Tuple]:
     """
-    Батч-вставка отзывов в sa.review.
+    Строка sa.review или None для полностью пустого отзыва
+    (такие записи завалят CHECK review_not_empty, пропускаем).
     """
-    if not rows:
-        print("[INFO] Нет отзывов для вставки")
-        return
+    if is_empty_review(review):
+        return None
+    return prepare_review_row(review)
+
+
+def drop_unknown_school_reviews(cur) -> int:
+    """Убрать из review_stage отзывы несуществующих школ с [WARN]; вернуть их число."""
+    cur.execute(REVIEW_UNKNOWN_SCHOOL_SQL)
+    dropped = cur.fetchall()
+    if dropped:
+        examples = ", ".join(f"{review_id} (школа {school_id})" for review_id, school_id in dropped[:10])
+        print(f"[WARN] review_stage: отзывов школ, которых нет в sa.school, пропущено: {len(dropped)}: {examples}")
+    return len(dropped)
+
+
+def copy_review_batch(cur, batch: List[Tuple]) -> None:
+    """Одна порция строк в review_stage через COPY."""
+    copy_rows(cur, "review_stage", REVIEW_COLUMNS, batch)
+
 
+def insert_reviews_copy(
+    reviews: Iterable[Dict[str, Any]],
+    delete_missing: bool = False,
+    batch_size: int = BATCH_SIZE,
+) -> None:
+    """
+    Пакетная инкрементальная загрузка отзывов: COPY во временную таблицу review_stage
+    порциями по batch_size, затем одно слияние в sa.review, которое пишет только новые
+    и изменившиеся отзывы.
+    Всё в одной транзакции — API видит либо прежние отзывы, либо новые целиком.
+    Если ничего не изменилось, версия данных и сводка не трогаются (кэш API остаётся тёплым).
+    """
     conn = None
     try:
         conn = get_connection()
+        with conn.cursor() as cur:
+            started = time.perf_counter()
+            cur.execute(REVIEW_STAGE_SQL)
+            copied, skipped = write_batches(
+                cur, reviews, copy_review_batch, batch_size, "review_stage", prepare=review_row
+            )
+            copy_time = time.perf_counter() - started
+            if not copied:
+                print("[INFO] Нет отзывов для вставки")
+                return
+
+            merge_started = time.perf_counter()
+            skipped += drop_unknown_school_reviews(cur)
+            cur.execute(REVIEW_MERGE_SQL)
+            inserted, updated, distinct = cur.fetchone()
+            cur.execute(REVIEW_MISSING_SQL)
+            missing = cur.fetchone()[0]
+            deleted = 0
+            if delete_missing and missing and skipped:
+                # Пропущенные строки тоже попали бы в «отсутствующие» — не удаляем ничего
+                print("[WARN] --delete-missing не выполнен: часть строк пропущена из-за ошибок")
+            elif delete_missing and missing:
+                cur.execute(REVIEW_DELETE_MISSING_SQL)
+                deleted = cur.rowcount
+            merge_time = time.perf_counter() - merge_started
+            if inserted or updated or deleted:
+                bump_data_version(cur)
+                refresh_school_summary(cur)
+        conn.commit()
+        total = time.perf_counter() - started
+        report_changes(
+            "sa.review",
+            {
+                "inserted": inserted,
+                "updated": updated,
+                "unchanged": distinct - inserted - updated,
+                "deleted": deleted,
+            },
+            missing,
+            delete_missing,
+        )
+        print(
+            f"[INFO] Строк в COPY: {copied} за {total:.2f} с: COPY {copy_time:.2f} с, "
+            f"слияние {merge_time:.2f} с, {copied / max(total, 1e-9):.0f} строк/с"
+        )
+        if skipped:
+            print(f"[WARN] Пропущено строк с ошибками: {skipped}")
+    except Exception:
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+
+def insert_reviews(reviews: Iterable[Dict[str, Any]], batch_size: int = BATCH_SIZE) -> None:
+    """
+    Батч-вставка отзывов в sa.review построчным UPSERT (режим --batch),
+    порциями по batch_size под SAVEPOINT.
+    """
+    conn = None
+    try:
+        conn = get_connection()
+        started = time.perf_counter()
         with conn.cursor() as cur:
             sql = """
                 INSERT INTO sa.review (
@@ -171,11 +410,28 @@ def insert_reviews(rows: List[Tuple], batch_size: int = 1000) -> None:
                     review_rating = EXCLUDED.review_rating,
                     topics = EXCLUDED.topics,
                     overall = EXCLUDED.overall,
+                    -- хэш не считается: следующая инкрементальная загрузка перепишет строку
+                    content_hash = NULL,
                     updated_at = CURRENT_TIMESTAMP;
             """
-            execute_batch(cur, sql, rows, page_size=batch_size)
+            written, skipped = write_batches(
+                cur,
+                reviews,
+                lambda c, batch: execute_batch(c, sql, batch, page_size=batch_size),
+                batch_size,
+                "sa.review",
+                prepare=review_row,
+            )
+            if not written:
+                print("[INFO] Нет отзывов для вставки")
+                return
+            bump_data_version(cur)
+            refresh_school_summary(cur)
         conn.commit()
-        print(f"[OK] Вставлено/обновлено отзывов: {len(rows)}")
+        total = time.perf_counter() - started
+        print(f"[OK] Вставлено/обновлено отзывов: {written} за {total:.2f} с, {written / max(total, 1e-9):.0f} строк/с")
+        if skipped:
+            print(f"[WARN] Пропущено строк с ошибками: {skipped}")
     except Exception:
         if conn:
             conn.rollback()
@@ -185,29 +441,191 @@ def insert_reviews(rows: List[Tuple], batch_size: int = 1000) -> None:
             conn.close()
 
 
-def main() -> None:
+def iter_reviews(directory: str) -> Iterator[Dict[str, Any]]:
     """
-    Точка входа:
-    1. Проходим по всем *_final.json.
-    2. Собираем все отзывы в один список.
-    3. Отфильтровываем полностью пустые (нет даты и текста).
-    4. Вставляем в sa.review с UPSERT по review_id.
+    Отзывы из всех *_final.json по одному (строки готовит review_row при записи).
     """
-    all_rows: List[Tuple] = []
+    for path in iter_review_files(directory):
+        yield from load_reviews_from_file(path)
 
-    for path in iter_review_files(REVIEWS_DIR):
-        reviews = load_reviews_from_file(path)
-        if not reviews:
-            continue
 
-        for r in reviews:
-            if is_empty_review(r):
-                # Такие записи завалят CHECK (review_not_empty), пропускаем
-                continue
-            row = prepare_review_row(r)
-            all_rows.append(row)
+# Подключение процесса-исполнителя --parallel: открывается один раз и служит всем его файлам
+_worker_conn = None
+
+
+def _worker_connection():
+    """Подключение текущего процесса; после обрыва открывается заново."""
+    global _worker_conn
+    if _worker_conn is None or _worker_conn.closed:
+        _worker_conn = get_connection()
+    return _worker_conn
+
+
+def load_review_file(path: str, batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Загрузить отзывы одного файла отдельной транзакцией (исполнитель режима --parallel):
+    COPY в review_stage и то же слияние по хэшу, что и в insert_reviews_copy.
+
+    Исключения не выбрасываются: ошибка откатывает только этот файл
+    и возвращается в поле error. Версию данных и сводку обновляет родительский процесс.
+    """
+    result: Dict[str, Any] = {"path": path, "error": None}
+    conn = None
+    try:
+        conn = _worker_connection()
+        with conn.cursor() as cur:
+            cur.execute(REVIEW_STAGE_SQL)
+            copied, skipped = write_batches(
+                cur,
+                load_reviews_from_file(path),
+                copy_review_batch,
+                batch_size,
+                os.path.basename(path),
+                prepare=review_row,
+            )
+            skipped += drop_unknown_school_reviews(cur)
+            cur.execute(REVIEW_MERGE_SQL)
+            inserted, updated, distinct = cur.fetchone()
+            cur.execute("SELECT DISTINCT review_id FROM review_stage;")
+            review_ids = [row[0] for row in cur.fetchall()]
+        conn.commit()
+        result.update(
+            copied=copied,
+            skipped=skipped,
+            inserted=inserted,
+            updated=updated,
+            unchanged=distinct - inserted - updated,
+            review_ids=review_ids,
+        )
+    except Exception as e:
+        if conn and not conn.closed:
+            conn.rollback()
+        result["error"] = f"{type(e).__name__}: {str(e).strip()}"
+    return result
+
+
+def check_reviews_consistency(cur, results: List[Dict[str, Any]]) -> Tuple[List[int], bool]:
+    """
+    Проверка после параллельной загрузки:
+      - review_id, встретившиеся в нескольких файлах (какая версия победит — не определено);
+      - все отзывы успешно загруженных файлов есть в sa.review.
+    Возвращает (все загруженные review_id, True если расхождений с БД нет).
+    """
+    counts = Counter(review_id for r in results for review_id in r["review_ids"])
+    duplicates = sorted(review_id for review_id, n in counts.items() if n > 1)
+    if duplicates:
+        print(
+            f"[WARN] review_id в нескольких файлах: {len(duplicates)} "
+            f"(например, {', '.join(map(str, duplicates[:10]))}); сохранена версия одного из файлов"
+        )
+
+    review_ids = list(counts)
+    cur.execute("SELECT COUNT(*) FROM sa.review WHERE review_id = ANY(%s);", (review_ids,))
+    found = cur.fetchone()[0]
+    if found != len(review_ids):
+        print(f"[ERROR] В sa.review нет {len(review_ids) - found} из {len(review_ids)} загруженных отзывов")
+        return review_ids, False
+    print(f"[OK] Проверка: все {found} загруженных отзывов есть в sa.review")
+    return review_ids, True
+
+
+def insert_reviews_parallel(
+    paths: List[str],
+    workers: int = WORKERS,
+    delete_missing: bool = False,
+    batch_size: int = BATCH_SIZE,
+) -> bool:
+    """
+    Параллельная загрузка отзывов (режим --parallel): файлы раздаются пулу процессов,
+    каждый файл — своя транзакция (load_review_file). API видит отзывы по мере коммита файлов.
+
+    После пула: отчёт по файлам с ошибками, проверка согласованности, удаление отсутствующих
+    (--delete-missing, только если все файлы загрузились без ошибок), затем одно обновление
+    версии данных и сводки. Возвращает True, если ошибок не было.
+    """
+    if not paths:
+        print("[INFO] Нет файлов с отзывами")
+        return True
+
+    started = time.perf_counter()
+    workers = max(1, min(workers, len(paths)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(load_review_file, paths, [batch_size] * len(paths)))
+    load_time = time.perf_counter() - started
+
+    failed = [r for r in results if r["error"]]
+    loaded = [r for r in results if not r["error"]]
+    for r in failed:
+        print(f"[ERROR] {os.path.basename(r['path'])}: {r['error']}")
+
+    totals = {key: sum(r[key] for r in loaded) for key in ("copied", "skipped", "inserted", "updated", "unchanged")}
+    missing = deleted = 0
+    consistent = True
+    conn = None
+    try:
+        conn = get_connection()
+        with conn.cursor() as cur:
+            review_ids, consistent = check_reviews_consistency(cur, loaded)
+            cur.execute("SELECT COUNT(*) FROM sa.review WHERE NOT (review_id = ANY(%s));", (review_ids,))
+            missing = cur.fetchone()[0]
+            if delete_missing and missing and (failed or totals["skipped"] or not consistent):
+                print("[WARN] --delete-missing не выполнен: есть файлы или строки с ошибками")
+            elif delete_missing and missing:
+                cur.execute("DELETE FROM sa.review WHERE NOT (review_id = ANY(%s));", (review_ids,))
+                deleted = cur.rowcount
+            if totals["inserted"] or totals["updated"] or deleted:
+                bump_data_version(cur)
+                refresh_school_summary(cur)
+        conn.commit()
+    except Exception:
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+    total = time.perf_counter() - started
+    report_changes(
+        "sa.review",
+        {
+            "inserted": totals["inserted"],
+            "updated": totals["updated"],
+            "unchanged": totals["unchanged"],
+            "deleted": deleted,
+        },
+        missing,
+        delete_missing,
+    )
+    print(
+        f"[INFO] Файлов: {len(loaded)} из {len(paths)}, процессов {workers}, строк {totals['copied']} "
+        f"за {total:.2f} с (файлы {load_time:.2f} с), {totals['copied'] / max(total, 1e-9):.0f} строк/с"
+    )
+    if totals["skipped"]:
+        print(f"[WARN] Пропущено строк с ошибками: {totals['skipped']}")
+    return not failed and consistent
+
 
-    insert_reviews(all_rows)
+def main() -> None:
+    """
+    Точка входа:
+    1. Проходим по всем *_final.json.
+    2. Отфильтровываем полностью пустые (нет даты и текста).
+    3. Загружаем в sa.review: через COPY и временную таблицу только изменившиеся отзывы
+       (с флагом --parallel — по файлу на транзакцию в пуле процессов)
+       или, с флагом --batch, построчным UPSERT всех.
+    """
+    if "--batch" in sys.argv:
+        insert_reviews(iter_reviews(REVIEWS_DIR))
+    elif "--parallel" in sys.argv:
+        ok = insert_reviews_parallel(
+            sorted(iter_review_files(REVIEWS_DIR)),
+            delete_missing="--delete-missing" in sys.argv,
+        )
+        if not ok:
+            sys.exit(1)
+    else:
+        insert_reviews_copy(iter_reviews(REVIEWS_DIR), delete_missing="--delete-missing" in sys.argv)
 
 
 if __name__ == "__main__":
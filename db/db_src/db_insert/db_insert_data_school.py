@@ -8,16 +8,34 @@
 
 И заполняем таблицу:
     sa.school
+
+Загрузка инкрементальная: школы копируются (COPY) во временную таблицу school_stage,
+и в sa.school пишутся только новые школы и школы, у которых изменился хэш содержимого
+(content_hash). В итоге — число вставленных, обновлённых, неизменных и удалённых строк.
+--delete-missing удаляет школы, которых больше нет в JSON, в той же транзакции вместе с их
+отзывами, рейтингами, ссылками и территориями; в sa.catchment_rule они становятся несопоставленными.
+JSON разбирается потоково, строки копируются порциями по LOAD_BATCH_SIZE под SAVEPOINT:
+
+    python db/db_src/db_insert/db_insert_data_school.py [--delete-missing]
 """
 
-import json
 import os
-from typing import Any, Dict, List, Tuple, Optional
+import sys
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Optional
 
 import psycopg2
-from psycopg2.extras import execute_batch, Json
-
-from db_config_sa import get_connection
+from psycopg2 import errorcodes
+from psycopg2.extras import Json
+
+from db_config_sa import (
+    bump_data_version,
+    copy_rows,
+    get_connection,
+    iter_json_array,
+    refresh_school_summary,
+    report_changes,
+    write_batches,
+)
 
 # Пути к файлам
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -31,10 +49,13 @@ SCHOOLS_JSON_PATH = os.path.join(
     "sd_2_stage_schools.json",
 )
 
+# Строк в одной порции COPY (под одним SAVEPOINT)
+BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", "1000"))
 
-def load_schools(path: str) -> List[Dict[str, Any]]:
+
+def load_schools(path: str) -> Iterator[Dict[str, Any]]:
     """
-    Загружаем список школ из JSON.
+    Школы из JSON по одной (массив разбирается потоково, целиком не загружается).
 
     Формат элемента (пример):
         {
@@ -69,8 +90,7 @@ def load_schools(path: str) -> List[Dict[str, Any]]:
             }
         }
     """
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return iter_json_array(path)
 
 
 def bool_from_int_or_none(value: Any) -> Optional[bool]:
@@ -193,72 +213,270 @@ def prepare_school_row(s: Dict[str, Any]) -> Tuple:
     )
 
 
-def insert_schools(schools: List[Dict[str, Any]], batch_size: int = 500) -> None:
+SCHOOL_COLUMNS = [
+    "school_id",
+    "name_2gis",
+    "name_ym",
+    "school_address",
+    "building_type",
+    "floors",
+    "floor_under",
+    "material",
+    "reconstruction_year",
+    "year_built",
+    "capacity",
+    "building_info",
+    "has_sports_complex",
+    "has_pool",
+    "has_stadium",
+    "has_sports_ground",
+    "lon",
+    "lat",
+]
+
+# Временная таблица в порядке кортежа prepare_school_row; seq — порядок строк в COPY.
+# NOT NULL те же, что у sa.school, а координаты — в допустимых для geography пределах:
+# ошибочная строка отсеивается уже на COPY (под SAVEPOINT), а не валит слияние
+SCHOOL_STAGE_SQL = """
+    CREATE TEMP TABLE school_stage (
+        seq BIGSERIAL,
+        school_id INTEGER NOT NULL,
+        name_2gis TEXT,
+        name_ym TEXT,
+        school_address TEXT NOT NULL,
+        building_type TEXT,
+        floors INTEGER NOT NULL,
+        floor_under INTEGER,
+        material TEXT,
+        reconstruction_year INTEGER,
+        year_built INTEGER NOT NULL,
+        capacity INTEGER,
+        building_info JSONB NOT NULL,
+        has_sports_complex BOOLEAN,
+        has_pool BOOLEAN,
+        has_stadium BOOLEAN,
+        has_sports_ground BOOLEAN,
+        lon DOUBLE PRECISION NOT NULL CHECK (lon BETWEEN -180 AND 180),
+        lat DOUBLE PRECISION NOT NULL CHECK (lat BETWEEN -90 AND 90)
+    ) ON COMMIT DROP;
+"""
+
+# Пишутся только новые школы и школы с изменившимся content_hash.
+# xmax = 0 у вставленной строки, у обновлённой — id транзакции.
+SCHOOL_MERGE_SQL = """
+    WITH source AS (
+        SELECT DISTINCT ON (school_id)
+            school_id,
+            name_2gis,
+            name_ym,
+            school_address,
+            building_type,
+            floors,
+            floor_under,
+            material,
+            reconstruction_year,
+            year_built,
+            capacity,
+            building_info,
+            has_sports_complex,
+            has_pool,
+            has_stadium,
+            has_sports_ground,
+            ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography AS location,
+            md5(ROW(
+                name_2gis, name_ym, school_address, building_type, floors, floor_under,
+                material, reconstruction_year, year_built, capacity, building_info,
+                has_sports_complex, has_pool, has_stadium, has_sports_ground, lon, lat
+            )::text) AS content_hash
+        FROM school_stage
+        ORDER BY school_id, seq DESC
+    ),
+    changed AS (
+        INSERT INTO sa.school (
+            school_id,
+            name_2gis,
+            name_ym,
+            school_address,
+            building_type,
+            floors,
+            floor_under,
+            material,
+            reconstruction_year,
+            year_built,
+            capacity,
+            building_info,
+            has_sports_complex,
+            has_pool,
+            has_stadium,
+            has_sports_ground,
+            location,
+            content_hash
+        )
+        SELECT src.*
+        FROM source src
+        LEFT JOIN sa.school s ON s.school_id = src.school_id
+        WHERE s.content_hash IS DISTINCT FROM src.content_hash
+        ON CONFLICT (school_id) DO UPDATE SET
+            name_2gis = EXCLUDED.name_2gis,
+            name_ym = EXCLUDED.name_ym,
+            school_address = EXCLUDED.school_address,
+            building_type = EXCLUDED.building_type,
+            floors = EXCLUDED.floors,
+            floor_under = EXCLUDED.floor_under,
+            material = EXCLUDED.material,
+            reconstruction_year = EXCLUDED.reconstruction_year,
+            year_built = EXCLUDED.year_built,
+            capacity = EXCLUDED.capacity,
+            building_info = EXCLUDED.building_info,
+            has_sports_complex = EXCLUDED.has_sports_complex,
+            has_pool = EXCLUDED.has_pool,
+            has_stadium = EXCLUDED.has_stadium,
+            has_sports_ground = EXCLUDED.has_sports_ground,
+            location = EXCLUDED.location,
+            content_hash = EXCLUDED.content_hash,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT
+        COUNT(*) FILTER (WHERE inserted),
+        COUNT(*) FILTER (WHERE NOT inserted),
+        (SELECT COUNT(*) FROM source)
+    FROM changed;
+"""
+
+# Школы sa.school, которых нет в JSON
+SCHOOL_MISSING_SQL = """
+    SELECT COUNT(*) FROM sa.school s
+    WHERE NOT EXISTS (SELECT 1 FROM school_stage st WHERE st.school_id = s.school_id);
+"""
+
+# Школы, которых нет в JSON, в отдельной временной таблице: по ней удаляются
+# сначала ссылающиеся строки, затем сами школы (внешние ключи без ON DELETE)
+SCHOOL_MISSING_STAGE_SQL = """
+    CREATE TEMP TABLE school_missing ON COMMIT DROP AS
+    SELECT s.school_id FROM sa.school s
+    WHERE NOT EXISTS (SELECT 1 FROM school_stage st WHERE st.school_id = s.school_id);
+"""
+
+# Таблицы со ссылкой на sa.school: строки удаляемых школ удаляются вместе со школой,
+# а в sa.catchment_rule школа становится несопоставленной (school_id = NULL)
+SCHOOL_DEPENDENTS_DELETE_SQL = (
+    ("sa.review", "DELETE FROM sa.review WHERE school_id IN (SELECT school_id FROM school_missing);"),
+    ("sa.rating", "DELETE FROM sa.rating WHERE school_id IN (SELECT school_id FROM school_missing);"),
+    ("sa.link", "DELETE FROM sa.link WHERE school_id IN (SELECT school_id FROM school_missing);"),
+    ("sa.catchment_house", "DELETE FROM sa.catchment_house WHERE school_id IN (SELECT school_id FROM school_missing);"),
+    ("sa.catchment_area", "DELETE FROM sa.catchment_area WHERE school_id IN (SELECT school_id FROM school_missing);"),
+    (
+        "sa.catchment_rule",
+        "UPDATE sa.catchment_rule SET school_id = NULL WHERE school_id IN (SELECT school_id FROM school_missing);",
+    ),
+)
+
+SCHOOL_DELETE_MISSING_SQL = """
+    DELETE FROM sa.school WHERE school_id IN (SELECT school_id FROM school_missing);
+"""
+
+
+def copy_school_batch(cur, batch: List[Tuple]) -> None:
+    """Одна порция строк в school_stage через COPY."""
+    copy_rows(cur, "school_stage", SCHOOL_COLUMNS, batch)
+
+
+def stage_schools(
+    cur,
+    schools: Iterable[Dict[str, Any]],
+    batch_size: int = BATCH_SIZE,
+    prepare: Callable[[Dict[str, Any]], Optional[Tuple]] = prepare_school_row,
+) -> Tuple[int, int]:
     """
-    Вставляем школы в таблицу sa.school.
+    Создать school_stage и скопировать в неё строки prepare(школа) порциями по batch_size.
+    Школа без координат или с ошибочными полями пропускается с [WARN].
+    Возвращает (скопировано строк, пропущено строк).
+    """
+    cur.execute(SCHOOL_STAGE_SQL)
+    return write_batches(cur, schools, copy_school_batch, batch_size, "school_stage", prepare=prepare)
+
 
-    Для поля location используем PostGIS-функции:
+def delete_missing_schools(cur) -> int:
+    """
+    Удалить школы, которых нет в school_stage, в текущей транзакции.
+    Сначала удаляются их отзывы, рейтинги, ссылки и территории, а в sa.catchment_rule
+    school_id обнуляется — иначе DELETE из sa.school упал бы на внешних ключах.
+    Возвращает число удалённых школ.
+    """
+    cur.execute(SCHOOL_MISSING_STAGE_SQL)
+    for table, query in SCHOOL_DEPENDENTS_DELETE_SQL:
+        cur.execute(query)
+        if cur.rowcount:
+            print(f"[INFO] {table}: строк удаляемых школ: {cur.rowcount}")
+    cur.execute(SCHOOL_DELETE_MISSING_SQL)
+    return cur.rowcount
+
+
+def merge_schools(cur, delete_missing: bool = False, skipped: int = 0) -> Tuple[Dict[str, int], int]:
+    """
+    Слить school_stage в sa.school (только новые и изменившиеся школы) и, с delete_missing,
+    удалить отсутствующие в JSON вместе со ссылающимися строками (delete_missing_schools),
+    если при копировании не было пропущенных строк.
+    Возвращает (счётчики для report_changes, число школ, которых нет в JSON).
+    """
+    cur.execute(SCHOOL_MERGE_SQL)
+    inserted, updated, distinct = cur.fetchone()
+    cur.execute(SCHOOL_MISSING_SQL)
+    missing = cur.fetchone()[0]
+    deleted = 0
+    if delete_missing and missing and skipped:
+        # Пропущенные строки тоже попали бы в «отсутствующие» — не удаляем ничего
+        print("[WARN] --delete-missing не выполнен: часть строк пропущена из-за ошибок")
+    elif delete_missing and missing:
+        deleted = delete_missing_schools(cur)
+    counts = {
+        "inserted": inserted,
+        "updated": updated,
+        "unchanged": distinct - inserted - updated,
+        "deleted": deleted,
+    }
+    return counts, missing
+
+
+def report_foreign_key_error(error: Exception) -> None:
+    """[ERROR] с подробностями, если загрузка школ упала на внешнем ключе."""
+    if isinstance(error, psycopg2.IntegrityError) and error.pgcode == errorcodes.FOREIGN_KEY_VIOLATION:
+        print(f"[ERROR] Школы, которых нет в JSON, не удалены: на них ссылаются другие таблицы ({error.diag.message_detail})")
+
+
+def insert_schools(
+    schools: Iterable[Dict[str, Any]],
+    delete_missing: bool = False,
+    batch_size: int = BATCH_SIZE,
+) -> None:
+    """
+    Инкрементально загружаем школы в sa.school: пишутся только новые и изменившиеся.
+    Координаты превращаются в location PostGIS-функциями при слиянии:
         ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography
+    Если ничего не изменилось, версия данных и сводка не трогаются (кэш API остаётся тёплым).
     """
     conn = None
     try:
         conn = get_connection()
         with conn.cursor() as cur:
-            insert_sql = """
-                INSERT INTO sa.school (
-                    school_id,
-                    name_2gis,
-                    name_ym,
-                    school_address,
-                    building_type,
-                    floors,
-                    floor_under,
-                    material,
-                    reconstruction_year,
-                    year_built,
-                    capacity,
-                    building_info,
-                    has_sports_complex,
-                    has_pool,
-                    has_stadium,
-                    has_sports_ground,
-                    location
-                )
-                VALUES (
-                    %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s,
-                    %s,
-                    ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography
-                )
-                ON CONFLICT (school_id) DO UPDATE SET
-                    name_2gis = EXCLUDED.name_2gis,
-                    name_ym = EXCLUDED.name_ym,
-                    school_address = EXCLUDED.school_address,
-                    building_type = EXCLUDED.building_type,
-                    floors = EXCLUDED.floors,
-                    floor_under = EXCLUDED.floor_under,
-                    material = EXCLUDED.material,
-                    reconstruction_year = EXCLUDED.reconstruction_year,
-                    year_built = EXCLUDED.year_built,
-                    capacity = EXCLUDED.capacity,
-                    building_info = EXCLUDED.building_info,
-                    has_sports_complex = EXCLUDED.has_sports_complex,
-                    has_pool = EXCLUDED.has_pool,
-                    has_stadium = EXCLUDED.has_stadium,
-                    has_sports_ground = EXCLUDED.has_sports_ground,
-                    location = EXCLUDED.location,
-                    updated_at = CURRENT_TIMESTAMP;
-            """
-
-            data = [prepare_school_row(s) for s in schools]
-            execute_batch(cur, insert_sql, data, page_size=batch_size)
+            copied, skipped = stage_schools(cur, schools, batch_size)
+            if not copied:
+                print("[WARN] В JSON со школами нет данных")
+                return
+            counts, missing = merge_schools(cur, delete_missing, skipped)
+            if counts["inserted"] or counts["updated"] or counts["deleted"]:
+                bump_data_version(cur)
+                refresh_school_summary(cur)
 
         conn.commit()
-        print(f"[OK] Вставлено/обновлено школ: {len(schools)}")
+        report_changes("sa.school", counts, missing, delete_missing)
+        if skipped:
+            print(f"[WARN] Пропущено строк с ошибками: {skipped}")
     except Exception as e:
         if conn:
             conn.rollback()
+        report_foreign_key_error(e)
         raise
     finally:
         if conn:
@@ -270,14 +488,9 @@ def main():
     Точка входа:
     1. Читаем JSON с полным списком школ.
     2. Готовим данные под схему sa.school.
-    3. Вставляем батчами с UPSERT (ON CONFLICT ... DO UPDATE).
+    3. Копируем во временную таблицу и пишем в sa.school только изменившиеся школы.
     """
-    schools = load_schools(SCHOOLS_JSON_PATH)
-    if not schools:
-        print("[WARN] В JSON со школами нет данных")
-        return
-
-    insert_schools(schools)
+    insert_schools(load_schools(SCHOOLS_JSON_PATH), delete_missing="--delete-missing" in sys.argv)
 
 
 if __name__ == "__main__":
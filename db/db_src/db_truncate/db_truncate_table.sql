@@ -1,9 +1,21 @@
 -- Очистка таблицы отзывов и сброс счетчика review_id
 TRUNCATE TABLE sa.review RESTART IDENTITY CASCADE;
 
+TRUNCATE TABLE sa.catchment_house RESTART IDENTITY CASCADE;
+
+TRUNCATE TABLE sa.catchment_area RESTART IDENTITY CASCADE;
+
+TRUNCATE TABLE sa.catchment_rule RESTART IDENTITY CASCADE;
+
 -- Очистка таблицы школ и сброс счетчика school_id
 TRUNCATE TABLE sa.school RESTART IDENTITY CASCADE;
 
 TRUNCATE TABLE sa.rating RESTART IDENTITY CASCADE;
 
 TRUNCATE TABLE sa.link RESTART IDENTITY CASCADE;
+
+-- Сводка для API после очистки тоже должна быть пустой
+REFRESH MATERIALIZED VIEW sa.school_summary;
+
+-- Новая версия данных: API сбрасывает кэш ответов, снимок карты и ETag удалённых школ
+UPDATE sa.data_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP;
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""
+Общие настройки тестов: пути импорта как при запуске скриптов проекта.
+
+API-модули импортируются как `from api import ...` (корень репозитория),
+загрузчики — как `from db_config_sa import ...` (папка db/db_src/db_insert).
+Тесты модулей с необязательными зависимостями (psycopg2, fastapi, numpy)
+пропускаются через pytest.importorskip, если пакет не установлен.
+
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in (ROOT, os.path.join(ROOT, "db", "db_src", "db_insert")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Кэш ответов: LRU/TTL в памяти и сброс по версии данных (api/api_cache.py)."""
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from api import api_cache  # noqa: E402
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = api_cache.MemoryBackend(maxsize=2, ttl=60)
+    backend.set("a", 1)
+    backend.set("b", 2)
+    assert backend.get("a") == 1  # "a" — теперь самый свежий
+    backend.set("c", 3)
+    assert backend.get("b") is None
+    assert backend.get("a") == 1
+    assert backend.get("c") == 3
+    assert backend.evictions == 1
+
+
+def test_memory_backend_expires_by_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(api_cache.time, "monotonic", lambda: now[0])
+    backend = api_cache.MemoryBackend(maxsize=10, ttl=5)
+    backend.set("key", "value")
+    now[0] += 4
+    assert backend.get("key") == "value"
+    now[0] += 2
+    assert backend.get("key") is None
+    assert backend.size() == 0
+
+
+def test_response_cache_key_includes_version_and_params():
+    cache = api_cache.ResponseCache(backend=api_cache.MemoryBackend(10, 60))
+    cache.set("map", 1, ("школа", None), {"count": 1})
+    assert cache.get("map", 1, ("школа", None)) == {"count": 1}
+    assert cache.get("map", 2, ("школа", None)) is None
+    assert cache.get("map", 1, ("лицей", None)) is None
+    assert cache.stats()["namespaces"]["map"] == {"hits": 1, "misses": 2}
+
+
+def test_response_cache_clears_on_version_change():
+    cache = api_cache.ResponseCache(backend=api_cache.MemoryBackend(10, 60))
+    cache.on_version(1)
+    cache.set("map", 1, (), "body")
+    cache.on_version(1)
+    assert cache.backend.size() == 1
+    cache.on_version(2)
+    assert cache.backend.size() == 0
+
+
+def test_create_backend_defaults_to_memory():
+    config = dict(api_cache.CACHE_CONFIG, backend="memory", maxsize=3)
+    backend = api_cache.create_backend(config)
+    assert isinstance(backend, api_cache.MemoryBackend)
+    assert backend.maxsize == 3
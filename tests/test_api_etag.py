@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""ETag по версии данных и сравнение с If-None-Match (api/api_cache.py)."""
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from api import api_cache  # noqa: E402
+
+
+def test_make_etag_is_weak_and_depends_on_version_and_params():
+    etag = api_cache.make_etag(7, "map", ("сош", None))
+    assert etag.startswith('W/"7-') and etag.endswith('"')
+    assert api_cache.make_etag(7, "map", ("сош", None)) == etag
+    assert api_cache.make_etag(8, "map", ("сош", None)) != etag
+    assert api_cache.make_etag(7, "map", ("лицей", None)) != etag
+    assert api_cache.make_etag(7, "school", ("сош", None)) != etag
+
+
+def test_make_etag_without_version():
+    assert api_cache.make_etag(0, "map", ()) is None
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, False),
+        ("", False),
+        ("*", True),
+        ('"other", {etag}', True),
+        ('"other" , {opaque}', True),
+        ('"other"', False),
+        ('W/"1-other"', False),
+    ],
+)
+def test_etag_matches_uses_weak_comparison(header, expected):
+    etag = api_cache.make_etag(1, "map", ())
+    if header is not None:
+        header = header.format(etag=etag, opaque=etag[2:])
+    assert api_cache.etag_matches(header, etag) is expected
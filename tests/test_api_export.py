@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""Потоковая выгрузка CSV через COPY (api/api_export.py) на поддельном курсоре, без БД."""
+
+import contextvars
+import threading
+
+import pytest
+
+from api import api_export
+
+REQUEST_ID = contextvars.ContextVar("request_id", default=None)
+
+
+class FakeCursor:
+    """copy_expert пишет строки в файл-приёмник, как COPY TO STDOUT."""
+
+    def __init__(self, lines=None, error=None, endless=False):
+        self.lines = lines or []
+        self.error = error
+        self.endless = endless
+        self.sql = None
+        self.seen_request_id = None
+        self.copy_error = None
+        self.closed = False
+        self.finished = threading.Event()
+
+    def mogrify(self, query, params):
+        return (query % tuple(params)).encode("utf-8")
+
+    def copy_expert(self, sql, file):
+        self.sql = sql
+        self.seen_request_id = REQUEST_ID.get()
+        try:
+            for line in self.lines:
+                file.write(line)
+            while self.endless:
+                file.write(b"1,school\n")
+            if self.error is not None:
+                raise self.error
+        except BaseException as e:
+            self.copy_error = e
+            raise
+        finally:
+            self.finished.set()
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setitem(api_export.EXPORT_CONFIG, "chunk_size", 8)
+    monkeypatch.setitem(api_export.EXPORT_CONFIG, "queue_size", 1)
+
+
+def test_build_query_filters_by_school():
+    query, params = api_export.build_query("reviews", 5)
+    assert query.startswith("SELECT review_id, school_id,")
+    assert "topics::text AS topics" in query
+    assert query.endswith("FROM sa.review WHERE school_id = %s ORDER BY review_id")
+    assert params == [5]
+    assert api_export.build_query("schools")[1] == []
+
+
+def test_stream_csv_yields_all_copy_output(small_chunks):
+    lines = [b"school_id,name\n"] + [f"{i},school {i}\n".encode() for i in range(20)]
+    cursor = FakeCursor(lines)
+    body = b"".join(api_export.stream_csv(FakeConnection(cursor), "schools", 3))
+    assert body == b"".join(lines)
+    assert cursor.sql.startswith("COPY (SELECT school_id,")
+    assert "WHERE school_id = 3" in cursor.sql
+    assert cursor.sql.endswith("TO STDOUT WITH (FORMAT csv, HEADER true)")
+    assert cursor.closed
+
+
+def test_stream_csv_raises_copy_error():
+    cursor = FakeCursor([b"a\n"], error=RuntimeError("COPY failed"))
+    with pytest.raises(RuntimeError, match="COPY failed"):
+        b"".join(api_export.stream_csv(FakeConnection(cursor), "schools"))
+    assert cursor.closed
+
+
+def test_closing_stream_cancels_copy(small_chunks):
+    cursor = FakeCursor(endless=True)
+    stream = api_export.stream_csv(FakeConnection(cursor), "reviews")
+    assert next(stream)
+    stream.close()  # клиент отключился
+    assert cursor.finished.wait(5)
+    assert isinstance(cursor.copy_error, api_export.ExportCancelled)
+    assert cursor.closed
+
+
+def test_copy_thread_sees_request_context():
+    cursor = FakeCursor([b"a\n"])
+    token = REQUEST_ID.set("req-1")
+    try:
+        b"".join(api_export.stream_csv(FakeConnection(cursor), "schools"))
+    finally:
+        REQUEST_ID.reset(token)
+    assert cursor.seen_request_id == "req-1"
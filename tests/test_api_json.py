@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Готовые тела ответов и выбор сжатия по Accept-Encoding (api/api_json.py)."""
+
+import asyncio
+import gzip
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("psycopg2")
+
+from api import api_json  # noqa: E402
+
+BIG = {"schools": [{"school_id": i, "name": "школа"} for i in range(200)]}
+
+
+def request(accept_encoding=None, if_none_match=None):
+    headers = {}
+    if accept_encoding is not None:
+        headers["accept-encoding"] = accept_encoding
+    if if_none_match is not None:
+        headers["if-none-match"] = if_none_match
+    return SimpleNamespace(headers=headers)
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, set()),
+        ("gzip, br", {"gzip", "br"}),
+        ("gzip;q=0.5, br;q=0", {"gzip"}),
+        ("GZIP , identity", {"gzip", "identity"}),
+    ],
+)
+def test_accepted_encodings(header, expected):
+    assert api_json.accepted_encodings(header) == expected
+
+
+def test_small_body_is_not_compressed():
+    body = api_json.EncodedBody.encode({"count": 0})
+    assert body.gzip is None and body.br is None
+
+
+def test_large_body_has_gzip_version():
+    body = api_json.EncodedBody.encode(BIG)
+    assert gzip.decompress(body.gzip) == body.identity
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        api_json.EncodedBody(b"{}"),
+        api_json.EncodedBody(b"[1]", b"gz", None),
+        api_json.EncodedBody(b"", b"gz", b"br"),
+    ],
+)
+def test_pack_round_trip(body):
+    unpacked = api_json.EncodedBody.unpack(body.pack())
+    assert (unpacked.identity, unpacked.gzip, unpacked.br) == (body.identity, body.gzip, body.br)
+
+
+def test_response_picks_accepted_encoding():
+    body = api_json.EncodedBody(b"{}", b"gz", b"br")
+    headers = {"etag": 'W/"1-x"'}
+
+    response = body.response(request("gzip, br"), headers)
+    assert response.body == b"br" and response.headers["content-encoding"] == "br"
+
+    response = body.response(request("gzip"), headers)
+    assert response.body == b"gz" and response.headers["content-encoding"] == "gzip"
+
+    response = body.response(request(), headers)
+    assert response.body == b"{}" and "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"1-x"'
+
+
+def test_response_without_brotli_version_falls_back_to_gzip():
+    body = api_json.EncodedBody(b"{}", b"gz", None)
+    response = body.response(request("br, gzip"), {})
+    assert response.body == b"gz"
+
+
+def test_not_modified_for_compressible_route_varies_on_encoding(monkeypatch):
+    from fastapi import Response
+
+    from api import api_cache, main
+
+    async def version():
+        return 5
+
+    monkeypatch.setattr(main, "current_data_version", version)
+    etag = api_cache.make_etag(5, "map", ())
+    _, not_modified = asyncio.run(
+        main.conditional_etag(request(if_none_match=etag), Response(), "map", (), compressible=True)
+    )
+    assert not_modified.status_code == 304
+    assert not_modified.headers["vary"] == "Accept-Encoding"
+    assert not_modified.headers["etag"] == etag
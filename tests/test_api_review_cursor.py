@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""Курсор постраничной выдачи отзывов (encode/decode_review_cursor в api/main.py)."""
+
+from datetime import date
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("psycopg2")
+
+from fastapi import HTTPException  # noqa: E402
+
+from api import main  # noqa: E402
+
+
+@pytest.mark.parametrize("review_date", [date(2024, 5, 1), None])
+def test_review_cursor_round_trip(review_date):
+    cursor = main.encode_review_cursor(review_date, 42)
+    assert "=" not in cursor
+    assert main.decode_review_cursor(cursor) == (review_date, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "не-base64", main.encode_review_cursor(None, 1)[:-2] + "!!"])
+def test_review_cursor_invalid(cursor):
+    with pytest.raises(HTTPException) as exc:
+        main.decode_review_cursor(cursor)
+    assert exc.value.status_code == 400
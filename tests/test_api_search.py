@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""Нормализация строки поиска (api/api_search.py) и условие поиска карты (_map_where)."""
+
+import pytest
+
+from api import api_search
+
+NO_FILTERS = (None,) * 8
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("МОУ СОШ №6", "сош 6"),
+        ("Средняя общеобразовательная школа 6", "сош 6"),
+        ("  МАОУ «Лицей 15»  ", "лицей 15"),
+        ("Школа «Ёлочка»", "школа елочка"),
+        ("...", ""),
+        (None, ""),
+    ],
+)
+def test_normalize_school_query(value, expected):
+    assert api_search.normalize_school_query(value) == expected
+
+
+def test_map_where_matches_address_by_raw_term():
+    pytest.importorskip("fastapi")
+    main = pytest.importorskip("api.main")
+    where, params = main._map_where("ул. Ленина, 5", *NO_FILTERS)
+    assert "s.school_address ILIKE %s" in where
+    assert "%ул. Ленина, 5%" in params
+    assert "ул ленина 5" in params
+
+
+def test_map_where_punctuation_only_searches_address():
+    pytest.importorskip("fastapi")
+    main = pytest.importorskip("api.main")
+    where, params = main._map_where("№", *NO_FILTERS)
+    assert "search_tsv" not in where
+    assert params == ["%№%"]
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Снимок школ в памяти (api/api_snapshot.py): фильтры должны давать то же, что _map_where в SQL,
+включая NULL — сравнение с NULL в SQL ложно, и такие школы не проходят фильтр.
+"""
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from api import api_snapshot  # noqa: E402
+
+
+def school(school_id, year=None, rating=None, pool=None, lon=None, lat=None):
+    """Строка SNAPSHOT_QUERY: id, названия, адрес, год, спортобъекты, lon, lat, рейтинг."""
+    return (school_id, f"Школа {school_id}", None, "адрес", year, None, pool, None, None, lon, lat, rating)
+
+
+ROWS = [
+    school(1, year=1960, rating=4.5, pool=True, lon=46.00, lat=51.40),
+    school(2, year=1985, rating=3.9, pool=False, lon=46.01, lat=51.41),
+    school(3, year=None, rating=None, pool=None, lon=45.00, lat=52.50),
+    school(4, year=2010, rating=4.8, pool=True),
+]
+
+
+def filters(**kwargs):
+    """Аргументы mask/schools/clusters в порядке _map_where без search."""
+    names = (
+        "year_min", "year_max", "rating_min", "rating_max",
+        "has_pool", "has_stadium", "has_sports_ground", "has_sports_complex", "bbox",
+    )
+    return tuple(kwargs.get(name) for name in names)
+
+
+def ids(snapshot, **kwargs):
+    return [s["school_id"] for s in snapshot.schools(*filters(**kwargs))["schools"]]
+
+
+@pytest.fixture
+def snapshot():
+    return api_snapshot.SchoolSnapshot(ROWS, version=1)
+
+
+def test_no_filters_returns_all_in_school_id_order(snapshot):
+    assert ids(snapshot) == [1, 2, 3, 4]
+
+
+def test_null_year_and_rating_do_not_pass_range_filters(snapshot):
+    assert ids(snapshot, year_min=1900) == [1, 2, 4]
+    assert ids(snapshot, year_max=1990) == [1, 2]
+    assert ids(snapshot, rating_min=4.0) == [1, 4]
+    assert ids(snapshot, rating_min=3.0, rating_max=4.6) == [1, 2]
+
+
+def test_flag_filters_skip_null_flags(snapshot):
+    assert ids(snapshot, has_pool=True) == [1, 4]
+    assert ids(snapshot, has_pool=False) == [2]
+
+
+def test_bbox_excludes_schools_without_coordinates(snapshot):
+    assert ids(snapshot, bbox=(45.9, 51.3, 46.1, 51.5)) == [1, 2]
+
+
+def test_clusters_group_nearby_schools(snapshot):
+    result = snapshot.clusters(*filters(), zoom=8, cells=4)
+    assert result["count"] == 3  # школа 4 без координат в кластеры не попадает
+    by_count = {c["count"]: c for c in result["clusters"]}
+    assert set(by_count) == {2, 1}
+    assert by_count[2]["school_id"] is None
+    assert by_count[1]["school_id"] == 3
+    lon, lat = by_count[2]["location"]["coordinates"]
+    assert lon == pytest.approx(46.005)
+    assert lat == pytest.approx(51.405)
+
+
+def test_clusters_empty(snapshot):
+    assert snapshot.clusters(*filters(year_min=2100), zoom=10, cells=4) == {"clusters": [], "count": 0, "zoom": 10}
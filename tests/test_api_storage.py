@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""Интерфейс хранилища (api/api_storage.py): backend без обязательного метода не создаётся."""
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("dotenv")
+
+from api import api_storage  # noqa: E402
+
+
+def test_repository_without_required_methods_cannot_be_created():
+    class Partial(api_storage.SchoolRepository):
+        def data_version(self):
+            return 0
+
+    with pytest.raises(TypeError, match="schools_for_map"):
+        Partial()
+
+
+def test_sqlite_repository_implements_interface():
+    assert not api_storage.SQLiteRepository.__abstractmethods__
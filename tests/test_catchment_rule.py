@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Разбор ячейки «Номера домов» и ключ школы (db_insert_data_catchment_rule.py)."""
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+from db_insert_data_catchment_rule import parse_houses, school_key  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "cell, rules",
+    [
+        # Диапазон с концами одной чётности — одна сторона улицы
+        ("118-146", [(118, 146, 0, None)]),
+        ("с 24 по 54", [(24, 54, 0, None)]),
+        ("5-3", [(3, 5, 1, None)]),
+        ("2-7", [(2, 7, None, None)]),
+        ("1-9 (нечетные)", [(1, 9, 1, None)]),
+        ("с 112 до конца", [(112, None, None, None)]),
+        # Отдельные дома: литера, дробь, корпус
+        ("9/1", [(9, 9, None, "9/1")]),
+        ("3\\1", [(3, 3, None, "3/1")]),
+        ("13а, 8 корп. 1", [(13, 13, None, "13а"), (8, 8, None, "8к1")]),
+        ("д. 5", [(5, 5, None, "5")]),
+        ("№ 7", [(7, 7, None, "7")]),
+        # Вся улица или её сторона
+        ("все дома", [(0, None, None, None)]),
+        ("(четные)", [(0, None, 0, None)]),
+        ("все дома (нечетные)", [(0, None, 1, None)]),
+        ("все дома четная сторона", [(0, None, 0, None)]),
+        ("СНТ «Строитель 5» все дома", [(0, None, None, None)]),
+    ],
+)
+def test_parse_houses(cell, rules):
+    assert parse_houses(cell) == (rules, [])
+
+
+def test_marker_applies_per_fragment():
+    # «частный сектор 18» — дом 18, а не вся улица
+    assert parse_houses("частный сектор 18") == ([(18, 18, None, "18")], [])
+
+
+def test_whole_street_marker_next_to_numbers_is_reported():
+    # Какие ещё дома входят, неизвестно: правило на всю улицу перехватило бы дома других школ
+    assert parse_houses("1, 3, частный сектор") == (
+        [(1, 1, None, "1"), (3, 3, None, "3")],
+        ["частный сектор"],
+    )
+
+
+@pytest.mark.parametrize("cell, skipped", [("", []), (None, []), ("нет данных", ["нет данных"])])
+def test_parse_houses_without_rules(cell, skipped):
+    assert parse_houses(cell) == ([], skipped)
+
+
+@pytest.mark.parametrize(
+    "name, key",
+    [
+        ("моу сош 6", "сош 6"),
+        ("гимназия 2 им пушкина", "гимназия 2"),
+        ("кадетская школа интернат 1", "кадетская школа интернат 1"),
+        ("лицей", None),
+        (None, None),
+    ],
+)
+def test_school_key(name, key):
+    assert school_key(name) == key
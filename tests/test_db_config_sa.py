@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Потоковый разбор JSON, порции и SAVEPOINT-запись загрузчиков (db_config_sa.py)."""
+
+import json
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+from db_config_sa import CopyRowsReader, iter_batches, iter_json_array, write_batches  # noqa: E402
+
+ITEMS = [
+    {"id": 1, "name": "школа «1», [корпус]", "rating": 4.75, "tags": ["a", "b"]},
+    {"id": 2, "text": "кавычка \" и \\ слэш", "nested": {"x": [1, 2, {"y": None}]}},
+    12345678901234567890,
+    -0.5e-3,
+    "строка",
+    True,
+    None,
+    [],
+]
+
+
+def write_json(tmp_path, text):
+    path = tmp_path / "data.json"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64 * 1024])
+def test_iter_json_array_across_chunk_boundaries(tmp_path, chunk_size):
+    path = write_json(tmp_path, json.dumps(ITEMS, ensure_ascii=False, indent=2))
+    assert list(iter_json_array(path, chunk_size=chunk_size)) == ITEMS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4])
+def test_iter_json_array_numbers_split_by_chunk(tmp_path, chunk_size):
+    path = write_json(tmp_path, "[123456,7.25e+10,-99]")
+    assert list(iter_json_array(path, chunk_size=chunk_size)) == [123456, 7.25e10, -99]
+
+
+@pytest.mark.parametrize("text", ["[]", "  [ \n ]  "])
+def test_iter_json_array_empty(tmp_path, text):
+    assert list(iter_json_array(write_json(tmp_path, text))) == []
+
+
+@pytest.mark.parametrize("text", ['{"a": 1}', "[1 2]", "[1,", "[{"])
+def test_iter_json_array_invalid(tmp_path, text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(write_json(tmp_path, text), chunk_size=2))
+
+
+def test_iter_batches():
+    assert list(iter_batches(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(iter_batches([], 3)) == []
+
+
+def test_copy_rows_reader_escapes_and_respects_size():
+    reader = CopyRowsReader([(1, None, "a\tb\nc\\d", True)])
+    data = reader.read(4) + reader.read()
+    assert data == "1\t\\N\ta\\tb\\nc\\\\d\tt\n"
+    assert reader.count == 1
+
+
+class SavepointCursor:
+    def __init__(self):
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append(query)
+
+
+def test_write_batches_retries_failed_batch_row_by_row(capsys):
+    written_rows = []
+
+    def write_batch(cur, batch):
+        if any(row[0] == 3 for row in batch):
+            raise psycopg2.Error("bad row")
+        written_rows.extend(batch)
+
+    cur = SavepointCursor()
+    written, skipped = write_batches(cur, [(i,) for i in range(1, 6)], write_batch, batch_size=2, table="t")
+    assert (written, skipped) == (4, 1)
+    assert written_rows == [(1,), (2,), (4,), (5,)]
+    assert cur.queries.count("ROLLBACK TO SAVEPOINT load_batch;") == 1
+    assert cur.queries.count("ROLLBACK TO SAVEPOINT load_row;") == 1
+    assert "строка 3 пропущена" in capsys.readouterr().out
+
+
+def test_write_batches_skips_records_prepare_rejects(capsys):
+    batches = []
+
+    def prepare(record):
+        if record.get("skip"):
+            return None
+        return (record["id"],)
+
+    records = [{"id": 1}, {"skip": True}, {"name": "без id"}, {"id": 2}]
+    written, skipped = write_batches(
+        SavepointCursor(), records, lambda cur, batch: batches.append(batch), batch_size=10, prepare=prepare
+    )
+    assert (written, skipped) == (2, 1)
+    assert batches == [[(1,), (2,)]]
+    assert "KeyError" in capsys.readouterr().out
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Порядок этапов полной загрузки (db_insert_data_all.load_school_tables) без БД."""
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+import db_insert_data_all as loader  # noqa: E402
+
+
+class FakeConnection:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def commit(self):
+        self.calls.append("commit")
+
+    def rollback(self):
+        self.calls.append("rollback")
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+    no_changes = {"inserted": 0, "updated": 0, "unchanged": 1, "deleted": 0}
+
+    def step(name, result=None):
+        def run(*args, **kwargs):
+            calls.append(name)
+            return result
+        return run
+
+    monkeypatch.setattr(loader, "get_connection", lambda: FakeConnection(calls))
+    monkeypatch.setattr(loader, "load_schools", lambda path: [])
+    monkeypatch.setattr(loader, "stage_schools", step("stage_schools", (10, 0)))
+    monkeypatch.setattr(loader, "merge_schools", step("merge_schools", (dict(no_changes), 2)))
+    monkeypatch.setattr(loader, "write_ratings", step("write_ratings", (dict(no_changes), 0)))
+    monkeypatch.setattr(loader, "write_links", step("write_links", (dict(no_changes), 0)))
+    monkeypatch.setattr(loader, "delete_missing_schools", step("delete_missing_schools", 2))
+    monkeypatch.setattr(loader, "bump_data_version", step("bump_data_version"))
+    monkeypatch.setattr(loader, "refresh_school_summary", step("refresh_school_summary"))
+    return calls
+
+
+def test_missing_schools_are_deleted_after_ratings_and_links(calls):
+    assert loader.load_school_tables([], delete_missing=True)
+    assert calls == [
+        "stage_schools",
+        "merge_schools",
+        "write_ratings",
+        "write_links",
+        "delete_missing_schools",
+        "bump_data_version",
+        "refresh_school_summary",
+        "commit",
+    ]
+
+
+def test_nothing_changed_keeps_data_version(calls):
+    assert loader.load_school_tables([])
+    assert "delete_missing_schools" not in calls
+    assert "bump_data_version" not in calls
+    assert calls[-1] == "commit"
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Слияние школ и --delete-missing (db_insert_data_school.py) на поддельном курсоре:
+строки, ссылающиеся на удаляемые школы, удаляются раньше самих школ.
+"""
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("dotenv")
+
+import db_insert_data_school as school  # noqa: E402
+
+
+class FakeCursor:
+    """Записывает запросы; rowcount каждого DELETE/UPDATE — из словаря по началу запроса."""
+
+    def __init__(self, merged=(1, 2, 10), missing=3, rowcounts=None):
+        self.merged = merged
+        self.missing = missing
+        self.rowcounts = rowcounts or {}
+        self.queries = []
+        self.rowcount = -1
+        self._result = None
+
+    def execute(self, query, params=None):
+        query = " ".join(query.split())
+        self.queries.append(query)
+        self.rowcount = next((n for prefix, n in self.rowcounts.items() if query.startswith(prefix)), 0)
+        if query.startswith("WITH"):
+            self._result = self.merged
+        elif query.startswith("SELECT COUNT(*) FROM sa.school"):
+            self._result = (self.missing,)
+
+    def fetchone(self):
+        return self._result
+
+
+def index_of(queries, prefix):
+    return next(i for i, q in enumerate(queries) if q.startswith(prefix))
+
+
+def test_merge_without_delete_missing_keeps_schools():
+    cur = FakeCursor()
+    counts, missing = school.merge_schools(cur)
+    assert counts == {"inserted": 1, "updated": 2, "unchanged": 7, "deleted": 0}
+    assert missing == 3
+    assert not any(q.startswith("DELETE") for q in cur.queries)
+
+
+def test_delete_missing_removes_dependents_first():
+    cur = FakeCursor(rowcounts={"DELETE FROM sa.school": 3, "DELETE FROM sa.review": 12})
+    counts, missing = school.merge_schools(cur, delete_missing=True)
+    assert counts["deleted"] == 3
+
+    queries = cur.queries
+    delete_schools = index_of(queries, "DELETE FROM sa.school")
+    assert index_of(queries, "CREATE TEMP TABLE school_missing") < delete_schools
+    for table in ("sa.review", "sa.rating", "sa.link", "sa.catchment_house", "sa.catchment_area"):
+        assert index_of(queries, f"DELETE FROM {table} ") < delete_schools
+    assert index_of(queries, "UPDATE sa.catchment_rule SET school_id = NULL") < delete_schools
+
+
+def test_delete_missing_skipped_when_rows_were_skipped(capsys):
+    cur = FakeCursor()
+    counts, _ = school.merge_schools(cur, delete_missing=True, skipped=1)
+    assert counts["deleted"] == 0
+    assert not any(q.startswith("DELETE") for q in cur.queries)
+    assert "--delete-missing не выполнен" in capsys.readouterr().out